@@ -1,37 +1,144 @@
 import os
 import sys
+import re
+import mimetypes
+import json
 import server
 from aiohttp import web # Import web for static files
-from .api import routes as api_routes
+from .api import routes as api_routes, accepted_encodings, install_execution_tracker, normalize_media_path
 from .nodes import NODE_CLASS_MAPPINGS, NODE_DISPLAY_NAME_MAPPINGS
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
-# --- Artifact download before handler definition ---
-import requests
+# --- Artifact download, in the background so ComfyUI startup never waits on it ---
+import shutil
+import tempfile
+import threading
 import zipfile
-import io
 
 FRONTEND_PATH = os.path.join(os.path.dirname(__file__), "js", "dist")
+ARTIFACT_URL = "https://nightly.link/Tangerie/ComfyUI_CozyGen/workflows/build/master/artifact.zip"
+ARTIFACT_CHUNK_SIZE = 1024 * 1024
+
 def download_latest_artifact_to_js_dist():
-    os.makedirs(FRONTEND_PATH, exist_ok=True)
-    zip_resp = requests.get(
-        f"https://nightly.link/Tangerie/ComfyUI_CozyGen/workflows/build/master/artifact.zip"
-    )
-    if zip_resp.ok:
-        with zipfile.ZipFile(io.BytesIO(zip_resp.content)) as z:
-            z.extractall(FRONTEND_PATH)
+    # requests is only needed on first run, so keep it out of the import path.
+    import requests
+
+    js_dir = os.path.dirname(FRONTEND_PATH)
+    with tempfile.TemporaryDirectory(dir=js_dir, prefix=".dist-download-") as tmp_dir:
+        zip_path = os.path.join(tmp_dir, "artifact.zip")
+        with requests.get(ARTIFACT_URL, stream=True, timeout=60) as zip_resp:
+            if not zip_resp.ok:
+                print(f"CozyGen: frontend download failed with HTTP {zip_resp.status_code}")
+                return
+            with open(zip_path, 'wb') as f:
+                for chunk in zip_resp.iter_content(chunk_size=ARTIFACT_CHUNK_SIZE):
+                    f.write(chunk)
+        extract_dir = os.path.join(tmp_dir, "dist")
+        with zipfile.ZipFile(zip_path) as z:
+            z.extractall(extract_dir)
+        # Swap the finished build in at once so requests never see a half-extracted tree.
+        if os.path.isdir(FRONTEND_PATH):
+            shutil.rmtree(FRONTEND_PATH, ignore_errors=True)
+        os.replace(extract_dir, FRONTEND_PATH)
+    print("CozyGen: frontend downloaded.")
+
+def _download_frontend_in_background():
+    try:
+        download_latest_artifact_to_js_dist()
+    except Exception as e:
+        print(f"CozyGen: frontend download failed: {e}")
 
-# Call artifact download before handler definition
-if not os.path.isdir(FRONTEND_PATH): 
-    download_latest_artifact_to_js_dist()
+frontend_download_thread = None
+if not os.path.exists(os.path.join(FRONTEND_PATH, "index.html")):
+    frontend_download_thread = threading.Thread(
+        target=_download_frontend_in_background, name="cozygen-frontend-download", daemon=True
+    )
+    frontend_download_thread.start()
 # --- End artifact block ---
 
+ASSETS_PATH = os.path.join(FRONTEND_PATH, "assets")
+# Lists every file Vite emitted with a content hash; those never change, so clients may keep them forever.
+BUILD_MANIFEST_PATH = os.path.join(FRONTEND_PATH, ".vite", "manifest.json")
+# Builds without a manifest: Vite's `<name>-<8 char hash>.<ext>`. A hash almost always has a digit,
+# capital, `_` or `-`, which keeps plain words such as `audio-waveform.js` out.
+HASHED_ASSET_RE = re.compile(r"-(?=[a-z]*[A-Z0-9_-])[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+PRECOMPRESSED_EXTENSIONS = ((".br", "br"), (".gz", "gzip"))
+# The Windows registry can map .js to text/plain, which browsers refuse for modules.
+ASSET_CONTENT_TYPES = {
+    ".js": "text/javascript",
+    ".mjs": "text/javascript",
+    ".css": "text/css",
+    ".html": "text/html",
+    ".svg": "image/svg+xml",
+    ".json": "application/json",
+    ".map": "application/json",
+    ".woff2": "font/woff2",
+}
+
+def serve_frontend_file(request: web.Request, path: str, cache_control: str) -> web.FileResponse:
+    """Serve a built frontend file, preferring a build-time .br/.gz sibling the client accepts.
+
+    FileResponse handles ETag/Last-Modified, conditional 304s and sendfile.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    headers = {
+        "Cache-Control": cache_control,
+        "Content-Type": ASSET_CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or "application/octet-stream",
+        "Vary": "Accept-Encoding",
+    }
+    accepted = accepted_encodings(request)
+    for suffix, encoding in PRECOMPRESSED_EXTENSIONS:
+        if encoding in accepted and os.path.isfile(path + suffix):
+            headers["Content-Encoding"] = encoding
+            return web.FileResponse(path + suffix, headers=headers)
+    return web.FileResponse(path, headers=headers)
+
 async def serve_cozygen_app(request: web.Request) -> web.Response:
     index_path = os.path.join(FRONTEND_PATH, "index.html")
     if not os.path.exists(index_path):
+        if frontend_download_thread is not None and frontend_download_thread.is_alive():
+            return web.Response(text="CozyGen: The web UI is still downloading. Reload in a moment.", status=503, headers={"Retry-After": "5"})
         return web.Response(text="CozyGen: Build not found. Please run `npm run build` in the `js` directory.", status=500)
-    return web.FileResponse(index_path)
+    return serve_frontend_file(request, index_path, REVALIDATE_CACHE_CONTROL)
+
+_hashed_assets = {"key": None, "files": None}
+
+def get_hashed_assets():
+    """Asset paths (relative to the build) that the manifest says are hashed; None without a manifest."""
+    try:
+        stat = os.stat(BUILD_MANIFEST_PATH)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+    if _hashed_assets["key"] != key:
+        files = set()
+        try:
+            with open(BUILD_MANIFEST_PATH, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            for chunk in manifest.values():
+                files.add(chunk["file"])
+                files.update(chunk.get("css", ()))
+                files.update(chunk.get("assets", ()))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            files = None
+        _hashed_assets.update(key=key, files=files)
+    return _hashed_assets["files"]
+
+def is_hashed_asset(asset_path: str) -> bool:
+    hashed = get_hashed_assets()
+    if hashed is not None:
+        return os.path.relpath(asset_path, FRONTEND_PATH).replace(os.sep, "/") in hashed
+    return HASHED_ASSET_RE.search(os.path.basename(asset_path)) is not None
+
+async def serve_cozygen_asset(request: web.Request) -> web.Response:
+    asset_path = normalize_media_path(ASSETS_PATH, "", request.match_info.get("path", ""))
+    if not asset_path or not os.path.isfile(asset_path):
+        raise web.HTTPNotFound()
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_hashed_asset(asset_path) else REVALIDATE_CACHE_CONTROL
+    return serve_frontend_file(request, asset_path, cache_control)
 
 try:
     # Mount API routes
@@ -43,13 +150,15 @@ try:
             name=f"cozygen_{route.handler.__name__}"
         )
         
+    install_execution_tracker()
+
     # Route to serve the main application
     server.PromptServer.instance.app.router.add_get('/cozygen', serve_cozygen_app)
     server.PromptServer.instance.app.router.add_get('/cozygen/', serve_cozygen_app)
 
     # Serve the new 'dist' directory which contains the built React app
-    server.PromptServer.instance.app.router.add_static(
-        "/cozygen/assets", path=os.path.join(FRONTEND_PATH, "assets"), name="cozygen_assets"
+    server.PromptServer.instance.app.router.add_get(
+        "/cozygen/assets/{path:.*}", serve_cozygen_asset, name="cozygen_assets"
     )
 except:
     pass
@@ -2,12 +2,43 @@ from aiohttp import web
 import os
 import json
 import io
+import base64
 import functools
+import time
 import folder_paths
 from PIL import Image, ImageOps
 import server # Import server for node_info
 import uuid # For generating unique filenames
 import re
+import asyncio
+import threading
+import random
+import itertools
+import math
+import hashlib
+import hmac
+import collections
+import gzip
+import shutil
+import statistics
+import subprocess
+import wave
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+import aiohttp
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from .metrics import (
+    COMPRESS_SECONDS, HISTORY_WRITE_SECONDS, IMAGE_ENCODE_SECONDS, SESSION_WRITE_SECONDS, VIDEO_PREVIEW_SECONDS,
+    THUMBNAIL_BUILD_SECONDS, THUMBNAIL_CACHE_BYTES, THUMBNAIL_CACHE_ENTRIES, THUMBNAIL_CACHE_EVENTS,
+    get_metrics, instrument_routes,
+)
+from .profiling import MAX_PROFILE_HZ, MAX_PROFILE_SECONDS, format_collapsed, sample_stacks, trace_phase
 
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_WORKFLOWS_DIR = os.path.join(MODULE_DIR, ".workflows")
@@ -69,6 +100,88 @@ def normalize_media_path(base_dir: str, subfolder: str, filename: str) -> str |
         return None
     return target_path
 
+COMPRESSION_MIN_BYTES = 1024
+# Bodies at least this large are compressed in a worker thread instead of on the event loop.
+COMPRESSION_THREAD_BYTES = 256 * 1024
+MAX_COMPRESSED_CACHE_BYTES = 32 * 1024 * 1024
+
+# (cache_key, encoding) -> compressed body, for payloads whose key changes whenever they do.
+_compressed_cache = collections.OrderedDict()
+_compressed_cache_bytes = 0
+_compressed_cache_lock = threading.Lock()
+
+def accepted_encodings(request: web.Request) -> set:
+    accepted = set()
+    for token in request.headers.get("Accept-Encoding", "").lower().split(","):
+        name, _, params = token.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip())
+    return accepted
+
+def choose_encoding(request: web.Request) -> str | None:
+    accepted = accepted_encodings(request)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+def compress_bytes(body: bytes, encoding: str) -> bytes:
+    with COMPRESS_SECONDS.time(encoding):
+        if encoding == "br":
+            return brotli.compress(body, quality=5)
+        return gzip.compress(body, compresslevel=6)
+
+def _get_compressed(key):
+    with _compressed_cache_lock:
+        body = _compressed_cache.get(key)
+        if body is not None:
+            _compressed_cache.move_to_end(key)
+        return body
+
+def _store_compressed(key, body: bytes):
+    global _compressed_cache_bytes
+    if len(body) > MAX_COMPRESSED_CACHE_BYTES // 4:
+        return
+    with _compressed_cache_lock:
+        previous = _compressed_cache.pop(key, None)
+        if previous is not None:
+            _compressed_cache_bytes -= len(previous)
+        _compressed_cache[key] = body
+        _compressed_cache_bytes += len(body)
+        while _compressed_cache_bytes > MAX_COMPRESSED_CACHE_BYTES:
+            _, evicted = _compressed_cache.popitem(last=False)
+            _compressed_cache_bytes -= len(evicted)
+
+async def json_body_response(request: web.Request, body: bytes, cache_key=None) -> web.Response:
+    """Send an already serialised JSON body, compressed when the client accepts it.
+
+    ``cache_key`` must change whenever ``body`` does; compressed bodies are
+    memoised under it so unchanged payloads are not compressed twice.
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(request) if len(body) >= COMPRESSION_MIN_BYTES else None
+    if encoding:
+        memo_key = (cache_key, encoding) if cache_key is not None else None
+        compressed = _get_compressed(memo_key) if memo_key else None
+        if compressed is None:
+            with trace_phase("compress"):
+                if len(body) >= COMPRESSION_THREAD_BYTES:
+                    compressed = await asyncio.to_thread(compress_bytes, body, encoding)
+                else:
+                    compressed = compress_bytes(body, encoding)
+            if memo_key:
+                _store_compressed(memo_key, compressed)
+        headers["Content-Encoding"] = encoding
+        body = compressed
+    return web.Response(body=body, content_type="application/json", charset="utf-8", headers=headers)
+
+async def compressed_json_response(request: web.Request, data) -> web.Response:
+    with trace_phase("serialize"):
+        body = json.dumps(data).encode("utf-8")
+    return await json_body_response(request, body)
+
 def get_history_dir() -> str:
     history_dir = os.path.join(get_cache_dir(), "history")
     os.makedirs(history_dir, exist_ok=True)
@@ -81,17 +194,243 @@ def history_path_for_id(history_id: str) -> str:
     safe_id = sanitize_history_id(history_id)
     return os.path.join(get_history_dir(), f"{safe_id}.json")
 
-def load_history_entry(history_id: str):
+def load_history_entry(history_id: str, expand: bool = False):
+    """Load a history entry as stored; ``expand=True`` restores its full ``json`` prompt."""
     path = history_path_for_id(history_id)
     if not os.path.exists(path):
         return None
     with open(path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        data = json.load(f)
+    return expand_history_entry(data) if expand else data
 
 def write_history_entry(history_id: str, data: dict):
+    global _history_version
     path = history_path_for_id(history_id)
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+    data = compact_history_entry(data)
+    with HISTORY_WRITE_SECONDS.time():
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+    _history_version += 1
+    ensure_history_compactor()
+
+def delete_history_entry(history_id: str):
+    global _history_version
+    try:
+        os.remove(history_path_for_id(history_id))
+    except FileNotFoundError:
+        return
+    _history_version += 1
+
+BLOB_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+# Unreferenced blobs younger than this are kept, so compaction never races a write in progress.
+BLOB_GRACE_SECONDS = 3600
+
+def get_blob_dir() -> str:
+    blob_dir = os.path.join(get_cache_dir(), "blobs")
+    os.makedirs(blob_dir, exist_ok=True)
+    return blob_dir
+
+def store_blob(data) -> str:
+    """Store JSON content-addressed under its SHA-256; identical graphs share one file."""
+    text = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    path = os.path.join(get_blob_dir(), f"{digest}.json")
+    if os.path.exists(path):
+        try:
+            # Restart the GC grace period: the caller is about to reference this blob.
+            os.utime(path)
+            return digest
+        except FileNotFoundError:
+            pass  # Collected between the check and the touch; write it again.
+    partial_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(partial_path, path)
+    return digest
+
+@functools.lru_cache(maxsize=64)
+def _read_blob_text(digest: str) -> str:
+    with open(os.path.join(get_blob_dir(), f"{digest}.json"), 'r', encoding='utf-8') as f:
+        return f.read()
+
+def load_blob(digest: str):
+    if not BLOB_HASH_RE.match(digest or ""):
+        raise ValueError(f"Invalid blob hash: {digest!r}")
+    # Parsed fresh each time so callers may mutate the result.
+    return json.loads(_read_blob_text(digest))
+
+def _history_base_graph(data: dict, prompt: dict) -> dict:
+    """Pick the graph a prompt is diffed against: its workflow file when that is close, else itself."""
+    workflow_name = (data.get("fields") or {}).get("selectedWorkflow")
+    if workflow_name:
+        try:
+            entry = load_workflow(str(workflow_name))
+        except Exception:
+            entry = None
+        template = entry["workflow"] if entry else None
+        if isinstance(template, dict) and template:
+            changed = sum(1 for node_id, node in prompt.items() if template.get(node_id) != node)
+            if changed * 2 <= max(len(prompt), 1):
+                return template
+    return prompt
+
+def compact_history_entry(data: dict) -> dict:
+    """Move an entry's ``json`` prompt into the blob store, keeping only a per-node patch inline."""
+    payload = data.get("json")
+    if not isinstance(payload, dict):
+        return data
+    compacted = {key: value for key, value in data.items() if key != "json"}
+    prompt = payload.get("prompt")
+    if not isinstance(prompt, dict):
+        compacted["json_ref"] = {"blob": store_blob(payload), "raw": True}
+        return compacted
+    base = _history_base_graph(data, prompt)
+    patch = {node_id: node for node_id, node in prompt.items() if base.get(node_id) != node}
+    patch.update({node_id: None for node_id in base if node_id not in prompt})
+    reference = {"blob": store_blob(base), "patch": patch}
+    extra = {key: value for key, value in payload.items() if key != "prompt"}
+    if extra:
+        reference["extra"] = extra
+    compacted["json_ref"] = reference
+    return compacted
+
+def expand_history_entry(data: dict) -> dict:
+    reference = data.get("json_ref")
+    if not isinstance(reference, dict):
+        return data
+    expanded = {key: value for key, value in data.items() if key != "json_ref"}
+    try:
+        blob = load_blob(reference.get("blob"))
+    except (OSError, ValueError):
+        return expanded
+    if reference.get("raw"):
+        expanded["json"] = blob
+        return expanded
+    for node_id, node in (reference.get("patch") or {}).items():
+        if node is None:
+            blob.pop(node_id, None)
+        else:
+            blob[node_id] = node
+    expanded["json"] = {"prompt": blob, **(reference.get("extra") or {})}
+    return expanded
+
+HISTORY_COMPACT_INTERVAL = 3600
+
+_history_compactor = None
+
+def get_history_retention() -> dict:
+    """Retention limits from config.json; 0 disables a limit, and all are off unless configured."""
+    config = get_config()
+    limits = {}
+    for key, default in (("history_max_entries", 0), ("history_max_age_days", 0),
+                         ("history_max_mb", 0)):
+        try:
+            limits[key] = max(0.0, float(config.get(key, default)))
+        except (TypeError, ValueError):
+            limits[key] = float(default)
+    return limits
+
+def _entry_time(data: dict, mtime: float) -> float:
+    try:
+        return datetime.fromisoformat(str(data.get("timestamp"))).timestamp()
+    except ValueError:
+        return mtime
+
+def compact_history() -> dict:
+    """Enforce retention, move legacy inline prompts into blobs and drop unreferenced blobs."""
+    global _history_version
+    limits = get_history_retention()
+    history_dir = get_history_dir()
+    entries = []
+    for entry in os.scandir(history_dir):
+        if not entry.name.endswith('.json') or not entry.is_file():
+            continue
+        try:
+            stat = entry.stat()
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            continue
+        entries.append((_entry_time(data, stat.st_mtime), stat.st_size, entry.path, data))
+    entries.sort(key=lambda item: item[0], reverse=True)
+
+    now = time.time()
+    max_entries = int(limits["history_max_entries"])
+    max_age = limits["history_max_age_days"] * 86400
+    max_bytes = limits["history_max_mb"] * 1024 * 1024
+    kept_bytes = 0
+    stats = {"removed": 0, "compacted": 0, "blobs_removed": 0}
+    referenced = set()
+    for index, (created, size, path, data) in enumerate(entries):
+        kept_bytes += size
+        expired = (
+            (max_entries and index >= max_entries)
+            or (max_age and now - created > max_age)
+            or (max_bytes and kept_bytes > max_bytes)
+        )
+        with _history_lock:
+            if expired:
+                try:
+                    os.remove(path)
+                    stats["removed"] += 1
+                except OSError:
+                    pass
+                continue
+            if isinstance(data.get("json"), dict):
+                data = compact_history_entry(data)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2)
+                stats["compacted"] += 1
+        reference = data.get("json_ref")
+        if isinstance(reference, dict) and reference.get("blob"):
+            referenced.add(reference["blob"])
+
+    for entry in os.scandir(get_blob_dir()):
+        digest = entry.name[:-len(".json")] if entry.name.endswith(".json") else None
+        if digest in referenced or (digest is None and not entry.name.endswith(".part")):
+            continue
+        try:
+            if now - entry.stat().st_mtime > BLOB_GRACE_SECONDS:
+                os.remove(entry.path)
+                stats["blobs_removed"] += 1
+        except OSError:
+            pass
+    if stats["removed"] or stats["compacted"]:
+        _history_version += 1
+    return stats
+
+def _run_history_compactor():
+    while True:
+        try:
+            stats = compact_history()
+            if stats["removed"] or stats["compacted"] or stats["blobs_removed"]:
+                print(f"CozyGen: history compaction {stats}")
+        except Exception as e:
+            print(f"CozyGen: history compaction failed: {e}")
+        time.sleep(HISTORY_COMPACT_INTERVAL)
+
+def ensure_history_compactor():
+    global _history_compactor
+    if _history_compactor is None:
+        _history_compactor = threading.Thread(target=_run_history_compactor, name="cozygen-history-compactor", daemon=True)
+        _history_compactor.start()
+
+# Bumped on every history write; together with the directory mtime it keys the
+# memoised /cozygen/history body.
+_history_version = 0
+_history_list_body = (None, b"")
+
+def history_list_cache_key():
+    return ("history", _history_version, os.stat(get_history_dir()).st_mtime_ns)
+
+def get_history_list_body(cache_key) -> bytes:
+    global _history_list_body
+    cached_key, body = _history_list_body
+    if cached_key == cache_key:
+        return body
+    body = json.dumps({"items": list_history_entries()}).encode("utf-8")
+    _history_list_body = (cache_key, body)
+    return body
 
 def list_history_entries():
     history_dir = get_history_dir()
@@ -103,9 +442,12 @@ def list_history_entries():
         try:
             with open(path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-            entries.append(data)
         except Exception:
             continue
+        # The prompt graph is only sent by /cozygen/history/{id}; listings stay small.
+        data.pop("json", None)
+        data.pop("json_ref", None)
+        entries.append(data)
     entries.sort(key=lambda item: item.get("timestamp", ""), reverse=True)
     return entries
 
@@ -123,70 +465,1794 @@ def load_session():
 
 def write_session(data: dict):
     path = get_session_path()
+    with SESSION_WRITE_SECONDS.time():
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+RESULT_CACHE_FILENAME = "result_cache.json"
+# Inputs that only drive the CozyGen form, never what a node computes.
+RESULT_CACHE_IGNORED_INPUTS = frozenset({
+    "is_cozy", "run_id", "param_name", "priority", "add_randomize_toggle",
+    "display_bypass", "display_multiline",
+})
+
+_history_lock = threading.Lock()
+_result_cache_lock = threading.Lock()
+# run_id -> {"history_id", "result_hash"} for prompts queued by /cozygen/generate.
+_pending_runs = collections.OrderedDict()
+MAX_PENDING_RUNS = 1024
+
+def is_result_cache_enabled() -> bool:
+    return bool(get_config().get("result_cache", False))
+
+def prompt_cache_key(prompt: dict) -> str:
+    """Hash an injected prompt graph, ignoring titles and CozyGen bookkeeping inputs."""
+    canonical = {}
+    for node_id, node in prompt.items():
+        if not isinstance(node, dict):
+            continue
+        inputs = node.get("inputs") or {}
+        if str(node.get("class_type", "")).startswith("CozyGen"):
+            inputs = {key: value for key, value in inputs.items() if key not in RESULT_CACHE_IGNORED_INPUTS}
+        canonical[str(node_id)] = {"class_type": node.get("class_type"), "inputs": inputs}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+def get_result_cache_path() -> str:
+    cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, RESULT_CACHE_FILENAME)
+
+def load_result_cache() -> dict:
+    path = get_result_cache_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def write_result_cache(data: dict):
+    path = get_result_cache_path()
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2)
 
-@functools.lru_cache(maxsize=256)
-def build_thumbnail_bytes(path: str, mtime: float, size: int, width: int, quality: int, fmt: str):
-    with Image.open(path) as img:
-        img = ImageOps.exif_transpose(img)
-        if getattr(img, "is_animated", False):
-            try:
-                img.seek(0)
-            except Exception:
-                pass
+def register_pending_run(run_id: str, history_id: str, result_hash: str | None):
+    _pending_runs[run_id] = {"history_id": history_id, "result_hash": result_hash}
+    while len(_pending_runs) > MAX_PENDING_RUNS:
+        _pending_runs.popitem(last=False)
+
+def discard_pending_run(run_id: str):
+    _pending_runs.pop(run_id, None)
+
+def move_run_history(run_id: str, old_id: str, new_id: str):
+    """Re-key a run's history entry (and its result cache entry), keeping outputs already attached."""
+    with _history_lock:
+        entry = load_history_entry(old_id)
+        if entry is not None:
+            entry["id"] = new_id
+            write_history_entry(new_id, entry)
+            delete_history_entry(old_id)
+        pending = _pending_runs.get(run_id)
+        if pending is not None:
+            pending["history_id"] = new_id
+    with _result_cache_lock:
+        cache = load_result_cache()
+        moved = {result_hash: new_id for result_hash, history_id in cache.items() if history_id == old_id}
+        if moved:
+            cache.update(moved)
+            write_result_cache(cache)
+
+def record_run_outputs(run_id: str, outputs: list):
+    """Attach saved output files to the history entry of a /cozygen/generate run.
+
+    Called by the CozyGen output nodes from the execution thread. Runs with a
+    result hash also become reusable through the result cache.
+    """
+    pending = _pending_runs.get(run_id) if run_id else None
+    if not pending or not outputs:
+        return
+    with _history_lock:
+        # Read under the lock: move_run_history may be re-homing the entry right now.
+        history_id = pending["history_id"]
+        entry = load_history_entry(history_id)
+        if entry is None:
+            return
+        entry["outputs"] = [*entry.get("outputs", []), *outputs]
+        write_history_entry(history_id, entry)
+    if pending.get("result_hash"):
+        with _result_cache_lock:
+            cache = load_result_cache()
+            cache[pending["result_hash"]] = history_id
+            write_result_cache(cache)
+
+def output_file_exists(output: dict) -> bool:
+    base_dir = get_base_dir_for_type(output.get("type", "output"))
+    path = normalize_media_path(base_dir, output.get("subfolder", ""), output.get("filename", ""))
+    return bool(path) and os.path.isfile(path)
+
+def lookup_cached_result(result_hash: str):
+    """Return ``(history_id, outputs)`` for a previous identical run whose files all still exist.
+
+    Entries whose history or output files are gone are dropped from the index.
+    """
+    with _result_cache_lock:
+        history_id = load_result_cache().get(result_hash)
+    if not history_id:
+        return None
+    entry = load_history_entry(history_id)
+    outputs = (entry or {}).get("outputs") or []
+    if outputs and all(output_file_exists(output) for output in outputs):
+        return history_id, outputs
+    with _result_cache_lock:
+        cache = load_result_cache()
+        if cache.get(result_hash) == history_id:
+            del cache[result_hash]
+            write_result_cache(cache)
+    return None
 
-        if width and img.width > width:
-            target_height = max(1, int((img.height / img.width) * width))
-            img = img.resize((width, target_height), resample=Image.LANCZOS)
+def view_url_for(output: dict) -> str:
+    return f"/view?filename={output['filename']}&subfolder={output['subfolder']}&type={output['type']}"
 
-        if fmt == "webp":
-            try:
-                buffer = io.BytesIO()
-                img.save(buffer, format="WEBP", quality=quality, method=4)
-                return buffer.getvalue(), "image/webp"
-            except Exception:
-                fmt = "jpeg"
+def media_url_for(output: dict) -> str:
+    return "/cozygen/media?" + urlencode({
+        "filename": output["filename"],
+        "subfolder": output.get("subfolder", ""),
+        "type": output.get("type", "output"),
+    })
 
-        if fmt in ("jpeg", "jpg"):
-            if img.mode not in ("RGB", "L"):
-                img = img.convert("RGB")
+def announce_outputs(outputs: list, run_id: str = "", history_id: str | None = None, cached: bool = False):
+    """Send the same websocket events the output nodes emit for freshly saved files."""
+    server_instance = server.PromptServer.instance
+    if not server_instance:
+        return
+    images = []
+    for output in outputs:
+        item = {
+            "url": view_url_for(output),
+            "filename": output["filename"],
+            "subfolder": output["subfolder"],
+            "type": output["type"],
+        }
+        if output.get("kind") == "video":
+            server_instance.send_sync("cozygen_video_ready", {
+                "status": "video_generated",
+                "video_url": media_url_for(output),
+                "filename": item["filename"],
+                "subfolder": item["subfolder"],
+                "type": item["type"],
+                "run_id": run_id,
+                "history_id": history_id,
+                "cached": cached,
+            })
+        else:
+            images.append(item)
+    if images:
+        server_instance.send_sync("cozygen_batch_ready", {
+            "status": "images_generated",
+            "images": images,
+            "run_id": run_id,
+            "history_id": history_id,
+            "cached": cached,
+        })
+
+# Widths built together from one decode; the gallery's srcset asks for exactly these.
+THUMBNAIL_PYRAMID_WIDTHS = (256, 384, 512, 768)
+THUMBNAIL_FORMATS = ("webp", "jpeg", "jpg", "png")
+MAX_THUMBNAIL_CACHE_ENTRIES = 2048
+MAX_THUMBNAIL_CACHE_BYTES = 64 * 1024 * 1024
+THUMBNAIL_FILL_MAX_PENDING = 4
+AUDIO_THUMBNAIL_EXTENSIONS = ('.mp3', '.wav', '.flac')
+# Pseudo-format for audio: min/max peaks as JSON, one pair per pixel of the requested width.
+WAVEFORM_PEAKS_FORMAT = "peaks"
+WAVEFORM_ASPECT = 0.75
+WAVEFORM_BACKGROUND = (31, 41, 55)
+WAVEFORM_COLOR = (156, 163, 175)
+AUDIO_DECODE_CHUNK_FRAMES = 65536
+# ffmpeg resamples to this rate; plenty for a picture of the envelope.
+AUDIO_DECODE_SAMPLE_RATE = 22050
+WAVEFORM_MIN_BLOCK = 32
+WAVEFORM_MAX_BLOCKS = 8192
+
+# (path, mtime, size, width, quality, fmt) -> (bytes, content_type), least recently used first.
+_thumbnail_cache = collections.OrderedDict()
+_thumbnail_cache_bytes = 0
+_thumbnail_cache_lock = threading.Lock()
+# Sources whose remaining pyramid levels are queued on the fill worker; guarded by _thumbnail_cache_lock.
+_thumbnail_fills = set()
+_thumbnail_fill_executor = None
+
+def get_thumbnail_pyramid_config():
+    config = get_config()
+    try:
+        widths = {max(32, min(1024, int(w))) for w in config.get("thumbnail_widths", THUMBNAIL_PYRAMID_WIDTHS)}
+    except (TypeError, ValueError):
+        widths = set(THUMBNAIL_PYRAMID_WIDTHS)
+    formats = config.get("thumbnail_formats", ("webp",))
+    if isinstance(formats, str):
+        formats = [formats]
+    formats = {str(fmt).lower() for fmt in formats} & set(THUMBNAIL_FORMATS)
+    return widths, formats
+
+def decode_thumbnail_source(img, largest: int):
+    if getattr(img, "is_animated", False):
+        try:
+            img.seek(0)
+        except Exception:
+            pass
+    if largest and img.format == "JPEG":
+        # libjpeg decodes straight to 1/2, 1/4 or 1/8 scale but never below the requested box;
+        # a square box keeps the target width after an EXIF rotation.
+        img.draft("RGB", (largest, largest))
+    img = ImageOps.exif_transpose(img)
+    img.load()
+    if img.mode not in ("RGB", "RGBA", "L", "LA"):
+        # Palette and 16-bit images would otherwise resize with nearest-neighbour or not at all.
+        has_alpha = "A" in img.getbands() or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    return img
+
+def encode_thumbnail(img, quality: int, fmt: str):
+    if fmt == "webp":
+        try:
             buffer = io.BytesIO()
+            with trace_phase("encode"), IMAGE_ENCODE_SECONDS.time("webp"):
+                img.save(buffer, format="WEBP", quality=quality, method=4)
+            return buffer.getvalue(), "image/webp"
+        except Exception:
+            fmt = "jpeg"
+
+    if fmt in ("jpeg", "jpg"):
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        with trace_phase("encode"), IMAGE_ENCODE_SECONDS.time("jpeg"):
             img.save(buffer, format="JPEG", quality=quality, optimize=True)
-            return buffer.getvalue(), "image/jpeg"
+        return buffer.getvalue(), "image/jpeg"
 
-        if fmt == "png":
-            buffer = io.BytesIO()
+    if fmt == "png":
+        buffer = io.BytesIO()
+        with trace_phase("encode"), IMAGE_ENCODE_SECONDS.time("png"):
             img.save(buffer, format="PNG", optimize=True)
-            return buffer.getvalue(), "image/png"
+        return buffer.getvalue(), "image/png"
 
     raise ValueError("Unsupported format")
 
-async def get_hello(request: web.Request) -> web.Response:
-    return web.json_response({"status": "success", "message": "Hello from the CozyGen API!"})
+def iter_thumbnail_pyramid(path: str, widths, quality: int, formats, first=None):
+    """Decode ``path`` once and yield ((width, fmt), (bytes, content_type)) per level, ``first`` before the rest.
+
+    A cheap integer ``reduce`` gets within 2x of the largest width and only that level is
+    kept; ``first`` is resampled from it and every other level from the next larger one.
+    """
+    if path.lower().endswith(AUDIO_THUMBNAIL_EXTENSIONS):
+        yield from iter_waveform_pyramid(path, widths, quality, formats, first)
+        return
+    widths = sorted({w for w in widths if w}, reverse=True) or [0]
+    keys = sorted(((width, fmt) for width in widths for fmt in formats), key=lambda key: key != first)
+    with Image.open(path) as img:
+        with trace_phase("decode"):
+            img = decode_thumbnail_source(img, widths[0])
+        aspect = img.height / img.width
+        if widths[0]:
+            factor = img.width // (widths[0] * 2)
+            if factor >= 2:
+                with trace_phase("resize"):
+                    img = img.reduce(factor)
+        levels = {widths[0]: img}
+        del img
+
+        def level_for(width):
+            level = levels.get(width)
+            if level is None:
+                level = levels[min(w for w in levels if w > width)]
+                if level.width > width:
+                    with trace_phase("resize"):
+                        level = level.resize((width, max(1, int(aspect * width))), resample=Image.LANCZOS)
+                levels[width] = level
+            return level
+
+        if widths[0] and levels[widths[0]].width > widths[0]:
+            with trace_phase("resize"):
+                levels[widths[0]] = levels[widths[0]].resize(
+                    (widths[0], max(1, int(aspect * widths[0]))), resample=Image.LANCZOS)
+        for width, fmt in keys:
+            yield (width, fmt), encode_thumbnail(level_for(width), quality, fmt)
+
+def build_thumbnail_pyramid(path: str, widths, quality: int, formats) -> dict:
+    """Every width in every format from one decode; keyed by (width, fmt)."""
+    return dict(iter_thumbnail_pyramid(path, widths, quality, formats))
+
+def _wav_chunks(wav, np):
+    width = wav.getsampwidth()
+    channels = wav.getnchannels()
+    while True:
+        raw = wav.readframes(AUDIO_DECODE_CHUNK_FRAMES)
+        if not raw:
+            return
+        if width == 1:
+            samples = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128) / 128
+        elif width == 2:
+            samples = np.frombuffer(raw, "<i2").astype(np.float32) / 32768
+        elif width == 3:
+            triplets = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+            ints = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+            samples = ((ints << 8) >> 8).astype(np.float32) / 8388608
+        elif width == 4:
+            samples = np.frombuffer(raw, "<i4").astype(np.float32) / 2147483648
+        else:
+            raise ValueError(f"Unsupported WAV sample width: {width}")
+        yield samples.reshape(-1, channels).mean(axis=1)
+
+def _ffmpeg_chunks(path: str, np):
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg is required to decode this audio file")
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", path,
+               "-vn", "-ac", "1", "-ar", str(AUDIO_DECODE_SAMPLE_RATE), "-f", "f32le", "-"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            raw = process.stdout.read(AUDIO_DECODE_CHUNK_FRAMES * 4)
+            if not raw:
+                break
+            yield np.frombuffer(raw[:len(raw) - len(raw) % 4], "<f4")
+        if process.wait() != 0:
+            raise RuntimeError(process.stderr.read().decode("utf-8", "replace").strip() or "ffmpeg failed")
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+def open_audio_samples(path: str, np):
+    """Return ``(sample_rate, chunks)``; chunks are mono float32 arrays decoded lazily."""
+    if path.lower().endswith(".wav"):
+        try:
+            wav = wave.open(path, "rb")
+        except (wave.Error, EOFError):
+            # Float and WAVE_FORMAT_EXTENSIBLE files; ffmpeg reads those.
+            wav = None
+        if wav is not None:
+            def chunks():
+                with wav:
+                    yield from _wav_chunks(wav, np)
+            return wav.getframerate(), chunks()
+    return AUDIO_DECODE_SAMPLE_RATE, _ffmpeg_chunks(path, np)
+
+class _PeakAccumulator:
+    """Min/max per block of samples, fed one decoded chunk at a time.
+
+    Once more than WAVEFORM_MAX_BLOCKS blocks exist, neighbours merge pairwise and the
+    block size doubles, so memory stays fixed however long the audio is. An odd last
+    block is kept as a whole block, which shifts later peaks by under one block.
+    """
+
+    def __init__(self, np):
+        self.np = np
+        self.block = WAVEFORM_MIN_BLOCK
+        self.mins = np.empty(0, np.float32)
+        self.maxs = np.empty(0, np.float32)
+        self.carry = np.empty(0, np.float32)
+        self.frames = 0
+
+    def add(self, samples):
+        np = self.np
+        self.frames += samples.size
+        if self.carry.size:
+            samples = np.concatenate((self.carry, samples))
+        usable = samples.size - samples.size % self.block
+        self.carry = samples[usable:].copy()
+        if usable:
+            blocks = samples[:usable].reshape(-1, self.block)
+            self.mins = np.concatenate((self.mins, blocks.min(axis=1)))
+            self.maxs = np.concatenate((self.maxs, blocks.max(axis=1)))
+        while self.mins.size > WAVEFORM_MAX_BLOCKS:
+            self.mins = self._merge(self.mins, np.minimum)
+            self.maxs = self._merge(self.maxs, np.maximum)
+            self.block *= 2
+
+    def _merge(self, values, reduce):
+        paired = values.size - values.size % 2
+        merged = reduce(values[0:paired:2], values[1:paired:2])
+        return self.np.concatenate((merged, values[paired:]))
+
+    def finish(self):
+        np = self.np
+        if self.carry.size:
+            self.mins = np.append(self.mins, self.carry.min())
+            self.maxs = np.append(self.maxs, self.carry.max())
+            self.carry = self.carry[:0]
+        return self.mins, self.maxs
+
+def reduce_peaks(np, mins, maxs, bins: int):
+    """Vectorised min/max down to ``bins`` columns; shorter input is stretched to fit."""
+    if mins.size == 0:
+        zeros = np.zeros(bins, np.float32)
+        return zeros, zeros
+    edges = np.arange(bins) * mins.size // bins
+    if mins.size <= bins:
+        return mins[edges], maxs[edges]
+    return np.minimum.reduceat(mins, edges), np.maximum.reduceat(maxs, edges)
+
+def render_waveform(np, mins, maxs, width: int):
+    height = max(1, int(width * WAVEFORM_ASPECT))
+    low, high = reduce_peaks(np, mins, maxs, width)
+    # Scale to the loudest peak so quiet clips still fill the tile.
+    scale = max(float(np.abs(low).max()), float(np.abs(high).max()), 1e-3)
+    middle = (height - 1) / 2
+    top = np.floor(middle - np.clip(high / scale, -1, 1) * middle)
+    bottom = np.ceil(middle - np.clip(low / scale, -1, 1) * middle)
+    rows = np.arange(height)[:, None]
+    pixels = np.empty((height, width, 3), np.uint8)
+    pixels[:] = WAVEFORM_BACKGROUND
+    pixels[(rows >= top) & (rows <= bottom)] = WAVEFORM_COLOR
+    return Image.fromarray(pixels, "RGB")
+
+def encode_waveform_peaks(np, mins, maxs, bins: int, sample_rate: int, frames: int) -> bytes:
+    """audiowaveform-style JSON (8-bit, interleaved min/max), as read by peaks.js and wavesurfer."""
+    low, high = reduce_peaks(np, mins, maxs, bins)
+    data = np.clip(np.round(np.stack((low, high), axis=1).ravel() * 127), -128, 127).astype(int)
+    return json.dumps({
+        "version": 2,
+        "channels": 1,
+        "sample_rate": sample_rate,
+        "samples_per_pixel": max(1, round(frames / bins)),
+        "bits": 8,
+        "length": bins,
+        "duration": round(frames / sample_rate, 3) if sample_rate else 0,
+        "data": data.tolist(),
+    }, separators=(",", ":")).encode("utf-8")
+
+def iter_waveform_pyramid(path: str, widths, quality: int, formats, first=None):
+    """Stream-decode ``path`` once; yield waveform images and/or peaks JSON, ``first`` before the rest."""
+    import numpy as np
+
+    with trace_phase("decode"):
+        sample_rate, chunks = open_audio_samples(path, np)
+        peaks = _PeakAccumulator(np)
+        for chunk in chunks:
+            peaks.add(chunk)
+        mins, maxs = peaks.finish()
+    widths = sorted({w for w in widths if w}, reverse=True)
+    keys = sorted(((width, fmt) for width in widths for fmt in formats), key=lambda key: key != first)
+    images = {}
+    for width, fmt in keys:
+        if fmt == WAVEFORM_PEAKS_FORMAT:
+            yield (width, fmt), (
+                encode_waveform_peaks(np, mins, maxs, width, sample_rate, peaks.frames), "application/json")
+            continue
+        image = images.get(width)
+        if image is None:
+            with trace_phase("resize"):
+                image = images[width] = render_waveform(np, mins, maxs, width)
+        yield (width, fmt), encode_thumbnail(image, quality, fmt)
 
-async def get_gallery_files(request: web.Request) -> web.Response:
-    subfolder = request.rel_url.query.get('subfolder', '')
+def build_waveform_pyramid(path: str, widths, quality: int, formats) -> dict:
+    """Waveform images and/or peaks JSON keyed by (width, fmt)."""
+    return dict(iter_waveform_pyramid(path, widths, quality, formats))
+
+def build_thumbnail_bytes(path: str, mtime: float, size: int, width: int, quality: int, fmt: str):
+    return build_thumbnail_pyramid(path, [width], quality, [fmt])[(width, fmt)]
+
+def store_thumbnails(path: str, mtime: float, size: int, quality: int, levels):
+    """Cache ((width, fmt), (bytes, content_type)) pairs for one source, evicting the least recently used."""
+    global _thumbnail_cache_bytes
+    with _thumbnail_cache_lock:
+        for (level_width, level_fmt), level in levels:
+            # Quality means nothing to peaks; one entry serves every request.
+            level_quality = 0 if level_fmt == WAVEFORM_PEAKS_FORMAT else quality
+            level_key = (path, mtime, size, level_width, level_quality, level_fmt)
+            previous = _thumbnail_cache.pop(level_key, None)
+            if previous is not None:
+                _thumbnail_cache_bytes -= len(previous[0])
+            _thumbnail_cache[level_key] = level
+            _thumbnail_cache_bytes += len(level[0])
+        while len(_thumbnail_cache) > 1 and (
+            len(_thumbnail_cache) > MAX_THUMBNAIL_CACHE_ENTRIES or _thumbnail_cache_bytes > MAX_THUMBNAIL_CACHE_BYTES
+        ):
+            _, evicted = _thumbnail_cache.popitem(last=False)
+            _thumbnail_cache_bytes -= len(evicted[0])
+            THUMBNAIL_CACHE_EVENTS.inc("eviction")
+        THUMBNAIL_CACHE_ENTRIES.set(len(_thumbnail_cache))
+        THUMBNAIL_CACHE_BYTES.set(_thumbnail_cache_bytes)
+
+def _run_thumbnail_fill(fill_key, levels):
+    path, mtime, size, quality = fill_key
     try:
-        page = int(request.rel_url.query.get('page', '1'))
-        per_page = int(request.rel_url.query.get('per_page', '20'))
-    except ValueError:
-        return web.json_response({"error": "Invalid page or per_page parameter"}, status=400)
+        for level in levels:
+            store_thumbnails(path, mtime, size, quality, [level])
+    except Exception as e:
+        print(f"CozyGen: thumbnail pyramid for {path} failed: {e}")
+    finally:
+        levels.close()
+        with _thumbnail_cache_lock:
+            _thumbnail_fills.discard(fill_key)
+
+def schedule_thumbnail_fill(path: str, mtime: float, size: int, quality: int, levels):
+    """Encode the rest of a pyramid on the background worker; dropped if one is already pending for the source."""
+    global _thumbnail_fill_executor
+    fill_key = (path, mtime, size, quality)
+    with _thumbnail_cache_lock:
+        # Each pending fill holds its decoded largest level; past the cap, levels are built on demand.
+        if fill_key in _thumbnail_fills or len(_thumbnail_fills) >= THUMBNAIL_FILL_MAX_PENDING:
+            levels.close()
+            return
+        _thumbnail_fills.add(fill_key)
+        if _thumbnail_fill_executor is None:
+            _thumbnail_fill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cozygen-thumbnails")
+    _thumbnail_fill_executor.submit(_run_thumbnail_fill, fill_key, levels)
+
+def get_thumbnail_bytes(path: str, mtime: float, size: int, width: int, quality: int, fmt: str):
+    key = (path, mtime, size, width, 0 if fmt == WAVEFORM_PEAKS_FORMAT else quality, fmt)
+    with _thumbnail_cache_lock:
+        cached = _thumbnail_cache.get(key)
+        if cached is not None:
+            _thumbnail_cache.move_to_end(key)
+    if cached is not None:
+        THUMBNAIL_CACHE_EVENTS.inc("hit")
+        return cached
+    THUMBNAIL_CACHE_EVENTS.inc("miss")
+
+    # A gallery tile asks for its srcset widths one by one; decode once for all of them,
+    # serve the requested level as soon as it is encoded and finish the rest in the background.
+    widths, formats = get_thumbnail_pyramid_config()
+    if path.lower().endswith(AUDIO_THUMBNAIL_EXTENSIONS):
+        # Decoding dominates, so the scrubber's peaks come along with the tile's image.
+        formats = formats | {WAVEFORM_PEAKS_FORMAT}
+    levels = iter_thumbnail_pyramid(path, widths | {width}, quality, formats | {fmt}, first=(width, fmt))
+    try:
+        with THUMBNAIL_BUILD_SECONDS.time(fmt):
+            _, requested = next(levels)
+    except BaseException:
+        levels.close()
+        raise
+    store_thumbnails(path, mtime, size, quality, [((width, fmt), requested)])
+    schedule_thumbnail_fill(path, mtime, size, quality, levels)
+    return requested
+
+COZYGEN_INPUT_TYPES = (
+    "CozyGenDynamicInput",
+    "CozyGenImageInput",
+    "CozyGenFloatInput",
+    "CozyGenIntInput",
+    "CozyGenStringInput",
+    "CozyGenChoiceInput",
+    "CozyGenLoraInput",
+    "CozyGenLoraInputMulti",
+    "CozyGenWanVideoModelSelector",
+    "CozyGenBoolInput",
+)
+LORA_MULTI_SLOTS = 5
+
+# Parsed workflows keyed by absolute path; each entry remembers the (mtime_ns, size)
+# it was built from so edits on disk are picked up on the next request.
+_workflow_cache = {}
+_workflow_cache_lock = threading.Lock()
+
+def resolve_workflow_path(filename: str) -> str | None:
+    if not filename:
+        return None
+    return normalize_media_path(get_workflows_dir(), "", filename)
 
-    output_directory = folder_paths.get_output_directory()
+def invalidate_workflow_cache(path: str):
+    with _workflow_cache_lock:
+        _workflow_cache.pop(os.path.normpath(path), None)
 
-    # Security: Prevent directory traversal
-    gallery_path = os.path.normpath(os.path.join(output_directory, subfolder))
-    if not gallery_path.startswith(output_directory):
-        return web.json_response({"error": "Unauthorized path"}, status=403)
+def _to_number(value, default=None):
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
 
-    if not os.path.exists(gallery_path) or not os.path.isdir(gallery_path):
-        return web.json_response({"error": "Gallery directory not found"}, status=404)
+def _schema_default(class_type: str, inputs: dict):
+    # Mirrors the defaults the web UI derives in prepareWorkflowData.
+    if class_type == "CozyGenIntInput":
+        try:
+            return int(inputs.get("default_value"))
+        except (TypeError, ValueError):
+            return None
+    if class_type == "CozyGenFloatInput":
+        return _to_number(inputs.get("default_value"))
+    if class_type in ("CozyGenDynamicInput", "CozyGenStringInput"):
+        return inputs.get("default_value")
+    if class_type == "CozyGenChoiceInput":
+        return inputs.get("value") or inputs.get("default_choice")
+    if class_type == "CozyGenLoraInput":
+        return {"lora": inputs.get("lora_value"), "strength": inputs.get("strength_value")}
+    if class_type == "CozyGenLoraInputMulti":
+        return [
+            {"lora": inputs.get(f"lora_{index}"), "strength": inputs.get(f"strength_{index}")}
+            for index in range(LORA_MULTI_SLOTS)
+        ]
+    if class_type == "CozyGenWanVideoModelSelector":
+        return {
+            "model_name": inputs.get("model_name"),
+            "base_precision": inputs.get("base_precision") or "bf16",
+            "quantization": inputs.get("quantization") or "disabled",
+            "load_device": inputs.get("load_device") or "offload_device",
+        }
+    if class_type == "CozyGenImageInput":
+        return inputs.get("image")
+    if class_type == "CozyGenBoolInput":
+        return inputs.get("value")
+    return None
 
-    items = os.listdir(gallery_path)
-    gallery_items = []
+def _schema_param_type(class_type: str, inputs: dict) -> str:
+    if class_type == "CozyGenDynamicInput":
+        return inputs.get("param_type") or "STRING"
+    if class_type == "CozyGenChoiceInput":
+        return "DROPDOWN"
+    if class_type == "CozyGenLoraInputMulti":
+        return "LORA_MULTI"
+    if class_type == "CozyGenWanVideoModelSelector":
+        return "WANVIDEO_MODEL"
+    return class_type.replace("CozyGen", "").replace("Input", "").upper()
+
+def _schema_choice_type(class_type: str, node: dict, inputs: dict) -> str | None:
+    if class_type in ("CozyGenLoraInput", "CozyGenLoraInputMulti"):
+        return "loras"
+    if class_type == "CozyGenWanVideoModelSelector":
+        return "wanvideo_models"
+    if class_type == "CozyGenChoiceInput":
+        return inputs.get("choice_type") or None
+    if class_type == "CozyGenDynamicInput" and inputs.get("param_type") == "DROPDOWN":
+        properties = node.get("properties") if isinstance(node.get("properties"), dict) else {}
+        return inputs.get("choice_type") or properties.get("choice_type") or None
+    return None
+
+def build_workflow_schema(workflow: dict) -> list:
+    """Collect the CozyGen input nodes of an API-format workflow, sorted by priority."""
+    schema = []
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type")
+        if class_type not in COZYGEN_INPUT_TYPES:
+            continue
+        raw_inputs = node.get("inputs") if isinstance(node.get("inputs"), dict) else {}
+        # Links to other nodes are lists; only literal widget values belong in the form.
+        inputs = {key: value for key, value in raw_inputs.items() if not isinstance(value, list)}
+        if class_type == "CozyGenImageInput" and not inputs.get("param_name"):
+            inputs["param_name"] = "Image Input"
+        schema.append({
+            "id": str(node_id),
+            "class_type": class_type,
+            "param_name": inputs.get("param_name"),
+            "priority": _to_number(inputs.get("priority"), 0),
+            "param_type": _schema_param_type(class_type, inputs),
+            "choice_type": _schema_choice_type(class_type, node, inputs),
+            "default": _schema_default(class_type, inputs),
+            "min": _to_number(inputs.get("min_value")),
+            "max": _to_number(inputs.get("max_value")),
+            "step": _to_number(inputs.get("step")),
+            "randomize_toggle": bool(inputs.get("add_randomize_toggle", False)),
+            "bypass_toggle": bool(inputs.get("display_bypass", False)),
+            "multiline": bool(inputs.get("display_multiline") or inputs.get("multiline")),
+            "inputs": inputs,
+        })
+    schema.sort(key=lambda item: item["priority"])
+    return schema
+
+def build_node_titles(workflow: dict) -> dict:
+    titles = {}
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict):
+            continue
+        meta = node.get("_meta") if isinstance(node.get("_meta"), dict) else {}
+        titles[str(node_id)] = node.get("title") or meta.get("title") or node.get("class_type") or str(node_id)
+    return titles
+
+def load_workflow(filename: str) -> dict | None:
+    """Return the cached parse of a workflow file, re-reading it only when it changed on disk.
+
+    The entry holds the raw ``text``, the parsed ``workflow``, its precomputed
+    form ``schema`` and ``node_titles``. Returns None when the file does not exist or escapes the
+    workflows directory; JSON errors are raised to the caller.
+    """
+    path = resolve_workflow_path(filename)
+    if not path or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _workflow_cache_lock:
+        cached = _workflow_cache.get(path)
+    if cached and cached["key"] == key:
+        return cached
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    workflow = json.loads(text)
+    is_graph = isinstance(workflow, dict)
+    entry = {
+        "key": key,
+        "text": text,
+        "workflow": workflow,
+        "schema": build_workflow_schema(workflow) if is_graph else [],
+        "node_titles": build_node_titles(workflow) if is_graph else {},
+    }
+    with _workflow_cache_lock:
+        _workflow_cache[path] = entry
+    return entry
+
+BYPASSABLE_INPUT_TYPES = ("CozyGenDynamicInput", "CozyGenChoiceInput")
+COZYGEN_OUTPUT_TYPES = ("CozyGenOutput", "CozyGenVideoOutput")
+RANDOM_MAX_DEFAULT = 1000000
+
+class WorkflowInjectionError(ValueError):
+    pass
+
+def now_iso() -> str:
+    # Same shape as JavaScript's Date.toISOString so history timestamps sort together.
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+def _is_link(value) -> bool:
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], (str, int))
+
+def apply_bypass(workflow: dict, node_id: str):
+    """Remove a bypassed CozyGen input together with the node it feeds.
+
+    Consumers of that node are rewired to the node's own upstream input with the
+    same name, matching what the web UI has always done client-side.
+    """
+    target_id = None
+    for candidate_id, candidate in workflow.items():
+        inputs = candidate.get("inputs") or {}
+        if any(_is_link(value) and str(value[0]) == node_id for value in inputs.values()):
+            target_id = candidate_id
+            break
+    if target_id is None:
+        return
+
+    target_inputs = workflow[target_id].get("inputs") or {}
+    upstream_sources = {}
+    for input_name, value in target_inputs.items():
+        if not _is_link(value):
+            continue
+        source = workflow.get(str(value[0]))
+        if source and source.get("class_type") not in BYPASSABLE_INPUT_TYPES:
+            upstream_sources[input_name] = value
+    if not upstream_sources:
+        return
+
+    for node in workflow.values():
+        inputs = node.get("inputs") or {}
+        for input_name, value in inputs.items():
+            if _is_link(value) and str(value[0]) == target_id and input_name in upstream_sources:
+                inputs[input_name] = upstream_sources[input_name]
+
+    workflow.pop(target_id, None)
+    workflow.pop(node_id, None)
+
+def random_value_for(item: dict):
+    minimum = item.get("min") or 0
+    maximum = item.get("max") or RANDOM_MAX_DEFAULT
+    is_float = item["class_type"] == "CozyGenFloatInput" or item.get("param_type") == "FLOAT"
+    if is_float:
+        return random.uniform(minimum, maximum)
+    minimum, maximum = int(minimum), int(maximum)
+    if maximum < minimum:
+        minimum, maximum = maximum, minimum
+    return random.randint(minimum, maximum)
+
+def inject_workflow_values(workflow: dict, schema: list, values: dict, randomize: dict | None = None,
+                           bypass: dict | None = None, run_id: str = "") -> tuple[dict, dict]:
+    """Write form values into a copy of an API-format workflow, in place.
+
+    Returns ``(workflow, applied)`` where ``applied`` maps every param name to the
+    value actually used, including freshly drawn random values.
+    """
+    randomize = randomize or {}
+    bypass = bypass or {}
+    applied = {}
+    meta_lines = []
+
+    for item in schema:
+        if item["class_type"] in BYPASSABLE_INPUT_TYPES and bypass.get(item["param_name"]):
+            apply_bypass(workflow, item["id"])
+
+    for item in schema:
+        node = workflow.get(item["id"])
+        if node is None:
+            continue
+        param_name = item["param_name"]
+        class_type = item["class_type"]
+        inputs = node.setdefault("inputs", {})
+
+        if class_type == "CozyGenImageInput":
+            image = values.get(param_name) or item["default"]
+            if not image:
+                raise WorkflowInjectionError(f"Please upload an image for \"{param_name}\" before generating.")
+            inputs["image"] = image
+            applied[param_name] = image
+            continue
+
+        if randomize.get(param_name):
+            value = random_value_for(item)
+        else:
+            value = values.get(param_name, item["default"])
+        applied[param_name] = value
+
+        if class_type in ("CozyGenFloatInput", "CozyGenIntInput", "CozyGenStringInput", "CozyGenDynamicInput"):
+            inputs["default_value"] = value
+        elif class_type in ("CozyGenChoiceInput", "CozyGenBoolInput"):
+            inputs["value"] = value
+        elif class_type == "CozyGenLoraInput":
+            value = value if isinstance(value, dict) else {}
+            lora = value.get("lora") or "None"
+            strength = value.get("strength") or 0
+            if lora != "None" and strength != 0:
+                meta_lines.append(f"{param_name} = {lora}:{float(strength):.2f}")
+            inputs["lora_value"] = lora
+            inputs["strength_value"] = strength
+        elif class_type == "CozyGenLoraInputMulti":
+            slots = value if isinstance(value, list) else []
+            for index in range(LORA_MULTI_SLOTS):
+                slot = slots[index] if index < len(slots) and isinstance(slots[index], dict) else {}
+                lora = slot.get("lora") or "None"
+                strength = slot.get("strength") or 0
+                if lora != "None" and strength != 0:
+                    meta_lines.append(f"{param_name} {index + 1} = {lora}:{float(strength):.2f}")
+                inputs[f"lora_{index}"] = lora
+                inputs[f"strength_{index}"] = strength
+        elif class_type == "CozyGenWanVideoModelSelector":
+            value = value if isinstance(value, dict) else {}
+            inputs["model_name"] = value.get("model_name") or "none"
+            inputs["base_precision"] = value.get("base_precision") or "bf16"
+            inputs["quantization"] = value.get("quantization") or "disabled"
+            inputs["load_device"] = value.get("load_device") or "offload_device"
+
+    for node in workflow.values():
+        class_type = node.get("class_type") or ""
+        if not class_type.startswith("CozyGen"):
+            continue
+        inputs = node.setdefault("inputs", {})
+        inputs["is_cozy"] = True
+        if class_type == "CozyGenMetaText":
+            inputs["value"] = "\n".join(meta_lines)
+        if class_type in COZYGEN_OUTPUT_TYPES:
+            inputs["run_id"] = run_id
+
+    return workflow, applied
+
+MAX_SWEEP_JOBS_DEFAULT = 1000
+
+def get_max_sweep_jobs() -> int:
+    try:
+        return max(1, int(get_config().get("max_sweep_jobs", MAX_SWEEP_JOBS_DEFAULT)))
+    except (TypeError, ValueError):
+        return MAX_SWEEP_JOBS_DEFAULT
+
+def _sweep_range(spec: dict, param_name: str) -> list:
+    try:
+        start = spec["start"]
+        stop = spec["stop"]
+        step = spec.get("step", 1)
+        if isinstance(start, bool) or isinstance(stop, bool) or isinstance(step, bool):
+            raise TypeError
+        start, stop, step = (value if isinstance(value, (int, float)) else float(value) for value in (start, stop, step))
+        # "inf"/"nan" parse as floats; neither gives a countable range.
+        if not all(math.isfinite(value) for value in (start, stop, step)):
+            raise ValueError
+    except (KeyError, TypeError, ValueError, OverflowError):
+        raise WorkflowInjectionError(f"Axis '{param_name}' range needs finite numeric 'start', 'stop' and optional 'step'")
+    try:
+        span = (stop - start) / step if step else -1
+    except OverflowError:
+        span = math.inf
+    if span < 0:
+        raise WorkflowInjectionError(f"Axis '{param_name}' range never reaches its stop value")
+    if span >= get_max_sweep_jobs():
+        raise WorkflowInjectionError(f"Axis '{param_name}' range has more than {get_max_sweep_jobs()} values")
+    # Inclusive of stop; the epsilon keeps 0.1-style float steps from dropping the last value.
+    count = int(span + 1e-9) + 1
+    if count > get_max_sweep_jobs():
+        raise WorkflowInjectionError(f"Axis '{param_name}' range has more than {get_max_sweep_jobs()} values")
+    if all(isinstance(value, int) for value in (start, stop, step)):
+        return [start + index * step for index in range(count)]
+    return [round(start + index * step, 10) for index in range(count)]
+
+def parse_sweep_axes(axes, schema: list) -> list[tuple[str, list]]:
+    """Validate sweep axes against a workflow schema.
+
+    Each axis is ``{"param": name, "values": [...]}`` or
+    ``{"param": name, "range": {"start", "stop", "step"}}`` with an inclusive stop.
+    """
+    if not isinstance(axes, list) or not axes:
+        raise WorkflowInjectionError("'axes' must be a non-empty list")
+    param_names = {item["param_name"] for item in schema}
+    parsed = []
+    seen = set()
+    for axis in axes:
+        if not isinstance(axis, dict):
+            raise WorkflowInjectionError("Each axis must be an object")
+        param_name = axis.get("param")
+        if param_name not in param_names:
+            raise WorkflowInjectionError(f"Unknown CozyGen input '{param_name}'")
+        if param_name in seen:
+            raise WorkflowInjectionError(f"Axis '{param_name}' is listed more than once")
+        seen.add(param_name)
+        if isinstance(axis.get("range"), dict):
+            axis_values = _sweep_range(axis["range"], param_name)
+        elif isinstance(axis.get("values"), list) and axis["values"]:
+            axis_values = list(axis["values"])
+        else:
+            raise WorkflowInjectionError(f"Axis '{param_name}' needs a non-empty 'values' list or a 'range'")
+        parsed.append((param_name, axis_values))
+    return parsed
+
+def sweep_job_count(axes: list[tuple[str, list]]) -> int:
+    total = 1
+    for _, axis_values in axes:
+        total *= len(axis_values)
+    return total
+
+def expand_sweep(axes: list[tuple[str, list]]):
+    names = [name for name, _ in axes]
+    for combo in itertools.product(*(axis_values for _, axis_values in axes)):
+        yield dict(zip(names, combo))
+
+def get_local_prompt_url() -> str:
+    configured = get_config().get("comfyui_url")
+    if configured:
+        return f"{str(configured).rstrip('/')}/prompt"
+    instance = server.PromptServer.instance
+    address = getattr(instance, "address", None) or "127.0.0.1"
+    if address in ("0.0.0.0", "::"):
+        address = "127.0.0.1"
+    if ":" in address:
+        address = f"[{address}]"
+    port = getattr(instance, "port", None) or 8188
+    return f"http://{address}:{port}/prompt"
+
+_http_session = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60))
+    return _http_session
+
+async def queue_prompt(prompt: dict, client_id: str | None = None, prompt_id: str | None = None) -> tuple[int, dict]:
+    """Queue a prompt through ComfyUI's own /prompt route so its validation applies.
+
+    With ``backends`` configured it goes to the least loaded healthy backend instead.
+    ``prompt_id`` asks ComfyUI to use that id; older versions ignore it and pick their own.
+    """
+    if get_backend_urls():
+        return await dispatch_to_backend(prompt, client_id, prompt_id)
+    payload = {"prompt": prompt}
+    if client_id:
+        payload["client_id"] = client_id
+    if prompt_id:
+        payload["prompt_id"] = prompt_id
+    async with get_http_session().post(get_local_prompt_url(), json=payload) as resp:
+        try:
+            data = await resp.json(content_type=None)
+        except Exception:
+            data = {"error": await resp.text()}
+        return resp.status, data if isinstance(data, dict) else {"error": data}
+
+BACKEND_HEALTH_INTERVAL = 5.0
+BACKEND_REQUEST_TIMEOUT = 10.0
+BACKEND_RECONNECT_DELAY = 2.0
+BACKEND_DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+# Execution events worth showing local clients; CozyGen's own *_ready events are re-sent
+# once the files are local, with local URLs.
+RELAYED_BACKEND_EVENTS = frozenset({
+    "execution_start", "execution_cached", "executing", "progress", "executed",
+    "execution_success", "execution_error", "execution_interrupted",
+})
+REMOTE_OUTPUT_KEYS = ("images", "videos", "gifs", "audio")
+REMOTE_VIDEO_EXTENSIONS = (".mp4", ".m4v", ".webm", ".mov", ".mkv")
+
+# url -> {"url", "client_id", "healthy", "queue_remaining", "checked_at", "last_error", "relay", "connected",
+#         "dispatching"}
+_backends = {}
+# prompt_id -> {"backend", "prompt", "run_id", "client_id", "queued_at"} for prompts running on a backend.
+_remote_prompts = {}
+# Prompts a backend finished before its /prompt response reached us; (url, prompt_id), oldest first.
+_early_finished = collections.OrderedDict()
+# Prompts whose finish was already handled, so the duplicate "executing: None" after
+# "execution_success" is not mistaken for an early finish; (url, prompt_id), oldest first.
+_finished_remote = collections.OrderedDict()
+MAX_EARLY_FINISHED = 256
+
+def _remember_prompt(entries: collections.OrderedDict, key: tuple):
+    entries[key] = True
+    while len(entries) > MAX_EARLY_FINISHED:
+        entries.popitem(last=False)
+_backend_monitor = None
+
+def get_backend_urls() -> list:
+    backends = get_config().get("backends") or []
+    if isinstance(backends, str):
+        backends = [backends]
+    return [str(url).rstrip("/") for url in backends if url]
+
+def sync_backend_states() -> list:
+    urls = get_backend_urls()
+    for url in list(_backends):
+        if url not in urls:
+            relay = _backends.pop(url).get("relay")
+            if relay is not None:
+                relay.cancel()
+    for url in urls:
+        if url not in _backends:
+            _backends[url] = {
+                "url": url,
+                # Prompts are queued under this id so the backend sends their events to our relay.
+                "client_id": f"cozygen-pool-{uuid.uuid4().hex}",
+                "healthy": False,
+                "queue_remaining": 0,
+                "checked_at": None,
+                "last_error": None,
+                "relay": None,
+                "connected": False,
+                # /prompt requests still awaiting a response; only then can a finish arrive early.
+                "dispatching": 0,
+            }
+    return [_backends[url] for url in urls]
+
+async def check_backend(state: dict):
+    try:
+        async with get_http_session().get(
+            f"{state['url']}/prompt", timeout=aiohttp.ClientTimeout(total=BACKEND_REQUEST_TIMEOUT)
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json(content_type=None)
+        state["queue_remaining"] = int(((data or {}).get("exec_info") or {}).get("queue_remaining", 0))
+        state["healthy"] = True
+        state["last_error"] = None
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, TypeError) as e:
+        state["healthy"] = False
+        state["last_error"] = str(e) or type(e).__name__
+    state["checked_at"] = time.time()
+
+def _prompt_run_id(prompt: dict) -> str:
+    for node in prompt.values():
+        if isinstance(node, dict) and node.get("class_type") in ("CozyGenOutput", "CozyGenVideoOutput"):
+            run_id = (node.get("inputs") or {}).get("run_id")
+            if run_id:
+                return str(run_id)
+    return ""
+
+async def dispatch_to_backend(prompt: dict, client_id: str | None = None,
+                              prompt_id: str | None = None) -> tuple[int, dict]:
+    """Queue on the healthy backend with the shortest queue, failing over on connection or 5xx errors.
+
+    Validation errors (4xx) come back as-is: the same graph would fail on every backend.
+    """
+    ensure_backend_monitor()
+    states = sync_backend_states()
+    unchecked = [state for state in states if state["checked_at"] is None]
+    if unchecked:
+        await asyncio.gather(*(check_backend(state) for state in unchecked))
+    # Healthy backends by queue depth first; unhealthy ones are a last resort in case a check was stale.
+    candidates = sorted(states, key=lambda state: (not state["healthy"], state["queue_remaining"]))
+    errors = {}
+    for state in candidates:
+        payload = {"prompt": prompt, "client_id": state["client_id"]}
+        if prompt_id:
+            payload["prompt_id"] = prompt_id
+        # Counted before the request so concurrent dispatches spread out; the next
+        # health check replaces it with the backend's real depth.
+        state["queue_remaining"] += 1
+        state["dispatching"] += 1
+        try:
+            async with get_http_session().post(
+                f"{state['url']}/prompt", json=payload, timeout=aiohttp.ClientTimeout(total=BACKEND_REQUEST_TIMEOUT)
+            ) as resp:
+                try:
+                    data = await resp.json(content_type=None)
+                except Exception:
+                    data = {"error": await resp.text()}
+                status = resp.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            state["queue_remaining"] = max(0, state["queue_remaining"] - 1)
+            state["healthy"] = False
+            state["last_error"] = errors[state["url"]] = str(e) or type(e).__name__
+            continue
+        finally:
+            state["dispatching"] -= 1
+        if not isinstance(data, dict):
+            data = {"error": data}
+        if status != 200 or "prompt_id" not in data:
+            state["queue_remaining"] = max(0, state["queue_remaining"] - 1)
+        if status >= 500:
+            state["healthy"] = False
+            state["last_error"] = errors[state["url"]] = f"HTTP {status}"
+            continue
+        if status == 200 and "prompt_id" in data:
+            _remote_prompts[str(data["prompt_id"])] = {
+                "backend": state["url"],
+                "prompt": prompt,
+                "run_id": _prompt_run_id(prompt),
+                "client_id": client_id,
+                "queued_at": time.time(),
+            }
+            data["backend"] = state["url"]
+            if _early_finished.pop((state["url"], str(data["prompt_id"])), None):
+                _remember_prompt(_finished_remote, (state["url"], str(data["prompt_id"])))
+                asyncio.get_running_loop().create_task(collect_remote_outputs(state, str(data["prompt_id"])))
+        return status, data
+    return 503, {"error": "No ComfyUI backend accepted the prompt", "backends": errors}
+
+def remote_output_files(history_entry: dict) -> list:
+    outputs = []
+    for node_output in ((history_entry or {}).get("outputs") or {}).values():
+        for key in REMOTE_OUTPUT_KEYS:
+            for item in (node_output or {}).get(key) or []:
+                if not isinstance(item, dict) or item.get("type", "output") != "output" or not item.get("filename"):
+                    continue
+                is_video = key in ("videos", "gifs") or item["filename"].lower().endswith(REMOTE_VIDEO_EXTENSIONS)
+                outputs.append({
+                    "filename": item["filename"],
+                    "subfolder": item.get("subfolder", ""),
+                    "type": "output",
+                    "kind": "video" if is_video else "image",
+                })
+    return outputs
+
+def local_output_for(remote_output: dict, prompt_id: str) -> tuple:
+    """``(output, path)`` where a backend's file lands locally; another box may already have used the name."""
+    output = dict(remote_output)
+    path = normalize_media_path(folder_paths.get_output_directory(), output["subfolder"], output["filename"])
+    if path and os.path.exists(path):
+        stem, ext = os.path.splitext(output["filename"])
+        output["filename"] = f"{stem}_{prompt_id[:8]}{ext}"
+        path = normalize_media_path(folder_paths.get_output_directory(), output["subfolder"], output["filename"])
+    return output, path
+
+async def download_backend_output(state: dict, remote_output: dict, path: str):
+    params = {"filename": remote_output["filename"], "subfolder": remote_output["subfolder"], "type": "output"}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = f"{path}.{uuid.uuid4().hex}.part"
+    try:
+        async with get_http_session().get(
+            f"{state['url']}/view", params=params, timeout=aiohttp.ClientTimeout(total=None, sock_read=60)
+        ) as resp:
+            resp.raise_for_status()
+            with open(partial_path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(BACKEND_DOWNLOAD_CHUNK_BYTES):
+                    f.write(chunk)
+        os.replace(partial_path, path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+async def collect_remote_outputs(state: dict, prompt_id: str):
+    """Copy a finished remote prompt's outputs into the local gallery and announce them."""
+    remote = _remote_prompts.pop(prompt_id, None)
+    if remote is None:
+        return
+    state["queue_remaining"] = max(0, state["queue_remaining"] - 1)
+    try:
+        async with get_http_session().get(f"{state['url']}/history/{prompt_id}") as resp:
+            resp.raise_for_status()
+            history = await resp.json(content_type=None)
+        outputs = []
+        for remote_output in remote_output_files((history or {}).get(prompt_id)):
+            output, path = local_output_for(remote_output, prompt_id)
+            if not path:
+                continue
+            await download_backend_output(state, remote_output, path)
+            outputs.append(output)
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as e:
+        print(f"CozyGen: failed to fetch outputs of {prompt_id} from {state['url']}: {e}")
+        return
+    if not outputs:
+        return
+    await asyncio.to_thread(record_run_outputs, remote["run_id"], outputs)
+    for output in outputs:
+        if output["kind"] == "video":
+            schedule_output_previews(output)
+    announce_outputs(outputs, remote["run_id"], prompt_id)
+
+def handle_backend_message(state: dict, message: dict):
+    event = message.get("type")
+    data = message.get("data")
+    if event not in RELAYED_BACKEND_EVENTS or not isinstance(data, dict):
+        return
+    prompt_id = str(data.get("prompt_id") or "")
+    finished = event == "execution_success" or (event == "executing" and data.get("node") is None)
+    key = (state["url"], prompt_id)
+    remote = _remote_prompts.get(prompt_id)
+    if remote is None or remote["backend"] != state["url"]:
+        # Only a prompt whose /prompt response is still outstanding can finish "early";
+        # repeats for handled prompts and other clients' broadcasts would only evict real markers.
+        if finished and prompt_id and state.get("dispatching") and key not in _finished_remote:
+            _remember_prompt(_early_finished, key)
+        return
+    server.PromptServer.instance.send_sync(event, data, remote["client_id"])
+    if finished:
+        if key in _finished_remote:
+            return
+        _remember_prompt(_finished_remote, key)
+        asyncio.get_running_loop().create_task(collect_remote_outputs(state, prompt_id))
+    elif event in ("execution_error", "execution_interrupted"):
+        _remote_prompts.pop(prompt_id, None)
+        state["queue_remaining"] = max(0, state["queue_remaining"] - 1)
+
+async def relay_backend_events(state: dict):
+    """Follow a backend's websocket for the prompts queued on it, reconnecting as needed."""
+    while True:
+        try:
+            async with get_http_session().ws_connect(
+                f"{state['url']}/ws", params={"clientId": state["client_id"]}, heartbeat=30
+            ) as ws:
+                state["connected"] = True
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        # Binary preview frames stay on the backend.
+                        continue
+                    try:
+                        message = json.loads(msg.data)
+                    except ValueError:
+                        continue
+                    if isinstance(message, dict):
+                        handle_backend_message(state, message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            state["last_error"] = str(e) or type(e).__name__
+        finally:
+            state["connected"] = False
+        await asyncio.sleep(BACKEND_RECONNECT_DELAY)
+
+async def _poll_remote_prompts(state: dict):
+    # Without a websocket, completion is only visible in the backend's history.
+    for prompt_id, remote in list(_remote_prompts.items()):
+        if remote["backend"] != state["url"]:
+            continue
+        try:
+            async with get_http_session().get(f"{state['url']}/history/{prompt_id}") as resp:
+                history = await resp.json(content_type=None) if resp.status == 200 else {}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            continue
+        entry = (history or {}).get(prompt_id)
+        if entry and ((entry.get("status") or {}).get("completed") or entry.get("outputs")):
+            await collect_remote_outputs(state, prompt_id)
+
+async def _monitor_backends():
+    while True:
+        states = sync_backend_states()
+        await asyncio.gather(*(check_backend(state) for state in states))
+        for state in states:
+            if state["relay"] is None or state["relay"].done():
+                state["relay"] = asyncio.get_running_loop().create_task(relay_backend_events(state))
+            if state["healthy"] and not state["connected"]:
+                await _poll_remote_prompts(state)
+        await asyncio.sleep(BACKEND_HEALTH_INTERVAL)
+
+def ensure_backend_monitor():
+    global _backend_monitor
+    if _backend_monitor is None or _backend_monitor.done():
+        _backend_monitor = asyncio.get_running_loop().create_task(_monitor_backends())
+
+async def get_backend_status(request: web.Request) -> web.Response:
+    if not get_backend_urls():
+        return web.json_response({"enabled": False, "backends": []})
+    ensure_backend_monitor()
+    backends = []
+    for state in sync_backend_states():
+        backends.append({
+            "url": state["url"],
+            "healthy": state["healthy"],
+            "connected": state["connected"],
+            "queue_remaining": state["queue_remaining"],
+            "running_here": sum(1 for remote in _remote_prompts.values() if remote["backend"] == state["url"]),
+            "checked_at": state["checked_at"],
+            "last_error": state["last_error"],
+        })
+    return web.json_response({"enabled": True, "backends": backends}, headers={"Cache-Control": "no-store"})
+
+EXECUTION_STATS_FILENAME = "execution_stats.json"
+# Rolling window per workflow and per node class; enough to follow drift without a database.
+EXECUTION_STATS_SAMPLES = 20
+EXECUTION_STATS_MAX_WORKFLOWS = 500
+_EXECUTION_EVENTS = frozenset({
+    "execution_start", "execution_cached", "executing",
+    "execution_success", "execution_error", "execution_interrupted",
+})
+
+# {"workflows": {fingerprint: [seconds, ...]}, "nodes": {class_type: [seconds, ...]}}, loaded lazily.
+_execution_stats = None
+_execution_stats_lock = threading.Lock()
+# The prompt ComfyUI is executing right now; it runs one at a time.
+_current_execution = None
+
+def get_execution_stats_path() -> str:
+    cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, EXECUTION_STATS_FILENAME)
+
+def _load_execution_stats() -> dict:
+    global _execution_stats
+    if _execution_stats is None:
+        stats = {}
+        try:
+            with open(get_execution_stats_path(), 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if not isinstance(stats, dict):
+            stats = {}
+        _execution_stats = {
+            "workflows": dict(stats.get("workflows") or {}),
+            "nodes": dict(stats.get("nodes") or {}),
+        }
+    return _execution_stats
+
+def _write_execution_stats(stats: dict):
+    path = get_execution_stats_path()
+    partial_path = f"{path}.{uuid.uuid4().hex}.part"
+    with open(partial_path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, separators=(",", ":"))
+    os.replace(partial_path, path)
+
+def _append_sample(samples: dict, key: str, seconds: float):
+    window = samples.pop(key, None) or []
+    window.append(round(seconds, 3))
+    # Re-inserting keeps the dict ordered by last use for the workflow cap below.
+    samples[key] = window[-EXECUTION_STATS_SAMPLES:]
+
+def workflow_fingerprint(prompt: dict) -> str:
+    """Identifies a graph by its nodes, not its inputs, so reseeded or re-prompted runs share stats."""
+    shape = sorted(f"{node_id}:{node.get('class_type', '')}" for node_id, node in prompt.items() if isinstance(node, dict))
+    return hashlib.sha1("|".join(shape).encode("utf-8")).hexdigest()[:16]
+
+def record_execution(prompt: dict, total_seconds: float, node_seconds: dict):
+    with _execution_stats_lock:
+        stats = _load_execution_stats()
+        workflows = stats["workflows"]
+        _append_sample(workflows, workflow_fingerprint(prompt), total_seconds)
+        while len(workflows) > EXECUTION_STATS_MAX_WORKFLOWS:
+            del workflows[next(iter(workflows))]
+        for class_type, seconds in node_seconds.items():
+            _append_sample(stats["nodes"], class_type, seconds)
+        _write_execution_stats(stats)
+
+def estimate_prompt_seconds(prompt) -> tuple:
+    """``(seconds, source)``: this workflow's median run, else the sum of its nodes' medians,
+    else the median of all workflows; ``(None, None)`` before anything has been recorded."""
+    if not isinstance(prompt, dict):
+        prompt = {}
+    with _execution_stats_lock:
+        stats = _load_execution_stats()
+        samples = stats["workflows"].get(workflow_fingerprint(prompt)) if prompt else None
+        if samples:
+            return statistics.median(samples), "workflow"
+        node_stats = stats["nodes"]
+        node_medians = [
+            statistics.median(node_stats[node.get("class_type")])
+            for node in prompt.values()
+            if isinstance(node, dict) and node_stats.get(node.get("class_type"))
+        ]
+        if node_medians:
+            return sum(node_medians), "nodes"
+        workflow_medians = [statistics.median(window) for window in stats["workflows"].values() if window]
+        if workflow_medians:
+            return statistics.median(workflow_medians), "global"
+    return None, None
+
+def _queue_item_parts(item) -> tuple:
+    """``(number, prompt_id, prompt)`` from a ComfyUI queue tuple."""
+    if isinstance(item, (list, tuple)) and len(item) >= 3:
+        return item[0], str(item[1]), item[2] if isinstance(item[2], dict) else {}
+    return None, None, {}
+
+def get_comfy_queue() -> tuple:
+    prompt_queue = getattr(server.PromptServer.instance, "prompt_queue", None)
+    if prompt_queue is None:
+        return None
+    # The volatile variant skips the deep copy; the items are only read here.
+    get_queue = getattr(prompt_queue, "get_current_queue_volatile", None) or prompt_queue.get_current_queue
+    running, pending = get_queue()
+    return list(running), sorted(pending, key=lambda item: item[0] if isinstance(item, (list, tuple)) else 0)
+
+def _find_running_prompt(prompt_id: str) -> dict:
+    try:
+        queue = get_comfy_queue()
+    except Exception:
+        queue = None
+    for item in (queue or ([], []))[0]:
+        _, item_id, prompt = _queue_item_parts(item)
+        if item_id == prompt_id:
+            return prompt
+    return {}
+
+def _finish_node(execution: dict, now: float):
+    node_id = execution.get("node")
+    if node_id is None:
+        return
+    class_type = (execution["prompt"].get(node_id) or {}).get("class_type")
+    if class_type:
+        execution["nodes"][class_type] = execution["nodes"].get(class_type, 0.0) + now - execution["node_started"]
+    execution["node"] = None
+
+def observe_execution_event(event: str, data):
+    """Follow ComfyUI's execution events to time whole prompts and each node class."""
+    global _current_execution
+    if event not in _EXECUTION_EVENTS or not isinstance(data, dict):
+        return
+    now = time.monotonic()
+    prompt_id = str(data.get("prompt_id") or "")
+    if prompt_id in _remote_prompts:
+        # Relayed from a backend; this server is not executing it.
+        return
+    if event == "execution_start":
+        _current_execution = {
+            "prompt_id": prompt_id,
+            "prompt": _find_running_prompt(prompt_id),
+            "started": now,
+            "started_at": time.time(),
+            "node": None,
+            "node_started": now,
+            "nodes": {},
+        }
+        return
+    execution = _current_execution
+    if execution is None or (prompt_id and prompt_id != execution["prompt_id"]):
+        return
+    if event == "executing":
+        _finish_node(execution, now)
+        node_id = data.get("node")
+        if node_id is not None:
+            execution["node"] = str(node_id)
+            execution["node_started"] = now
+            return
+        # Older ComfyUI signals the end of a prompt with ``executing: None`` only.
+        event = "execution_success"
+    if event == "execution_success":
+        _current_execution = None
+        _finish_node(execution, now)
+        if execution["prompt"]:
+            record_execution(execution["prompt"], now - execution["started"], execution["nodes"])
+    elif event in ("execution_error", "execution_interrupted"):
+        _current_execution = None
+
+def install_execution_tracker():
+    """Wrap PromptServer.send_sync so execution events feed the queue estimates,
+    the server-side session progress and /cozygen/events."""
+    instance = server.PromptServer.instance
+    send_sync = instance.send_sync
+    if getattr(send_sync, "cozygen_tracked", False):
+        return
+
+    @functools.wraps(send_sync)
+    def tracked_send_sync(event, data, *args, **kwargs):
+        try:
+            observe_execution_event(event, data)
+            track_session_progress(event, data)
+            sid = args[0] if args else kwargs.get("sid")
+            publish_event(event, data, sid)
+        except Exception as e:
+            print(f"CozyGen: execution stats error: {e}")
+        return send_sync(event, data, *args, **kwargs)
+
+    tracked_send_sync.cozygen_tracked = True
+    instance.send_sync = tracked_send_sync
+
+def build_queue_status(running: list, pending: list, now: float) -> dict:
+    items = []
+    cursor = now
+    for status, queue_items in (("running", running), ("pending", pending)):
+        for item in queue_items:
+            number, prompt_id, prompt = _queue_item_parts(item)
+            if prompt_id is None:
+                continue
+            seconds, source = estimate_prompt_seconds(prompt)
+            entry = {
+                "prompt_id": prompt_id,
+                "number": number,
+                "status": status,
+                "estimated_seconds": None if seconds is None else round(seconds, 1),
+                "estimate_source": source,
+            }
+            execution = _current_execution
+            if status == "running" and execution is not None and execution["prompt_id"] == prompt_id:
+                entry["started_at"] = round(execution["started_at"], 1)
+                start = execution["started_at"]
+            else:
+                start = cursor
+            entry["estimated_start"] = None if start is None else round(start, 1)
+            if start is None or seconds is None:
+                cursor = None
+            else:
+                # An overrunning prompt is assumed to finish now rather than in the past.
+                cursor = max(now, start + seconds)
+            entry["estimated_finish"] = None if cursor is None else round(cursor, 1)
+            items.append(entry)
+    return {
+        "now": round(now, 1),
+        "queue_remaining": len(items),
+        "items": items,
+        "estimated_finish": items[-1]["estimated_finish"] if items else round(now, 1),
+    }
+
+async def get_queue_status(request: web.Request) -> web.Response:
+    try:
+        queue = get_comfy_queue()
+    except Exception as e:
+        return web.json_response({"error": f"Failed to read queue: {e}"}, status=500)
+    if queue is None:
+        return web.json_response({"error": "ComfyUI queue unavailable"}, status=503)
+    running, pending = queue
+    return web.json_response(build_queue_status(running, pending, time.time()), headers={"Cache-Control": "no-store"})
+
+EVENT_STREAM_KEEPALIVE = 15.0
+EVENT_STREAM_QUEUE_SIZE = 256
+EVENT_PROGRESS_HZ_DEFAULT = 2.0
+EVENT_PREVIEW_FPS_DEFAULT = 1.0
+EVENT_PREVIEW_SIZE_DEFAULT = 256
+SESSION_PROGRESS_WRITE_INTERVAL = 2.0
+SESSION_TERMINAL_STATUSES = frozenset({"finished", "error", "interrupted"})
+# ComfyUI BinaryEventTypes that carry a PIL image: UNENCODED_PREVIEW_IMAGE and PREVIEW_IMAGE_WITH_METADATA.
+UNENCODED_PREVIEW_EVENTS = (2, 4)
+STREAMED_EVENTS = frozenset({
+    "status", "execution_start", "executing", "progress",
+    "execution_success", "execution_error", "execution_interrupted",
+    "cozygen_batch_ready", "cozygen_video_ready",
+})
+# Only the newest of these is worth sending; they are rate limited per subscriber.
+COALESCED_EVENTS = ("progress", "preview")
+# A pending progress tick is stale once one of these arrives.
+PROMPT_END_EVENTS = frozenset({
+    "execution_success", "execution_error", "execution_interrupted", "cozygen_batch_ready", "cozygen_video_ready",
+})
+
+
+class _EventSubscriber:
+    def __init__(self, client_id: str | None, progress_interval: float, previews: bool):
+        self.client_id = client_id
+        self.progress_interval = progress_interval
+        self.previews = previews
+        self.queue = collections.deque(maxlen=EVENT_STREAM_QUEUE_SIZE)
+        self.latest = {}
+        self.wake = asyncio.Event()
+
+
+_event_subscribers = set()
+_event_loop = None
+_preview_interval = 1.0 / EVENT_PREVIEW_FPS_DEFAULT
+_preview_size = EVENT_PREVIEW_SIZE_DEFAULT
+_last_preview_at = 0.0
+_session_progress_written = 0.0
+# (prompt_id, update) held back by the write throttle; a timer writes it when the window closes.
+_session_progress_pending = None
+_session_progress_timer = None
+_session_progress_lock = threading.Lock()
+
+def _node_display_name(prompt_id: str, node_id) -> str | None:
+    execution = _current_execution
+    if execution is not None and execution["prompt_id"] == prompt_id:
+        prompt = execution["prompt"]
+    else:
+        prompt = (_remote_prompts.get(prompt_id) or {}).get("prompt") or {}
+    node = prompt.get(str(node_id)) or {}
+    return (node.get("_meta") or {}).get("title") or node.get("class_type")
+
+def _encode_stream_preview(event, data):
+    global _last_preview_at
+    now = time.monotonic()
+    if now - _last_preview_at < _preview_interval or not any(sub.previews for sub in list(_event_subscribers)):
+        return None
+    if event == 4:
+        data = data[0]
+    try:
+        image = data[1].copy()
+    except (AttributeError, IndexError, TypeError):
+        return None
+    _last_preview_at = now
+    image.thumbnail((_preview_size, _preview_size))
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=60)
+    return {"image": "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")}
+
+def _deliver_event(event: str, data, sid):
+    for sub in list(_event_subscribers):
+        if sid is not None and sub.client_id != sid:
+            continue
+        if event in COALESCED_EVENTS:
+            if event == "preview" and not sub.previews:
+                continue
+            sub.latest[event] = data
+        else:
+            if event in PROMPT_END_EVENTS:
+                sub.latest.pop("progress", None)
+            sub.queue.append((event, data))
+        sub.wake.set()
+
+def publish_event(event, data, sid=None):
+    """Hand a ComfyUI or CozyGen event to /cozygen/events subscribers; called from any thread."""
+    loop = _event_loop
+    if loop is None or not _event_subscribers:
+        return
+    if event in UNENCODED_PREVIEW_EVENTS:
+        data = _encode_stream_preview(event, data)
+        if data is None:
+            return
+        event = "preview"
+    elif event not in STREAMED_EVENTS or not isinstance(data, dict):
+        return
+    elif event == "executing":
+        data = {**data, "node_name": _node_display_name(str(data.get("prompt_id") or ""), data.get("node"))}
+    loop.call_soon_threadsafe(_deliver_event, event, data, sid)
+
+def _write_session_progress(prompt_id, update: dict):
+    """Merge ``update`` into the saved session if it still belongs to ``prompt_id``; call with the lock held."""
+    global _session_progress_written
+    _session_progress_written = time.monotonic()
+    try:
+        session = load_session()
+    except (OSError, ValueError):
+        return
+    # Only the prompt the UI last queued is mirrored; other clients' prompts leave it alone.
+    if not session or session.get("status") in SESSION_TERMINAL_STATUSES or (
+            prompt_id and str(prompt_id) != str(session.get("id"))):
+        return
+    write_session({**session, **update, "updated_at": now_iso()})
+
+def _flush_session_progress():
+    global _session_progress_pending, _session_progress_timer
+    with _session_progress_lock:
+        pending, _session_progress_pending, _session_progress_timer = _session_progress_pending, None, None
+        if pending is not None:
+            _write_session_progress(*pending)
+
+def track_session_progress(event, data):
+    """Keep the saved session's progress current so clients need not POST every tick.
+
+    Progress is written at most every SESSION_PROGRESS_WRITE_INTERVAL seconds, with the
+    last held-back tick flushed when the window closes; the end of a run is always written.
+    """
+    global _session_progress_pending, _session_progress_timer
+    if not isinstance(data, dict):
+        return
+    if event == "progress":
+        update = {"status": "running", "progress": {"value": data.get("value"), "max": data.get("max")}}
+    elif event == "executing":
+        # ComfyUI reports node None once the whole prompt is done.
+        update = {"status": "running" if data.get("node") is not None else "finished"}
+    elif event == "execution_success":
+        update = {"status": "finished"}
+    elif event in ("execution_error", "execution_interrupted"):
+        update = {"status": event[len("execution_"):]}
+    else:
+        return
+    prompt_id = data.get("prompt_id")
+    with _session_progress_lock:
+        pending = _session_progress_pending
+        if pending is not None and pending[0] == prompt_id:
+            update = {**pending[1], **update}
+        if update["status"] == "running":
+            wait = SESSION_PROGRESS_WRITE_INTERVAL - (time.monotonic() - _session_progress_written)
+            if wait > 0:
+                _session_progress_pending = (prompt_id, update)
+                if _session_progress_timer is None:
+                    _session_progress_timer = threading.Timer(wait, _flush_session_progress)
+                    _session_progress_timer.daemon = True
+                    _session_progress_timer.start()
+                return
+        _session_progress_pending = None
+        if _session_progress_timer is not None:
+            _session_progress_timer.cancel()
+            _session_progress_timer = None
+        _write_session_progress(prompt_id, update)
+
+def _format_sse(event: str, data) -> bytes:
+    return f"data: {json.dumps({'type': event, 'data': data}, default=str)}\n\n".encode("utf-8")
+
+def _float_setting(value, default: float, low: float, high: float) -> float:
+    try:
+        return max(low, min(high, float(value)))
+    except (TypeError, ValueError):
+        return default
+
+async def stream_events(request: web.Request) -> web.StreamResponse:
+    """Server-sent events carrying only what the CozyGen UI shows.
+
+    Progress and latent previews are coalesced to a per-subscriber rate; previews are
+    opt-in (``?previews=1``) and arrive as small JPEG data URIs.
+    """
+    global _event_loop, _preview_interval, _preview_size
+    config = get_config()
+    progress_hz = _float_setting(
+        request.rel_url.query.get("progress_hz", config.get("event_progress_hz", EVENT_PROGRESS_HZ_DEFAULT)),
+        EVENT_PROGRESS_HZ_DEFAULT, 0.2, 10.0)
+    preview_fps = _float_setting(config.get("event_preview_fps", EVENT_PREVIEW_FPS_DEFAULT), EVENT_PREVIEW_FPS_DEFAULT, 0.0, 10.0)
+    _preview_size = int(_float_setting(config.get("event_preview_size", EVENT_PREVIEW_SIZE_DEFAULT), EVENT_PREVIEW_SIZE_DEFAULT, 64, 1024))
+    previews = request.rel_url.query.get("previews", "") in ("1", "true") and preview_fps > 0
+    if preview_fps > 0:
+        _preview_interval = 1.0 / preview_fps
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        # Keep reverse proxies from buffering the stream.
+        "X-Accel-Buffering": "no",
+    })
+    await response.prepare(request)
+    loop = asyncio.get_running_loop()
+    _event_loop = loop
+    sub = _EventSubscriber(request.rel_url.query.get("client_id") or None, 1.0 / progress_hz, previews)
+    _event_subscribers.add(sub)
+    last_sent = {}
+    try:
+        await response.write(b"retry: 2000\n\n")
+        last_write = loop.time()
+        while True:
+            now = loop.time()
+            timeout = max(0.0, last_write + EVENT_STREAM_KEEPALIVE - now)
+            for kind in sub.latest:
+                interval = sub.progress_interval if kind == "progress" else _preview_interval
+                timeout = min(timeout, max(0.0, last_sent.get(kind, 0.0) + interval - now))
+            try:
+                await asyncio.wait_for(sub.wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            sub.wake.clear()
+
+            chunks = []
+            while sub.queue:
+                chunks.append(_format_sse(*sub.queue.popleft()))
+            now = loop.time()
+            for kind in COALESCED_EVENTS:
+                interval = sub.progress_interval if kind == "progress" else _preview_interval
+                if kind in sub.latest and now - last_sent.get(kind, 0.0) >= interval:
+                    chunks.append(_format_sse(kind, sub.latest.pop(kind)))
+                    last_sent[kind] = now
+            if not chunks and now - last_write >= EVENT_STREAM_KEEPALIVE:
+                chunks.append(b": keepalive\n\n")
+            if chunks:
+                await response.write(b"".join(chunks))
+                last_write = now
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        _event_subscribers.discard(sub)
+    return response
+
+def is_admin_request(request: web.Request) -> bool:
+    token = str(get_config().get("admin_token") or "")
+    # Header only: a query-string token would end up in access logs and browser history.
+    provided = request.headers.get("X-CozyGen-Admin-Token", "")
+    return bool(token) and hmac.compare_digest(token.encode("utf-8"), provided.encode("utf-8"))
+
+async def profile_server(request: web.Request) -> web.Response:
+    if not is_admin_request(request):
+        return web.json_response({"error": "Profiling requires the admin_token from config.json in the X-CozyGen-Admin-Token header"}, status=403)
+    try:
+        seconds = float(request.rel_url.query.get("seconds", "10"))
+        hz = float(request.rel_url.query.get("hz", "100"))
+    except ValueError:
+        return web.json_response({"error": "Invalid seconds or hz parameter"}, status=400)
+    seconds = max(0.1, min(MAX_PROFILE_SECONDS, seconds))
+    hz = max(1.0, min(MAX_PROFILE_HZ, hz))
+    try:
+        counts = await asyncio.to_thread(sample_stacks, seconds, hz)
+    except RuntimeError as e:
+        return web.json_response({"error": str(e)}, status=409)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return web.Response(
+        text=format_collapsed(counts),
+        content_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="cozygen-profile-{stamp}.folded"'},
+    )
 
-    for item_name in items:
+async def get_hello(request: web.Request) -> web.Response:
+    return web.json_response({"status": "success", "message": "Hello from the CozyGen API!"})
+
+def scan_gallery_folder(gallery_path: str, subfolder: str) -> list:
+    gallery_items = []
+    for item_name in os.listdir(gallery_path):
         item_path = os.path.join(gallery_path, item_name)
         
         if os.path.isdir(item_path):
@@ -206,9 +2272,32 @@ async def get_gallery_files(request: web.Request) -> web.Response:
                 "subfolder": subfolder,
                 "mod_time": mod_time
             })
+    return gallery_items
 
-    # Sort items: directories first, then by modification time
-    gallery_items.sort(key=lambda x: (x['type'] == 'directory', x.get('mod_time', 0)), reverse=True)
+async def get_gallery_files(request: web.Request) -> web.Response:
+    subfolder = request.rel_url.query.get('subfolder', '')
+    try:
+        page = int(request.rel_url.query.get('page', '1'))
+        per_page = int(request.rel_url.query.get('per_page', '20'))
+    except ValueError:
+        return web.json_response({"error": "Invalid page or per_page parameter"}, status=400)
+
+    output_directory = folder_paths.get_output_directory()
+
+    # Security: Prevent directory traversal
+    gallery_path = os.path.normpath(os.path.join(output_directory, subfolder))
+    if not gallery_path.startswith(output_directory):
+        return web.json_response({"error": "Unauthorized path"}, status=403)
+
+    if not os.path.exists(gallery_path) or not os.path.isdir(gallery_path):
+        return web.json_response({"error": "Gallery directory not found"}, status=404)
+
+    with trace_phase("stat"):
+        gallery_items = scan_gallery_folder(gallery_path, subfolder)
+
+    with trace_phase("sort"):
+        # Sort items: directories first, then by modification time
+        gallery_items.sort(key=lambda x: (x['type'] == 'directory', x.get('mod_time', 0)), reverse=True)
 
     # Pagination
     total_items = len(gallery_items)
@@ -222,7 +2311,7 @@ async def get_gallery_files(request: web.Request) -> web.Response:
         if 'mod_time' in item:
             del item['mod_time']
 
-    return web.json_response({
+    return await compressed_json_response(request, {
         "items": paginated_items,
         "page": page,
         "per_page": per_page,
@@ -259,40 +2348,53 @@ async def upload_image(request: web.Request) -> web.Response:
 
     return web.json_response({"filename": unique_filename, "size": size})
 
+THUMBNAIL_SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif') + AUDIO_THUMBNAIL_EXTENSIONS
+THUMBNAIL_BATCH_MAX_ITEMS = 100
+THUMBNAIL_BATCH_CONTENT_TYPE = "application/x-cozygen-thumbs"
+
+def parse_thumbnail_options(width_param, quality_param, fmt):
+    """Clamp user supplied thumbnail options; raises ValueError for non-numeric sizes."""
+    width = max(32, min(1024, int(width_param)))
+    quality = max(20, min(90, int(quality_param)))
+    fmt = (str(fmt or 'webp')).lower()
+    if fmt not in THUMBNAIL_FORMATS and fmt != WAVEFORM_PEAKS_FORMAT:
+        fmt = "jpeg"
+    return width, quality, fmt
+
 async def get_thumbnail(request: web.Request) -> web.Response:
     filename = request.rel_url.query.get('filename', '')
     subfolder = request.rel_url.query.get('subfolder', '')
     file_type = request.rel_url.query.get('type', 'output')
-    width_param = request.rel_url.query.get('w', '256')
-    quality_param = request.rel_url.query.get('q', '55')
-    fmt = (request.rel_url.query.get('fmt', 'webp') or 'webp').lower()
 
     if not filename:
         return web.json_response({"error": "Missing 'filename' query parameter"}, status=400)
-    if not filename.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.gif')):
+    if not filename.lower().endswith(THUMBNAIL_SOURCE_EXTENSIONS):
         return web.json_response({"error": "Unsupported media type"}, status=415)
 
     try:
-        width = int(width_param)
-        quality = int(quality_param)
+        width, quality, fmt = parse_thumbnail_options(
+            request.rel_url.query.get('w', '256'),
+            request.rel_url.query.get('q', '55'),
+            request.rel_url.query.get('fmt', 'webp'),
+        )
     except ValueError:
         return web.json_response({"error": "Invalid thumbnail parameters"}, status=400)
-
-    width = max(32, min(1024, width))
-    quality = max(20, min(90, quality))
-    if fmt not in ("webp", "jpeg", "jpg", "png"):
-        fmt = "jpeg"
+    if fmt == WAVEFORM_PEAKS_FORMAT and not filename.lower().endswith(AUDIO_THUMBNAIL_EXTENSIONS):
+        return web.json_response({"error": "Peaks are only available for audio files"}, status=415)
 
     base_dir = get_base_dir_for_type(file_type)
     file_path = normalize_media_path(base_dir, subfolder, filename)
     if not file_path:
         return web.json_response({"error": "Unauthorized path"}, status=403)
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
-        return web.json_response({"error": "File not found"}, status=404)
+    with trace_phase("stat"):
+        if not os.path.isfile(file_path):
+            return web.json_response({"error": "File not found"}, status=404)
+        stat = os.stat(file_path)
 
     try:
-        stat = os.stat(file_path)
-        thumb_bytes, content_type = build_thumbnail_bytes(
+        # A cold miss decodes the source (ffmpeg for audio); keep that off the event loop.
+        thumb_bytes, content_type = await asyncio.to_thread(
+            get_thumbnail_bytes,
             file_path,
             stat.st_mtime,
             stat.st_size,
@@ -308,18 +2410,477 @@ async def get_thumbnail(request: web.Request) -> web.Response:
     except Exception as e:
         return web.json_response({"error": f"Thumbnail generation failed: {e}"}, status=500)
 
+def build_thumbnail_batch(items: list, width: int, quality: int, fmt: str) -> bytes:
+    """Pack thumbnails for ``items`` into one body.
+
+    Layout: a 4-byte big-endian manifest length, the UTF-8 JSON manifest, then the
+    encoded thumbnails back to back. Each manifest entry echoes its item and carries
+    either ``offset``/``length``/``content_type`` into the data section or an ``error``.
+    """
+    manifest = []
+    chunks = []
+    offset = 0
+    for item in items:
+        filename = str(item.get("filename") or "")
+        subfolder = str(item.get("subfolder") or "")
+        file_type = str(item.get("type") or "output")
+        entry = {"filename": filename, "subfolder": subfolder, "type": file_type}
+        manifest.append(entry)
+        if not filename.lower().endswith(THUMBNAIL_SOURCE_EXTENSIONS):
+            entry["error"] = "Unsupported media type"
+            continue
+        file_path = normalize_media_path(get_base_dir_for_type(file_type), subfolder, filename)
+        if not file_path:
+            entry["error"] = "Unauthorized path"
+            continue
+        try:
+            with trace_phase("stat"):
+                stat = os.stat(file_path)
+            thumb_bytes, content_type = get_thumbnail_bytes(
+                file_path, stat.st_mtime, stat.st_size, width, quality, fmt)
+        except FileNotFoundError:
+            entry["error"] = "File not found"
+            continue
+        except Exception as e:
+            entry["error"] = f"Thumbnail generation failed: {e}"
+            continue
+        entry.update({"offset": offset, "length": len(thumb_bytes), "content_type": content_type})
+        chunks.append(thumb_bytes)
+        offset += len(thumb_bytes)
+
+    header = json.dumps({"items": manifest}, separators=(",", ":")).encode("utf-8")
+    return b"".join([len(header).to_bytes(4, "big"), header, *chunks])
+
+def thumbnail_batch_etag(items: list, width: int, quality: int, fmt: str) -> str:
+    """Validator for a batch body: the options plus each item's mtime and size, so no decoding is needed."""
+    digest = hashlib.sha256(f"{width}:{quality}:{fmt}".encode("utf-8"))
+    for item in items:
+        filename = str(item.get("filename") or "")
+        subfolder = str(item.get("subfolder") or "")
+        file_type = str(item.get("type") or "output")
+        file_path = normalize_media_path(get_base_dir_for_type(file_type), subfolder, filename)
+        try:
+            stat = os.stat(file_path) if file_path else None
+        except OSError:
+            stat = None
+        digest.update(json.dumps([filename, subfolder, file_type,
+                                  stat and stat.st_mtime_ns, stat and stat.st_size]).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+async def get_thumbnail_batch(request: web.Request) -> web.Response:
+    try:
+        payload = await request.json()
+    except Exception:
+        return web.json_response({"error": "Invalid JSON payload"}, status=400)
+    if not isinstance(payload, dict):
+        return web.json_response({"error": "Invalid thumbnail batch payload"}, status=400)
+    items = payload.get("items")
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return web.json_response({"error": "'items' must be a list of objects"}, status=400)
+    if len(items) > THUMBNAIL_BATCH_MAX_ITEMS:
+        return web.json_response(
+            {"error": f"At most {THUMBNAIL_BATCH_MAX_ITEMS} thumbnails per batch"}, status=400)
+    try:
+        width, quality, fmt = parse_thumbnail_options(
+            payload.get('w', 256), payload.get('q', 55), payload.get('fmt', 'webp'))
+    except (TypeError, ValueError):
+        return web.json_response({"error": "Invalid thumbnail parameters"}, status=400)
+
+    # POST bodies never reach the HTTP cache, so the client keeps the last few and revalidates them.
+    etag = await asyncio.to_thread(thumbnail_batch_etag, items, width, quality, fmt)
+    headers = {"Cache-Control": "private, no-cache", "ETag": etag}
+    if etag in (tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")):
+        return web.Response(status=304, headers=headers)
+    # Cold pages decode dozens of images; keep that off the event loop.
+    body = await asyncio.to_thread(build_thumbnail_batch, items, width, quality, fmt)
+    return web.Response(
+        body=body,
+        content_type=THUMBNAIL_BATCH_CONTENT_TYPE,
+        headers=headers,
+    )
+
+EXPORT_CHUNK_BYTES = 1024 * 1024
+EXPORT_MAX_SELECTION = 10000
+# Already compressed; deflating them again burns CPU for next to no gain.
+EXPORT_STORED_EXTENSIONS = frozenset((
+    '.png', '.jpg', '.jpeg', '.webp', '.gif', '.avif',
+    '.mp4', '.webm', '.mov', '.mkv', '.mp3', '.flac', '.ogg', '.opus', '.m4a', '.zip', '.gz',
+))
+
+
+class _ZipStreamSink:
+    """Write-only file object ZipFile streams into; the handler drains it after every step."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def collect_export_folder(folder_path: str) -> list:
+    """(arcname, path) for every file under ``folder_path``, relative to it."""
+    entries = []
+    for root, dirs, files in os.walk(folder_path):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                entries.append((os.path.relpath(path, folder_path).replace(os.sep, "/"), path))
+    return entries
+
+def _open_export_entry(archive: zipfile.ZipFile, arcname: str, path: str):
+    try:
+        source = open(path, "rb")
+    except OSError:
+        # Deleted or unreadable since the listing; leave it out rather than abort the download.
+        return None, None
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    if os.path.splitext(path)[1].lower() in EXPORT_STORED_EXTENSIONS:
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    return source, archive.open(info, "w")
+
+def _copy_export_chunk(source, destination) -> bool:
+    chunk = source.read(EXPORT_CHUNK_BYTES)
+    if not chunk:
+        return False
+    destination.write(chunk)
+    return True
+
+def collect_export_selection(output_directory: str, items: list) -> tuple:
+    """``(entries, None)`` of (arcname, path) for the selected outputs, or ``(None, (status, message))``."""
+    entries = []
+    seen = set()
+    for item in items:
+        path = normalize_media_path(output_directory, str(item.get("subfolder") or ""), str(item.get("filename") or ""))
+        if not path or path == os.path.normpath(output_directory):
+            return None, (403, "Unauthorized path")
+        if not os.path.isfile(path):
+            return None, (404, f"File not found: {item.get('filename')}")
+        if path not in seen:
+            seen.add(path)
+            entries.append((os.path.relpath(path, output_directory).replace(os.sep, "/"), path))
+    return entries, None
+
+async def stream_zip_export(request: web.Request, entries: list, download_name: str) -> web.StreamResponse:
+    response = web.StreamResponse(headers={
+        "Content-Type": "application/zip",
+        "Content-Disposition": f'attachment; filename="{download_name}"',
+        "Cache-Control": "no-store",
+    })
+    await response.prepare(request)
+
+    # The response is not seekable, so ZipFile writes data descriptors and zip64 records as needed.
+    # Each blocking step (open, read + deflate, central directory) runs in a worker thread and its
+    # output is written out before the next, so memory stays at about one chunk per download.
+    sink = _ZipStreamSink()
+    archive = zipfile.ZipFile(sink, mode="w", allowZip64=True)
+    try:
+        for arcname, path in entries:
+            source, destination = await asyncio.to_thread(_open_export_entry, archive, arcname, path)
+            if source is None:
+                continue
+            try:
+                while await asyncio.to_thread(_copy_export_chunk, source, destination):
+                    await response.write(sink.take())
+            finally:
+                await asyncio.to_thread(destination.close)
+                source.close()
+            await response.write(sink.take())
+        await asyncio.to_thread(archive.close)
+        await response.write(sink.take())
+    finally:
+        # Also reached when the client disconnects; drop whatever was buffered.
+        sink.take()
+    await response.write_eof()
+    return response
+
+def export_download_name(label: str) -> str:
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", label.strip("/\\")).strip("._") or "output"
+    return f"cozygen-{name}.zip"
+
+async def export_gallery(request: web.Request) -> web.StreamResponse:
+    output_directory = folder_paths.get_output_directory()
+    if request.method == "POST":
+        try:
+            payload = await request.json()
+        except Exception:
+            return web.json_response({"error": "Invalid JSON payload"}, status=400)
+        if not isinstance(payload, dict):
+            return web.json_response({"error": "Invalid export payload"}, status=400)
+    else:
+        payload = {"subfolder": request.rel_url.query.get('subfolder', '')}
+
+    items = payload.get("items")
+    if items is None:
+        subfolder = str(payload.get("subfolder") or "")
+        folder_path = normalize_media_path(output_directory, subfolder, "")
+        if not folder_path:
+            return web.json_response({"error": "Unauthorized path"}, status=403)
+        if not os.path.isdir(folder_path):
+            return web.json_response({"error": "Gallery directory not found"}, status=404)
+        entries = await asyncio.to_thread(collect_export_folder, folder_path)
+        return await stream_zip_export(request, entries, export_download_name(subfolder))
+
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return web.json_response({"error": "'items' must be a list of objects"}, status=400)
+    if len(items) > EXPORT_MAX_SELECTION:
+        return web.json_response({"error": f"At most {EXPORT_MAX_SELECTION} files per export"}, status=400)
+    # Up to EXPORT_MAX_SELECTION realpath/stat calls; keep them off the event loop.
+    entries, error = await asyncio.to_thread(collect_export_selection, output_directory, items)
+    if error is not None:
+        status, message = error
+        return web.json_response({"error": message}, status=status)
+    return await stream_zip_export(request, entries, export_download_name("selection"))
+
+# Explicit so players get the right type even where the mimetypes database lacks webm/flac/opus.
+MEDIA_CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".m4v": "video/mp4",
+    ".webm": "video/webm",
+    ".mov": "video/quicktime",
+    ".mkv": "video/x-matroska",
+    ".gif": "image/gif",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+}
+
+async def get_media(request: web.Request) -> web.StreamResponse:
+    """Serve an output file with Range/If-Range, ETag and Last-Modified support.
+
+    FileResponse answers partial requests with 206 and uses sendfile, so
+    scrubbing through a long video only transfers the ranges the player asks for.
+    """
+    filename = request.rel_url.query.get('filename', '')
+    subfolder = request.rel_url.query.get('subfolder', '')
+    file_type = request.rel_url.query.get('type', 'output')
+
+    if not filename:
+        return web.json_response({"error": "Missing 'filename' query parameter"}, status=400)
+    content_type = MEDIA_CONTENT_TYPES.get(os.path.splitext(filename)[1].lower())
+    if content_type is None:
+        return web.json_response({"error": "Unsupported media type"}, status=415)
+
+    base_dir = get_base_dir_for_type(file_type)
+    file_path = normalize_media_path(base_dir, subfolder, filename)
+    if not file_path:
+        return web.json_response({"error": "Unauthorized path"}, status=403)
+    if not os.path.isfile(file_path):
+        return web.json_response({"error": "File not found"}, status=404)
+
+    return web.FileResponse(file_path, headers={
+        "Content-Type": content_type,
+        "Cache-Control": "public, max-age=3600",
+    })
+
+VIDEO_PREVIEW_PRESETS = {
+    # Gallery grid and history hover loops: small, silent, first few seconds only.
+    "hover": {"width": 320, "bitrate": "250k", "max_seconds": 4, "audio": False},
+    "modal": {"width": 720, "bitrate": "900k", "max_seconds": None, "audio": True},
+}
+VIDEO_PREVIEW_EXTENSIONS = (".mp4", ".m4v", ".webm", ".mov", ".mkv", ".gif")
+PREVIEW_CACHE_MB_DEFAULT = 1024
+PREVIEW_RENDER_TIMEOUT = 600
+
+_preview_executor = None
+_preview_jobs = {}
+_failed_previews = set()
+_preview_lock = threading.Lock()
+_ffmpeg_path = None
+
+def is_video_preview_enabled() -> bool:
+    return bool(get_config().get("video_previews", True))
+
+def get_preview_cache_max_bytes() -> int:
+    try:
+        megabytes = int(get_config().get("preview_cache_mb", PREVIEW_CACHE_MB_DEFAULT))
+    except (TypeError, ValueError):
+        megabytes = PREVIEW_CACHE_MB_DEFAULT
+    return max(0, megabytes) * 1024 * 1024
+
+def find_ffmpeg() -> str | None:
+    global _ffmpeg_path
+    if _ffmpeg_path is None:
+        try:
+            import imageio_ffmpeg
+            _ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+        except Exception:
+            _ffmpeg_path = shutil.which("ffmpeg") or ""
+    return _ffmpeg_path or None
+
+def get_preview_dir() -> str:
+    preview_dir = os.path.join(get_cache_dir(), "previews")
+    os.makedirs(preview_dir, exist_ok=True)
+    return preview_dir
+
+def preview_path_for(source_path: str, stat: os.stat_result, preset: str) -> str:
+    digest = hashlib.sha1(f"{source_path}\0{stat.st_mtime_ns}\0{stat.st_size}".encode("utf-8")).hexdigest()
+    return os.path.join(get_preview_dir(), f"{digest}_{preset}.mp4")
+
+def evict_previews():
+    limit = get_preview_cache_max_bytes()
+    entries = []
+    for entry in os.scandir(get_preview_dir()):
+        if entry.is_file() and entry.name.endswith(".mp4"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    # Served previews are touched, so the oldest mtime is the least recently used.
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def render_video_preview(source_path: str, target_path: str, preset: str) -> bool:
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        return False
+    spec = VIDEO_PREVIEW_PRESETS[preset]
+    partial_path = target_path + ".part"
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-y", "-i", source_path]
+    if spec["max_seconds"]:
+        command += ["-t", str(spec["max_seconds"])]
+    command += [
+        "-vf", f"scale='trunc(min({spec['width']},iw)/2)*2':-2",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+        "-b:v", spec["bitrate"], "-maxrate", spec["bitrate"], "-bufsize", spec["bitrate"],
+        "-movflags", "+faststart", "-threads", "2",
+    ]
+    command += ["-c:a", "aac", "-b:a", "64k"] if spec["audio"] else ["-an"]
+    command += ["-f", "mp4", partial_path]
+    with VIDEO_PREVIEW_SECONDS.time(preset):
+        result = subprocess.run(command, capture_output=True, timeout=PREVIEW_RENDER_TIMEOUT)
+    if result.returncode != 0:
+        print(f"CozyGen: video preview failed for {source_path}: {result.stderr.decode('utf-8', 'replace').strip()}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        return False
+    os.replace(partial_path, target_path)
+    evict_previews()
+    return True
+
+def _run_preview_job(source_path: str, target_path: str, preset: str) -> bool:
+    try:
+        rendered = render_video_preview(source_path, target_path, preset)
+    except Exception as e:
+        print(f"CozyGen: video preview failed for {source_path}: {e}")
+        rendered = False
+    with _preview_lock:
+        _preview_jobs.pop(target_path, None)
+        if not rendered:
+            _failed_previews.add(target_path)
+    return rendered
+
+def schedule_video_preview(source_path: str, preset: str):
+    """Queue a preview render on the single background worker; returns its future or None."""
+    global _preview_executor
+    if not find_ffmpeg():
+        return None
+    stat = os.stat(source_path)
+    target_path = preview_path_for(source_path, stat, preset)
+    if os.path.exists(target_path):
+        return None
+    with _preview_lock:
+        if target_path in _failed_previews:
+            return None
+        job = _preview_jobs.get(target_path)
+        if job is None:
+            if _preview_executor is None:
+                _preview_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cozygen-preview")
+            job = _preview_executor.submit(_run_preview_job, source_path, target_path, preset)
+            _preview_jobs[target_path] = job
+    return job
+
+def schedule_output_previews(output: dict):
+    """Pre-render every preview preset for a freshly saved video output."""
+    if not is_video_preview_enabled():
+        return
+    if not output.get("filename", "").lower().endswith(VIDEO_PREVIEW_EXTENSIONS):
+        return
+    file_path = normalize_media_path(get_base_dir_for_type(output.get("type", "output")),
+                                     output.get("subfolder", ""), output["filename"])
+    if not file_path or not os.path.isfile(file_path):
+        return
+    for preset in VIDEO_PREVIEW_PRESETS:
+        schedule_video_preview(file_path, preset)
+
+async def get_video_preview(request: web.Request) -> web.StreamResponse:
+    """Serve a cached low-bitrate rendition, or redirect to the original while one is rendered."""
+    filename = request.rel_url.query.get('filename', '')
+    subfolder = request.rel_url.query.get('subfolder', '')
+    file_type = request.rel_url.query.get('type', 'output')
+    preset = request.rel_url.query.get('preset', 'modal')
+
+    if not filename:
+        return web.json_response({"error": "Missing 'filename' query parameter"}, status=400)
+    if preset not in VIDEO_PREVIEW_PRESETS:
+        return web.json_response({"error": f"Unknown preview preset: {preset}"}, status=400)
+    if not filename.lower().endswith(VIDEO_PREVIEW_EXTENSIONS):
+        return web.json_response({"error": "Unsupported media type"}, status=415)
+
+    base_dir = get_base_dir_for_type(file_type)
+    file_path = normalize_media_path(base_dir, subfolder, filename)
+    if not file_path:
+        return web.json_response({"error": "Unauthorized path"}, status=403)
+    if not os.path.isfile(file_path):
+        return web.json_response({"error": "File not found"}, status=404)
+
+    if is_video_preview_enabled():
+        target_path = preview_path_for(file_path, os.stat(file_path), preset)
+        if os.path.isfile(target_path):
+            try:
+                os.utime(target_path)
+            except OSError:
+                pass
+            return web.FileResponse(target_path, headers={
+                "Content-Type": "video/mp4",
+                "Cache-Control": "public, max-age=3600",
+            })
+        schedule_video_preview(file_path, preset)
+
+    original_url = media_url_for({"filename": filename, "subfolder": subfolder, "type": file_type})
+    raise web.HTTPTemporaryRedirect(original_url, headers={"Cache-Control": "no-store"})
+
 async def get_history_list(request: web.Request) -> web.Response:
-    items = list_history_entries()
-    return web.json_response({"items": items})
+    ensure_history_compactor()
+    cache_key = history_list_cache_key()
+    with trace_phase("load"):
+        body = await asyncio.to_thread(get_history_list_body, cache_key)
+    return await json_body_response(request, body, cache_key)
 
 async def get_history_item(request: web.Request) -> web.Response:
     history_id = request.match_info.get('history_id', '')
     if not history_id:
         return web.json_response({"error": "Missing history id"}, status=400)
-    data = load_history_entry(history_id)
+    with trace_phase("load"):
+        data = load_history_entry(history_id, expand=True)
     if not data:
         return web.json_response({"error": "History item not found"}, status=404)
-    return web.json_response(data)
+    return await compressed_json_response(request, data)
 
 async def save_history_item(request: web.Request) -> web.Response:
     try:
@@ -379,6 +2940,7 @@ async def upload_workflow_file(request: web.Request) -> web.Response:
     workflow = await request.json()
     with open(workflow_path, 'w') as fp:
         json.dump(workflow, fp, indent=4)
+    invalidate_workflow_cache(workflow_path)
         
     return web.json_response({ "filename": filename })
     
@@ -394,20 +2956,249 @@ async def get_workflow_list(request: web.Request) -> web.Response:
 
 async def get_workflow_file(request: web.Request) -> web.Response:
     filename = request.match_info.get('filename', '')
-    workflows_dir = get_workflows_dir()
-    workflow_path = os.path.join(workflows_dir, filename)
 
-    if not os.path.exists(workflow_path):
+    try:
+        entry = await asyncio.to_thread(load_workflow, filename)
+    except json.JSONDecodeError:
+        return web.json_response({"error": f"Invalid JSON in workflow file '{filename}'"}, status=400)
+    except Exception as e:
+        return web.json_response({"error": f"Error reading workflow file: {e}"}, status=500)
+    if entry is None:
         return web.json_response({"error": f"Workflow file '{filename}' not found"}, status=404)
-    
+    if not entry.get("body"):
+        entry["body"] = entry["text"].encode("utf-8")
+    return await json_body_response(request, entry["body"], ("workflow", filename, entry["key"]))
+
+async def get_workflow_schema(request: web.Request) -> web.Response:
+    filename = request.match_info.get('filename', '')
+
     try:
-        with open(workflow_path, 'r', encoding='utf-8') as f:
-            workflow_content = json.load(f)
-        return web.json_response(workflow_content)
+        entry = await asyncio.to_thread(load_workflow, filename)
     except json.JSONDecodeError:
         return web.json_response({"error": f"Invalid JSON in workflow file '{filename}'"}, status=400)
     except Exception as e:
         return web.json_response({"error": f"Error reading workflow file: {e}"}, status=500)
+    if entry is None:
+        return web.json_response({"error": f"Workflow file '{filename}' not found"}, status=404)
+    if not entry.get("schema_body"):
+        entry["schema_body"] = json.dumps({
+            "workflow": filename,
+            "inputs": entry["schema"],
+            "node_titles": entry["node_titles"],
+        }).encode("utf-8")
+    return await json_body_response(request, entry["schema_body"], ("schema", filename, entry["key"]))
+
+async def read_generate_request(request: web.Request):
+    """Parse a generate/sweep body and load its workflow, or the ``graph`` it carries.
+
+    Returns ``(payload, entry, None)`` on success or ``(None, None, response)``
+    with the error response to send.
+    """
+    try:
+        payload = await request.json()
+    except Exception:
+        return None, None, web.json_response({"error": "Invalid JSON payload"}, status=400)
+    if not isinstance(payload, dict):
+        return None, None, web.json_response({"error": "Invalid generate payload"}, status=400)
+
+    filename = payload["workflow"] = str(payload.get("workflow") or "")
+    payload["values"] = payload.get("values") or {}
+    payload["randomize"] = payload.get("randomize") or {}
+    payload["bypass"] = payload.get("bypass") or {}
+    graph = payload.get("graph")
+    if not filename and graph is None:
+        return None, None, web.json_response({"error": "Missing 'workflow' in payload"}, status=400)
+    if not all(isinstance(payload[key], dict) for key in ("values", "randomize", "bypass")):
+        return None, None, web.json_response({"error": "'values', 'randomize' and 'bypass' must be objects"}, status=400)
+
+    if graph is not None:
+        # A graph restored from history: values are injected into it instead of the workflow file.
+        if not isinstance(graph, dict) or not graph:
+            return None, None, web.json_response({"error": "'graph' must be a non-empty object"}, status=400)
+        # Injection and bypass index straight into nodes; anything else would surface as a 500.
+        bad_node = next((node_id for node_id, node in graph.items() if not (
+            isinstance(node, dict) and isinstance(node.get("class_type"), str) and isinstance(node.get("inputs"), dict)
+        )), None)
+        if bad_node is not None:
+            return None, None, web.json_response(
+                {"error": f"Graph node '{bad_node}' needs a string 'class_type' and an 'inputs' object"}, status=400)
+        try:
+            schema = await asyncio.to_thread(build_workflow_schema, graph)
+        except Exception as e:
+            return None, None, web.json_response({"error": f"Invalid graph: {e}"}, status=400)
+        return payload, {"text": json.dumps(graph), "workflow": graph, "schema": schema}, None
+
+    try:
+        entry = await asyncio.to_thread(load_workflow, filename)
+    except json.JSONDecodeError:
+        return None, None, web.json_response({"error": f"Invalid JSON in workflow file '{filename}'"}, status=400)
+    if entry is None:
+        return None, None, web.json_response({"error": f"Workflow file '{filename}' not found"}, status=404)
+    return payload, entry, None
+
+async def generate_workflow(request: web.Request) -> web.Response:
+    payload, entry, error = await read_generate_request(request)
+    if error is not None:
+        return error
+    filename = payload["workflow"]
+    values, randomize, bypass = payload["values"], payload["randomize"], payload["bypass"]
+
+    run_id = str(payload.get("run_id") or uuid.uuid4())
+    try:
+        prompt, applied = inject_workflow_values(
+            json.loads(entry["text"]), entry["schema"], values, randomize, bypass, run_id
+        )
+    except WorkflowInjectionError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    result_hash = prompt_cache_key(prompt) if is_result_cache_enabled() else None
+    if result_hash and payload.get("use_cache", True):
+        cached = await asyncio.to_thread(lookup_cached_result, result_hash)
+        if cached is not None:
+            history_id, outputs = cached
+            announce_outputs(outputs, run_id, history_id, cached=True)
+            return web.json_response({
+                "prompt_id": history_id,
+                "cached": True,
+                "run_id": run_id,
+                "values": applied,
+                "outputs": [
+                    {**output, "url": media_url_for(output) if output.get("kind") == "video" else view_url_for(output)}
+                    for output in outputs
+                ],
+            })
+
+    # Registered before queuing: with everything upstream cached, the output node can
+    # record its files before /prompt has even answered.
+    prompt_id = str(uuid.uuid4())
+    write_history_entry(prompt_id, {
+        "id": prompt_id,
+        "timestamp": now_iso(),
+        "run_id": run_id,
+        "json": {"prompt": prompt},
+        "fields": {
+            "formData": applied,
+            "randomizeState": randomize,
+            "bypassedState": bypass,
+            "selectedWorkflow": filename,
+        },
+    })
+    register_pending_run(run_id, prompt_id, result_hash)
+    try:
+        status, result = await queue_prompt(prompt, payload.get("client_id"), prompt_id)
+    except aiohttp.ClientError as e:
+        status, result = 502, {"error": f"Failed to queue prompt: {e}"}
+    if status != 200 or "prompt_id" not in result:
+        discard_pending_run(run_id)
+        delete_history_entry(prompt_id)
+        return web.json_response(result, status=status if status >= 400 else 502)
+
+    if str(result["prompt_id"]) != prompt_id:
+        await asyncio.to_thread(move_run_history, run_id, prompt_id, str(result["prompt_id"]))
+        prompt_id = str(result["prompt_id"])
+    return web.json_response({
+        "prompt_id": prompt_id,
+        "cached": False,
+        "number": result.get("number"),
+        "node_errors": result.get("node_errors", {}),
+        "run_id": run_id,
+        "values": applied,
+    })
+
+async def sweep_workflow(request: web.Request) -> web.Response:
+    payload, entry, error = await read_generate_request(request)
+    if error is not None:
+        return error
+    filename = payload["workflow"]
+    values, randomize, bypass = payload["values"], payload["randomize"], payload["bypass"]
+
+    try:
+        axes = parse_sweep_axes(payload.get("axes"), entry["schema"])
+    except WorkflowInjectionError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    total = sweep_job_count(axes)
+    max_jobs = get_max_sweep_jobs()
+    if total > max_jobs:
+        return web.json_response({"error": f"Sweep expands to {total} jobs, more than the limit of {max_jobs}"}, status=400)
+
+    axis_names = {name for name, _ in axes}
+    sweep_id = f"sweep_{uuid.uuid4().hex}"
+    client_id = payload.get("client_id")
+
+    def prepare_jobs():
+        # Every combination is injected before anything is queued, so a bad value queues nothing.
+        prepared = []
+        for combo in expand_sweep(axes):
+            # Axis values always win over the randomize toggle for the same input.
+            job_randomize = {key: value for key, value in randomize.items() if key not in combo}
+            run_id = f"{sweep_id}_{len(prepared)}"
+            prompt, applied = inject_workflow_values(
+                json.loads(entry["text"]), entry["schema"], {**values, **combo}, job_randomize, bypass, run_id,
+            )
+            prepared.append((run_id, prompt, applied))
+        return prepared
+
+    try:
+        prepared = await asyncio.to_thread(prepare_jobs)
+    except WorkflowInjectionError as e:
+        return web.json_response({"error": str(e)}, status=400)
+
+    # Written first: output nodes attach files to it as soon as each run finishes.
+    _, first_prompt, first_applied = prepared[0]
+    write_history_entry(sweep_id, {
+        "id": sweep_id,
+        "timestamp": now_iso(),
+        "json": {"prompt": first_prompt},
+        "fields": {
+            "formData": first_applied,
+            "randomizeState": {key: value for key, value in randomize.items() if key not in axis_names},
+            "bypassedState": bypass,
+            "selectedWorkflow": filename,
+        },
+        "sweep": {
+            "axes": [{"param": name, "values": axis_values} for name, axis_values in axes],
+            "total": total,
+            "prompt_ids": [],
+            "jobs": [],
+        },
+    })
+
+    jobs = []
+    failure = None
+    for run_id, prompt, applied in prepared:
+        register_pending_run(run_id, sweep_id, None)
+        try:
+            status, result = await queue_prompt(prompt, client_id)
+        except aiohttp.ClientError as e:
+            status, result = 502, {"error": f"Failed to queue prompt: {e}"}
+        if status != 200 or "prompt_id" not in result:
+            discard_pending_run(run_id)
+            failure = (status if status >= 400 else 502, result)
+            break
+        jobs.append({"prompt_id": str(result["prompt_id"]), "run_id": run_id, "values": applied})
+
+    if jobs:
+        with _history_lock:
+            history = load_history_entry(sweep_id) or {}
+            sweep = history.setdefault("sweep", {})
+            sweep["prompt_ids"] = [job["prompt_id"] for job in jobs]
+            sweep["jobs"] = [
+                {"prompt_id": job["prompt_id"], "values": {name: job["values"].get(name) for name, _ in axes}}
+                for job in jobs
+            ]
+            write_history_entry(sweep_id, history)
+    else:
+        delete_history_entry(sweep_id)
+
+    if failure is not None:
+        status, result = failure
+        return web.json_response({**result, "sweep_id": sweep_id if jobs else None, "queued": len(jobs), "total": total}, status=status)
+    return web.json_response({
+        "sweep_id": sweep_id,
+        "queued": len(jobs),
+        "total": total,
+        "prompt_ids": [job["prompt_id"] for job in jobs],
+    })
 
 import comfy.samplers
 
@@ -457,6 +3248,14 @@ routes = [
     web.get('/cozygen/hello', get_hello),
     web.get('/cozygen/gallery', get_gallery_files),
     web.get('/cozygen/thumb', get_thumbnail),
+    web.post('/cozygen/thumbs', get_thumbnail_batch),
+    web.get('/cozygen/queue_status', get_queue_status),
+    web.get('/cozygen/events', stream_events),
+    web.get('/cozygen/backends', get_backend_status),
+    web.get('/cozygen/export', export_gallery),
+    web.post('/cozygen/export', export_gallery),
+    web.get('/cozygen/media', get_media),
+    web.get('/cozygen/preview', get_video_preview),
     web.get('/cozygen/history', get_history_list),
     web.get('/cozygen/history/{history_id}', get_history_item),
     web.post('/cozygen/history', save_history_item),
@@ -466,6 +3265,14 @@ routes = [
     web.post('/cozygen/upload_image', upload_image),
     web.get('/cozygen/workflows', get_workflow_list),
     web.get('/cozygen/workflows/{filename}', get_workflow_file),
+    web.get('/cozygen/workflows/{filename}/schema', get_workflow_schema),
     web.post('/cozygen/workflows/{filename}', upload_workflow_file),
     web.get('/cozygen/get_choices', get_choices),
+    web.post('/cozygen/generate', generate_workflow),
+    web.post('/cozygen/sweep', sweep_workflow),
+    web.get('/cozygen/metrics', get_metrics),
+    web.post('/cozygen/debug/profile', profile_server),
 ]
+
+# Per-route request counts and latency for /cozygen/metrics.
+routes = instrument_routes(routes)
@@ -0,0 +1,154 @@
+"""Minimal stand-ins for the ComfyUI modules CozyGen imports.
+
+Benchmarks and load tests run outside ComfyUI, so ``install()`` registers fake
+``folder_paths``, ``server``, ``nodes`` and ``comfy.*`` modules rooted in a
+scratch directory, and ``load_cozygen()`` imports this repository as the
+``cozygen`` package the same way ComfyUI loads custom nodes.
+"""
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "cozygen"
+
+
+class _PromptQueue:
+    """ComfyUI's queue shape: items are (number, prompt_id, prompt, extra_data, outputs_to_execute)."""
+
+    def __init__(self):
+        self.running = []
+        self.pending = []
+
+    def get_current_queue(self):
+        return list(self.running), list(self.pending)
+
+
+class _PromptServer:
+    instance = None
+
+    def __init__(self):
+        from aiohttp import web
+
+        self.app = web.Application()
+        self.address = "127.0.0.1"
+        self.port = 8188
+        self.sent = []
+        self.prompt_queue = _PromptQueue()
+
+    def send_sync(self, event, data, sid=None):
+        self.sent.append((event, data))
+
+
+def _module(name: str, **attrs) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+
+def install(base_dir: str | None = None) -> str:
+    """Register the stub modules and return the scratch ComfyUI base directory."""
+    base_dir = base_dir or tempfile.mkdtemp(prefix="cozygen-bench-")
+    models_dir = os.path.join(base_dir, "models")
+    dirs = {
+        "output": os.path.join(base_dir, "output"),
+        "input": os.path.join(base_dir, "input"),
+        "temp": os.path.join(base_dir, "temp"),
+    }
+    folder_names_and_paths = {
+        name: ([os.path.join(models_dir, name)], {".safetensors", ".ckpt", ".pt"})
+        for name in ("checkpoints", "loras", "vae", "clip", "unet_gguf", "diffusion_models")
+    }
+    for path in [*dirs.values(), *(paths[0][0] for paths in folder_names_and_paths.values())]:
+        os.makedirs(path, exist_ok=True)
+
+    def get_filename_list(folder_name):
+        if folder_name not in folder_names_and_paths:
+            raise KeyError(folder_name)
+        root = folder_names_and_paths[folder_name][0][0]
+        found = []
+        for current, _, files in os.walk(root):
+            for name in files:
+                found.append(os.path.relpath(os.path.join(current, name), root).replace(os.sep, "/"))
+        return sorted(found)
+
+    def get_save_image_path(filename_prefix, output_dir, image_width=0, image_height=0):
+        subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+        filename = os.path.basename(os.path.normpath(filename_prefix))
+        full_output_folder = os.path.join(output_dir, subfolder)
+        os.makedirs(full_output_folder, exist_ok=True)
+        counter = len(os.listdir(full_output_folder)) + 1
+        return full_output_folder, filename, counter, subfolder, filename_prefix
+
+    _module(
+        "folder_paths",
+        models_dir=models_dir,
+        folder_names_and_paths=folder_names_and_paths,
+        get_output_directory=lambda: dirs["output"],
+        get_input_directory=lambda: dirs["input"],
+        get_temp_directory=lambda: dirs["temp"],
+        get_filename_list=get_filename_list,
+        get_save_image_path=get_save_image_path,
+        filter_files_content_types=lambda files, content_types: files,
+    )
+
+    _module("server", PromptServer=_PromptServer)
+    if _PromptServer.instance is None:
+        _PromptServer.instance = _PromptServer()
+
+    class SaveImage:
+        def __init__(self):
+            self.output_dir = dirs["output"]
+
+        def save_images(self, images, filename_prefix="ComfyUI"):
+            return {"ui": {"images": list(images)}}
+
+    class LoadImage:
+        def load_image(self, image):
+            return (image, None)
+
+    _module("nodes", SaveImage=SaveImage, LoadImage=LoadImage)
+
+    class IO:
+        STRING = "STRING"
+        INT = "INT"
+        FLOAT = "FLOAT"
+        BOOLEAN = "BOOLEAN"
+        IMAGE = "IMAGE"
+        ANY = "*"
+        PRIMITIVE = "STRING,FLOAT,INT,BOOLEAN"
+
+    class KSampler:
+        SAMPLERS = ["euler", "euler_ancestral", "dpmpp_2m", "dpmpp_2m_sde", "uni_pc"]
+        SCHEDULERS = ["normal", "karras", "exponential", "sgm_uniform", "simple"]
+
+    comfy = _module("comfy")
+    comfy.samplers = _module("comfy.samplers", KSampler=KSampler)
+    node_typing = _module("comfy.comfy_types.node_typing", IO=IO, ComfyNodeABC=object, InputTypeDict=dict)
+    comfy.comfy_types = _module(
+        "comfy.comfy_types", node_typing=node_typing, ComfyNodeABC=object, InputTypeDict=dict
+    )
+
+    # Never let a benchmark fetch the frontend build over the network.
+    if "requests" not in sys.modules:
+        def _offline_get(*args, **kwargs):
+            raise RuntimeError("network access is disabled in CozyGen benchmarks")
+
+        _module("requests", get=_offline_get)
+    return base_dir
+
+
+def load_cozygen():
+    """Import the repository as the ``cozygen`` package (install() must run first)."""
+    if PACKAGE_NAME in sys.modules:
+        return sys.modules[PACKAGE_NAME]
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME, os.path.join(REPO_DIR, "__init__.py"), submodule_search_locations=[REPO_DIR]
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules[PACKAGE_NAME] = package
+    spec.loader.exec_module(package)
+    return package
@@ -0,0 +1,50 @@
+"""Compare two benchmark result files written with ``--json``.
+
+    python -m benchmarks.compare before.json after.json [--threshold 1.2]
+
+Exits with status 1 when any shared benchmark's median got slower than the
+threshold ratio.
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    results = data.get("results", [data]) if isinstance(data, dict) else data
+    return {
+        (item["benchmark"], str(item.get("size", "-"))): item
+        for item in results
+        if "median_ms" in item
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="after/before median ratio that counts as a regression")
+    args = parser.parse_args(argv)
+
+    before = load_results(args.before)
+    after = load_results(args.after)
+    regressions = 0
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key]["median_ms"], after[key]["median_ms"]
+        ratio = new / old if old else float("inf")
+        flag = ""
+        if ratio > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        name, size = key
+        print(f"{name + ' [' + size + ']':<44} {old:10.3f} -> {new:10.3f} ms  x{ratio:5.2f}{flag}")
+    for key in sorted(before.keys() ^ after.keys()):
+        print(f"{key[0] + ' [' + key[1] + ']':<44} only in {'before' if key in before else 'after'}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Multi-client load and soak test for the CozyGen HTTP API.
+
+Boots the CozyGen routes on a local aiohttp server (ComfyUI stubbed out, see
+comfy_stubs.py) in a background thread and drives it with simulated phones:
+
+- browsing clients page the gallery, fetch thumbnail bursts and poll history;
+- generating clients POST session updates at the progress rate while a
+  simulated execution thread pushes progress events onto the server loop the
+  way PromptServer.send_sync does.
+
+Reports p50/p95/p99 latency per request kind, event-loop lag, progress event
+delivery delay and RSS over time:
+
+    python -m benchmarks.load --clients 8 --duration 60 --json > load.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from . import comfy_stubs
+from .micro import make_history_tree, make_images, make_output_tree
+
+THUMB_WIDTHS = (192, 256, 384)
+THUMB_BURST = 12
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values_s: list[float]) -> dict:
+    return {
+        "count": len(values_s),
+        "p50_ms": percentile(values_s, 50) * 1000,
+        "p95_ms": percentile(values_s, 95) * 1000,
+        "p99_ms": percentile(values_s, 99) * 1000,
+        "max_ms": max(values_s, default=0.0) * 1000,
+    }
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        # Peak rather than current RSS, but better than nothing off Linux.
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class ServerThread(threading.Thread):
+    """Runs the stub PromptServer app on its own event loop, like ComfyUI does."""
+
+    def __init__(self, app, lag_interval: float):
+        super().__init__(daemon=True)
+        self.app = app
+        self.lag_interval = lag_interval
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.port = None
+        self.lag_samples = []  # (monotonic time, lag seconds)
+        self.delivery_samples = []  # (monotonic time, delay seconds)
+
+    def run(self):
+        from aiohttp import web
+
+        asyncio.set_event_loop(self.loop)
+        self.runner = web.AppRunner(self.app, access_log=None)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        self.loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        lag_task = self.loop.create_task(self.measure_lag())
+        self.ready.set()
+        self.loop.run_forever()
+        lag_task.cancel()
+        self.loop.run_until_complete(asyncio.gather(lag_task, return_exceptions=True))
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    async def measure_lag(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.lag_samples.append((time.monotonic(), time.perf_counter() - started - self.lag_interval))
+
+    def deliver(self, sent: float):
+        self.delivery_samples.append((time.monotonic(), time.perf_counter() - sent))
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join(timeout=10)
+
+
+def emit_progress(server: ServerThread, hz: float, stop: threading.Event):
+    """Stand-in for the ComfyUI execution thread pushing progress to websockets."""
+    while not stop.wait(1 / hz):
+        server.loop.call_soon_threadsafe(server.deliver, time.perf_counter())
+
+
+class LoadTest:
+    def __init__(self, args, base_url: str, thumb_names: list[str]):
+        self.args = args
+        self.base_url = base_url
+        self.thumb_names = thumb_names
+        self.latencies = {}
+        self.errors = {}
+        self.request_times = []
+        self.deadline = 0.0
+
+    async def request(self, session, kind: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            async with session.request(method, self.base_url + path, **kwargs) as response:
+                await response.read()
+                ok = response.status < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        self.request_times.append(time.monotonic())
+        if ok:
+            self.latencies.setdefault(kind, []).append(elapsed)
+        else:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def thumbnail_burst(self, session, rng: random.Random):
+        start = rng.randrange(max(1, len(self.thumb_names) - THUMB_BURST + 1))
+        width = rng.choice(THUMB_WIDTHS)
+        if self.args.thumb_batch:
+            items = [{"filename": name, "subfolder": "thumbs"} for name in self.thumb_names[start:start + THUMB_BURST]]
+            await self.request(session, "thumbnail_batch", "POST", "/cozygen/thumbs", json={"items": items, "w": width})
+            return
+        await asyncio.gather(*(
+            self.request(session, "thumbnail", "GET", "/cozygen/thumb",
+                         params={"filename": name, "subfolder": "thumbs", "w": str(width)})
+            for name in self.thumb_names[start:start + THUMB_BURST]
+        ))
+
+    async def browsing_client(self, index: int):
+        import aiohttp
+
+        rng = random.Random(index)
+        pages = max(1, self.args.outputs // 20)
+        actions = [
+            (4, lambda s: self.request(s, "gallery", "GET", "/cozygen/gallery",
+                                       params={"subfolder": "bench", "page": str(rng.randint(1, pages)), "per_page": "20"})),
+            (3, lambda s: self.thumbnail_burst(s, rng)),
+            (2, lambda s: self.request(s, "history", "GET", "/cozygen/history",
+                                       headers={"Accept-Encoding": "gzip"})),
+            (1, lambda s: self.request(s, "history_item", "GET", f"/cozygen/history/{rng.randrange(self.args.history):08x}-bench")),
+        ]
+        weights = [weight for weight, _ in actions]
+        # Browsers keep about six connections per host.
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=6)) as session:
+            while time.monotonic() < self.deadline:
+                _, action = rng.choices(actions, weights)[0]
+                await action(session)
+                await asyncio.sleep(rng.expovariate(1 / self.args.think_time))
+
+    async def generating_client(self, index: int):
+        import aiohttp
+
+        interval = 1 / self.args.progress_hz
+        async with aiohttp.ClientSession() as session:
+            step = 0
+            while time.monotonic() < self.deadline:
+                step += 1
+                payload = {"formData": {"Prompt": f"load test {index}", "Steps": 30, "progress": step}}
+                await self.request(session, "session_post", "POST", "/cozygen/session", json=payload)
+                await asyncio.sleep(interval)
+
+    async def run(self) -> None:
+        self.deadline = time.monotonic() + self.args.duration
+        tasks = [self.browsing_client(i) for i in range(self.args.clients)]
+        tasks += [self.generating_client(i) for i in range(self.args.generating)]
+        await asyncio.gather(*tasks)
+
+
+def timeline(started: float, duration: float, interval: float, server: ServerThread, rss: list, request_times: list) -> list:
+    windows = []
+    t = started
+    while t < started + duration:
+        end = t + interval
+        lags = [lag for stamp, lag in server.lag_samples if t <= stamp < end]
+        delays = [delay for stamp, delay in server.delivery_samples if t <= stamp < end]
+        rss_values = [value for stamp, value in rss if t <= stamp < end]
+        windows.append({
+            "t_s": round(t - started, 3),
+            "requests": sum(1 for stamp in request_times if t <= stamp < end),
+            "loop_lag_max_ms": max(lags, default=0.0) * 1000,
+            "event_delay_max_ms": max(delays, default=0.0) * 1000,
+            "rss_mb": (max(rss_values) if rss_values else 0) / (1024 * 1024),
+        })
+        t = end
+    return windows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=6, help="browsing clients")
+    parser.add_argument("--generating", type=int, default=1, help="clients posting session updates at the progress rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between browsing actions")
+    parser.add_argument("--progress-hz", type=float, default=4.0, help="progress events and session POSTs per second")
+    parser.add_argument("--outputs", type=int, default=5000, help="files in the synthetic gallery folder")
+    parser.add_argument("--history", type=int, default=2000, help="synthetic history entries")
+    parser.add_argument("--images", type=int, default=48, help="real images used for thumbnail requests")
+    parser.add_argument("--thumb-batch", action="store_true",
+                        help="fetch each thumbnail burst with one POST /cozygen/thumbs instead of one GET per tile")
+    parser.add_argument("--sample-interval", type=float, default=1.0, help="seconds per timeline window")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results to stdout")
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_load(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for kind, stats in report["latency"].items():
+        print(f"{kind:<14} n={stats['count']:<6} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f}  "
+              f"p99 {stats['p99_ms']:8.2f}  errors {report['errors'].get(kind, 0)}")
+    for name in ("loop_lag", "event_delivery"):
+        stats = report[name]
+        print(f"{name:<14} p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f}  "
+              f"max {stats['max_ms']:8.2f}")
+    print(f"rss            start {report['timeline'][0]['rss_mb']:.1f} MB  "
+          f"end {report['timeline'][-1]['rss_mb']:.1f} MB  peak {report['rss_peak_mb']:.1f} MB")
+
+
+def run_load(args) -> dict:
+    base_dir = comfy_stubs.install(tempfile.mkdtemp(prefix="cozygen-load-"))
+    comfy_stubs.load_cozygen()
+    api = sys.modules[f"{comfy_stubs.PACKAGE_NAME}.api"]
+    import folder_paths
+    import server as comfy_server
+
+    config = {"cache_dir": os.path.join(base_dir, "cache")}
+    api.get_config = lambda: dict(config)
+    output_dir = folder_paths.get_output_directory()
+    print("building synthetic outputs, history and thumbnail sources...", file=sys.stderr)
+    make_output_tree(os.path.join(output_dir, "bench"), args.outputs)
+    make_history_tree(os.path.join(config["cache_dir"], "history"), args.history)
+    thumb_names = make_images(os.path.join(output_dir, "thumbs"), args.images, 1024, 768)
+
+    server = ServerThread(comfy_server.PromptServer.instance.app, lag_interval=0.01)
+    server.start()
+    server.ready.wait()
+    stop = threading.Event()
+    emitter = threading.Thread(target=emit_progress, args=(server, args.progress_hz, stop), daemon=True)
+    rss = []
+
+    def sample_rss():
+        while not stop.wait(args.sample_interval / 4):
+            rss.append((time.monotonic(), current_rss_bytes()))
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    load = LoadTest(args, f"http://127.0.0.1:{server.port}", thumb_names)
+    started = time.monotonic()
+    rss.append((started, current_rss_bytes()))
+    emitter.start()
+    sampler.start()
+    try:
+        asyncio.run(load.run())
+    finally:
+        stop.set()
+        emitter.join()
+        sampler.join()
+        server.stop()
+        shutil.rmtree(base_dir, ignore_errors=True)
+    elapsed = time.monotonic() - started
+
+    return {
+        "suite": "load",
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "elapsed_s": elapsed,
+        "latency": {kind: summarize(values) for kind, values in sorted(load.latencies.items())},
+        "errors": load.errors,
+        "loop_lag": summarize([lag for _, lag in server.lag_samples]),
+        "event_delivery": summarize([delay for _, delay in server.delivery_samples]),
+        "rss_peak_mb": max(value for _, value in rss) / (1024 * 1024),
+        "timeline": timeline(started, elapsed, args.sample_interval, server, rss, load.request_times),
+    }
+
+
+if __name__ == "__main__":
+    main()
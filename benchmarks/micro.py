@@ -0,0 +1,319 @@
+"""Offline micro-benchmarks for CozyGen's hot paths.
+
+Runs against stubbed ComfyUI modules (see comfy_stubs.py) and synthetic
+output/history trees, so no GPU or ComfyUI checkout is needed:
+
+    python -m benchmarks.micro --sizes 1000,10000,200000 --json > results.json
+
+Every benchmark reports min/median/mean/max milliseconds per call. Compare the
+JSON from two checkouts to spot regressions before deploying.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from . import comfy_stubs
+
+IMAGE_EXTENSIONS = (".png", ".png", ".png", ".jpg", ".webp", ".mp4")
+
+
+def make_output_tree(root: str, count: int):
+    """``count`` outputs spread over a flat folder plus a few dated subfolders."""
+    os.makedirs(root, exist_ok=True)
+    now = time.time()
+    for day in range(5):
+        os.makedirs(os.path.join(root, f"2026-01-{day + 1:02d}"), exist_ok=True)
+    for index in range(count):
+        ext = IMAGE_EXTENSIONS[index % len(IMAGE_EXTENSIONS)]
+        path = os.path.join(root, f"CozyGen_{index:06d}_{ext[1:]}{ext}")
+        with open(path, "wb"):
+            pass
+        stamp = now - (count - index)
+        os.utime(path, (stamp, stamp))
+
+
+def make_history_tree(history_dir: str, count: int):
+    os.makedirs(history_dir, exist_ok=True)
+    rng = random.Random(count)
+    for index in range(count):
+        history_id = f"{index:08x}-bench"
+        seed = rng.randrange(2**32)
+        entry = {
+            "id": history_id,
+            "timestamp": f"2026-01-01T00:{index // 3600 % 60:02d}:{index // 60 % 60:02d}.{index % 60:06d}Z",
+            "json": {"prompt": {
+                "3": {"class_type": "KSampler", "inputs": {"seed": seed, "steps": 30, "cfg": 6.5}},
+                "6": {"class_type": "CLIPTextEncode", "inputs": {"text": f"benchmark prompt {index}"}},
+                "9": {"class_type": "CozyGenOutput", "inputs": {"images": ["8", 0]}},
+            }},
+            "fields": {
+                "formData": {"Prompt": f"benchmark prompt {index}", "Seed": seed, "Steps": 30},
+                "randomizeState": {"Seed": True},
+                "bypassedState": {},
+                "selectedWorkflow": "bench.json",
+            },
+        }
+        with open(os.path.join(history_dir, f"{history_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+
+
+def make_models(folder: str, count: int):
+    os.makedirs(folder, exist_ok=True)
+    for index in range(count):
+        with open(os.path.join(folder, f"model_{index:05d}.safetensors"), "wb"):
+            pass
+
+
+def make_images(folder: str, count: int, width: int = 1536, height: int = 1024) -> list[str]:
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for index in range(count):
+        name = f"thumb_source_{index}.png"
+        image = Image.effect_mandelbrot((width, height), (-2.0 - index * 0.1, -1.0, 1.0, 1.0), 64).convert("RGB")
+        image.save(os.path.join(folder, name))
+        names.append(name)
+    return names
+
+
+def make_wav(path: str, seconds: float, rate: int = 44100):
+    """Stereo 16-bit tone with a slow swell, written in chunks so long files stay cheap."""
+    import wave
+    import numpy as np
+
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        for start in range(0, int(seconds * rate), rate):
+            t = np.arange(start, min(start + rate, int(seconds * rate))) / rate
+            tone = (0.5 + 0.4 * np.sin(t)) * np.sin(2 * np.pi * 220 * t)
+            wav.writeframes((np.repeat(tone[:, None], 2, axis=1) * 32767).astype("<i2").tobytes())
+    return path
+
+
+class FakeTensor:
+    """Just enough of a torch tensor for CozyGenVideoOutput.save_video."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+def json_request(loop, method: str, path: str, payload):
+    from aiohttp import streams
+    from aiohttp.test_utils import make_mocked_request
+
+    protocol = mock.Mock(_reading_paused=False)
+    reader = streams.StreamReader(protocol, 2**16, loop=loop)
+    reader.feed_data(json.dumps(payload).encode("utf-8"))
+    reader.feed_eof()
+    return make_mocked_request(method, path, headers={"Content-Type": "application/json"}, payload=reader)
+
+
+def get_request(path: str, headers=None):
+    from aiohttp.test_utils import make_mocked_request
+
+    return make_mocked_request("GET", path, headers=headers or {})
+
+
+class Runner:
+    def __init__(self, repeat: int, only: list[str]):
+        self.repeat = repeat
+        self.only = only
+        self.results = []
+        self.loop = asyncio.new_event_loop()
+
+    def wanted(self, name: str) -> bool:
+        return not self.only or any(part in name for part in self.only)
+
+    def bench(self, name: str, size, fn, setup=None, repeat=None):
+        """Time ``fn()`` (sync or coroutine function).
+
+        ``setup()`` runs untimed before each call; when given, its return value
+        is passed to ``fn``.
+        """
+        if not self.wanted(name):
+            return
+        timings = []
+        error = None
+        for _ in range(repeat or self.repeat):
+            args = () if setup is None else (setup(),)
+            started = time.perf_counter()
+            try:
+                result = fn(*args)
+                if asyncio.iscoroutine(result):
+                    result = self.loop.run_until_complete(result)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+            timings.append(time.perf_counter() - started)
+            status = getattr(result, "status", 200)
+            if status >= 400:
+                error = f"HTTP {status}: {getattr(result, 'text', '')}"
+                break
+        record = {"benchmark": name, "size": size}
+        if error is not None:
+            record["error"] = error
+        else:
+            record.update({
+                "runs": len(timings),
+                "min_ms": min(timings) * 1000,
+                "median_ms": statistics.median(timings) * 1000,
+                "mean_ms": statistics.fmean(timings) * 1000,
+                "max_ms": max(timings) * 1000,
+            })
+        self.results.append(record)
+        print(format_record(record), file=sys.stderr)
+
+
+def format_record(record: dict) -> str:
+    label = f"{record['benchmark']} [{record['size']}]"
+    if "error" in record:
+        return f"{label:<44} skipped: {record['error']}"
+    return (f"{label:<44} median {record['median_ms']:9.3f} ms  "
+            f"min {record['min_ms']:9.3f}  max {record['max_ms']:9.3f}")
+
+
+def run_suite(args) -> list[dict]:
+    base_dir = comfy_stubs.install(tempfile.mkdtemp(prefix="cozygen-micro-"))
+    comfy_stubs.load_cozygen()
+    api = sys.modules[f"{comfy_stubs.PACKAGE_NAME}.api"]
+    nodes = sys.modules[f"{comfy_stubs.PACKAGE_NAME}.nodes"]
+    import folder_paths
+    import numpy as np
+
+    # Keep the real config.json (and its cache_dir) out of the picture. Preview renders queued by
+    # save_video would run in the background and outlive the scratch directory.
+    config = {"video_previews": False}
+    api.get_config = lambda: dict(config)
+    runner = Runner(args.repeat, args.only)
+    output_dir = folder_paths.get_output_directory()
+
+    try:
+        for size in args.sizes:
+            print(f"building {size} outputs and history entries...", file=sys.stderr)
+            make_output_tree(os.path.join(output_dir, f"bench_{size}"), size)
+            cache_dir = os.path.join(base_dir, f"cache_{size}")
+            make_history_tree(os.path.join(cache_dir, "history"), size)
+            config["cache_dir"] = cache_dir
+
+            first_page = get_request(f"/cozygen/gallery?subfolder=bench_{size}&page=1&per_page=20")
+            last_page = get_request(f"/cozygen/gallery?subfolder=bench_{size}&page={max(1, size // 20)}&per_page=20")
+            history = get_request("/cozygen/history", {"Accept-Encoding": "gzip"})
+            runner.bench("gallery.first_page", size, lambda: api.get_gallery_files(first_page))
+            runner.bench("gallery.last_page", size, lambda: api.get_gallery_files(last_page))
+            runner.bench("history.list_entries", size, api.list_history_entries)
+            runner.bench("history.list_handler", size, lambda: api.get_history_list(history))
+
+        config["cache_dir"] = os.path.join(base_dir, "cache_session")
+        session = {"formData": {f"param_{i}": i for i in range(200)}, "selectedWorkflow": "bench.json"}
+        runner.bench("session.save", "-", api.save_session,
+                     setup=lambda: json_request(runner.loop, "POST", "/cozygen/session", session))
+
+        for folder in ("loras", "checkpoints"):
+            make_models(folder_paths.folder_names_and_paths[folder][0][0], args.models)
+        samplers = get_request("/cozygen/get_choices?type=sampler")
+        loras = get_request("/cozygen/get_choices?type=loras")
+        runner.bench("choices.sampler", "-", lambda: api.get_choices(samplers))
+        runner.bench("choices.loras", args.models, lambda: api.get_choices(loras))
+        runner.bench("choice_input.input_types_cold", args.models, lambda _: nodes.CozyGenChoiceInput.INPUT_TYPES(),
+                     setup=nodes.get_all_choice_types.cache_clear)
+        runner.bench("choice_input.input_types_warm", args.models, nodes.CozyGenChoiceInput.INPUT_TYPES)
+
+        thumbs_dir = os.path.join(output_dir, "thumbs")
+        names = make_images(thumbs_dir, 4)
+        sources = [os.path.join(thumbs_dir, name) for name in names]
+        for fmt in ("webp", "jpeg"):
+            def build(fmt=fmt):
+                for path in sources:
+                    stat = os.stat(path)
+                    api.build_thumbnail_bytes(path, stat.st_mtime, stat.st_size, 256, 55, fmt)
+            runner.bench(f"thumbnail.build_{fmt}_x{len(sources)}", "1536x1024", build, repeat=max(3, args.repeat // 2))
+        widths = api.THUMBNAIL_PYRAMID_WIDTHS
+
+        def build_widths_separately():
+            for path in sources:
+                stat = os.stat(path)
+                for width in widths:
+                    api.build_thumbnail_bytes(path, stat.st_mtime, stat.st_size, width, 55, "webp")
+        runner.bench(f"thumbnail.widths_separately_x{len(sources)}", "1536x1024", build_widths_separately,
+                     repeat=max(3, args.repeat // 2))
+        runner.bench(f"thumbnail.pyramid_x{len(sources)}", "1536x1024",
+                     lambda: [api.build_thumbnail_pyramid(path, widths, 55, ["webp"]) for path in sources],
+                     repeat=max(3, args.repeat // 2))
+        thumb = get_request(f"/cozygen/thumb?filename={names[0]}&subfolder=thumbs&w=256")
+        runner.bench("thumbnail.handler_cached", "1536x1024", lambda: api.get_thumbnail(thumb))
+
+        audio_path = make_wav(os.path.join(output_dir, "waveform.wav"), args.audio_seconds)
+        runner.bench("thumbnail.waveform_pyramid", f"{args.audio_seconds:g}s 44.1kHz stereo",
+                     lambda: api.build_thumbnail_pyramid(audio_path, widths, 55, ["webp", api.WAVEFORM_PEAKS_FORMAT]),
+                     repeat=max(3, args.repeat // 2))
+
+        frames = np.random.default_rng(0).random((args.video_frames, 256, 256, 3), dtype=np.float32)
+        video_node = nodes.CozyGenVideoOutput()
+        for video_format in args.video_formats:
+            runner.bench(f"video.save_{video_format.split('/')[-1]}", f"{args.video_frames}x256x256",
+                         lambda: video_node.save_video(FakeTensor(frames), 8, 0, "bench/video", video_format),
+                         repeat=max(3, args.repeat // 2))
+    finally:
+        runner.loop.close()
+        if args.keep:
+            print(f"benchmark data kept in {base_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(base_dir, ignore_errors=True)
+    return runner.results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="comma separated output/history tree sizes (default: 1000,10000)")
+    parser.add_argument("--repeat", type=int, default=7, help="timed calls per benchmark")
+    parser.add_argument("--models", type=int, default=500, help="model files per model folder")
+    parser.add_argument("--video-frames", type=int, default=24)
+    parser.add_argument("--audio-seconds", type=float, default=180.0, help="length of the WAV used for waveforms")
+    # Not video/webm: save_video hands imageio's default libx264 a .webm container, which ffmpeg rejects.
+    parser.add_argument("--video-formats", default="image/gif,video/mp4",
+                        help="formats passed to CozyGenVideoOutput.save_video")
+    parser.add_argument("--only", default="", help="comma separated substrings of benchmark names to run")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data directory")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results to stdout")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    args.video_formats = [fmt.strip() for fmt in args.video_formats.split(",") if fmt.strip()]
+    args.only = [part.strip() for part in args.only.split(",") if part.strip()]
+
+    started = time.time()
+    # The plugin prints progress messages; keep stdout for the results.
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run_suite(args)
+    if args.json:
+        print(json.dumps({
+            "suite": "micro",
+            "python": sys.version.split()[0],
+            "started_at": started,
+            "results": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
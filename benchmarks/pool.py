@@ -0,0 +1,263 @@
+"""Throughput and failover test for CozyGen's ComfyUI backend pool.
+
+Starts stand-in ComfyUI servers (``/prompt``, ``/history``, ``/view`` and a
+``/ws`` that sends execution events) which "render" each prompt by sleeping
+and writing a small PNG. CozyGen's ``backends`` is pointed at them and a burst
+of prompts is timed end to end, up to the outputs being copied into the local
+gallery and announced:
+
+    python -m benchmarks.pool --backends 1,2,4 --jobs 24 --job-seconds 0.5
+    python -m benchmarks.pool --backends 3 --kill-one --json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+from . import comfy_stubs
+
+
+class FakeComfyUI:
+    """One GPU box: runs its queue one prompt at a time and reports progress over /ws."""
+
+    def __init__(self, root: str, job_seconds: float, steps: int = 4):
+        from aiohttp import web
+
+        self.output_dir = os.path.join(root, "output")
+        self.job_seconds = job_seconds
+        self.steps = steps
+        self.queue = asyncio.Queue()
+        self.history = {}
+        self.sockets = {}
+        self.queue_remaining = 0
+        self.number = 0
+        self.counter = 0
+        self.url = None
+        self.app = web.Application()
+        self.app.router.add_post("/prompt", self.post_prompt)
+        self.app.router.add_get("/prompt", self.get_prompt)
+        self.app.router.add_get("/history/{prompt_id}", self.get_history)
+        self.app.router.add_get("/view", self.view)
+        self.app.router.add_get("/ws", self.websocket)
+
+    async def start(self):
+        from aiohttp import web
+
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        self.worker = asyncio.get_running_loop().create_task(self.run_queue())
+
+    async def stop(self):
+        self.worker.cancel()
+        await asyncio.gather(self.worker, return_exceptions=True)
+        for ws in list(self.sockets.values()):
+            await ws.close()
+        await self.runner.cleanup()
+
+    async def post_prompt(self, request):
+        from aiohttp import web
+
+        body = await request.json()
+        prompt_id = str(uuid.uuid4())
+        self.number += 1
+        self.queue_remaining += 1
+        self.queue.put_nowait((prompt_id, body["prompt"], body.get("client_id")))
+        return web.json_response({"prompt_id": prompt_id, "number": self.number, "node_errors": {}})
+
+    async def get_prompt(self, request):
+        from aiohttp import web
+
+        return web.json_response({"exec_info": {"queue_remaining": self.queue_remaining}})
+
+    async def get_history(self, request):
+        from aiohttp import web
+
+        prompt_id = request.match_info["prompt_id"]
+        entry = self.history.get(prompt_id)
+        return web.json_response({prompt_id: entry} if entry else {})
+
+    async def view(self, request):
+        from aiohttp import web
+
+        query = request.rel_url.query
+        path = os.path.join(self.output_dir, query.get("subfolder", ""), query["filename"])
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        return web.FileResponse(path)
+
+    async def websocket(self, request):
+        from aiohttp import web
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        client_id = request.rel_url.query.get("clientId") or uuid.uuid4().hex
+        self.sockets[client_id] = ws
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self.sockets.pop(client_id, None)
+        return ws
+
+    async def send(self, client_id, event: str, data: dict):
+        ws = self.sockets.get(client_id)
+        if ws is not None and not ws.closed:
+            await ws.send_json({"type": event, "data": data})
+
+    def write_output(self) -> dict:
+        from PIL import Image
+
+        self.counter += 1
+        # Every box numbers its files the same way, as separate ComfyUI installs do.
+        filename = f"output_{self.counter:05d}_.png"
+        os.makedirs(os.path.join(self.output_dir, "CozyGen"), exist_ok=True)
+        Image.new("RGB", (64, 64), (self.counter * 7 % 256, 80, 160)).save(
+            os.path.join(self.output_dir, "CozyGen", filename))
+        return {"filename": filename, "subfolder": "CozyGen", "type": "output"}
+
+    async def run_queue(self):
+        while True:
+            prompt_id, prompt, client_id = await self.queue.get()
+            await self.send(client_id, "execution_start", {"prompt_id": prompt_id, "timestamp": time.time()})
+            for node_id in sorted(prompt):
+                await self.send(client_id, "executing", {"node": node_id, "prompt_id": prompt_id})
+            for step in range(self.steps):
+                await asyncio.sleep(self.job_seconds / self.steps)
+                await self.send(client_id, "progress",
+                                {"value": step + 1, "max": self.steps, "prompt_id": prompt_id, "node": "3"})
+            image = await asyncio.to_thread(self.write_output)
+            self.history[prompt_id] = {"outputs": {"9": {"images": [image]}}, "status": {"completed": True}}
+            self.queue_remaining -= 1
+            await self.send(client_id, "executing", {"node": None, "prompt_id": prompt_id})
+            await self.send(client_id, "execution_success", {"prompt_id": prompt_id, "timestamp": time.time()})
+
+
+def make_prompt(index: int, run_id: str) -> dict:
+    return {
+        "3": {"class_type": "KSampler", "inputs": {"seed": index, "steps": 4}},
+        "9": {"class_type": "CozyGenOutput", "inputs": {"images": ["3", 0], "run_id": run_id}},
+    }
+
+
+async def reset_pool(api):
+    tasks = [state["relay"] for state in api._backends.values() if state.get("relay") is not None]
+    if api._backend_monitor is not None:
+        tasks.append(api._backend_monitor)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    api._backend_monitor = None
+    api._backends.clear()
+    api._remote_prompts.clear()
+    api._early_finished.clear()
+
+
+async def run_scenario(api, config: dict, base_dir: str, count: int, args) -> dict:
+    import server as comfy_server
+
+    backends = [FakeComfyUI(os.path.join(base_dir, f"box_{count}_{i}"), args.job_seconds) for i in range(count)]
+    for backend in backends:
+        await backend.start()
+    config["backends"] = [backend.url for backend in backends]
+    killed = None
+    if args.kill_one and count > 1:
+        # Health checks have seen it alive; dispatch has to discover the failure itself.
+        await asyncio.gather(*(api.check_backend(state) for state in api.sync_backend_states()))
+        killed = backends[0]
+        await killed.stop()
+
+    sent = comfy_server.PromptServer.instance.sent
+    sent.clear()
+    started = time.perf_counter()
+    prompt_ids = set()
+    errors = 0
+    for index in range(args.jobs):
+        status, result = await api.queue_prompt(make_prompt(index, uuid.uuid4().hex))
+        if status == 200:
+            prompt_ids.add(result["prompt_id"])
+        else:
+            errors += 1
+    queued = time.perf_counter() - started
+
+    def completed() -> set:
+        return {data.get("history_id") for event, data in sent if event == "cozygen_batch_ready"} & prompt_ids
+
+    deadline = started + args.timeout
+    while len(completed()) < len(prompt_ids) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    done = len(completed())
+    relayed = sum(1 for event, _ in sent if event == "progress")
+
+    await reset_pool(api)
+    for backend in backends:
+        if backend is not killed:
+            await backend.stop()
+    return {
+        "backends": count,
+        "killed": killed is not None,
+        "jobs": args.jobs,
+        "completed": done,
+        "dispatch_errors": errors,
+        "queue_s": queued,
+        "elapsed_s": elapsed,
+        "jobs_per_s": done / elapsed if elapsed else 0.0,
+        "progress_events_relayed": relayed,
+        "per_backend": [backend.number for backend in backends],
+    }
+
+
+async def run_suite(args) -> list:
+    base_dir = comfy_stubs.install(tempfile.mkdtemp(prefix="cozygen-pool-"))
+    comfy_stubs.load_cozygen()
+    api = sys.modules[f"{comfy_stubs.PACKAGE_NAME}.api"]
+    config = {"cache_dir": os.path.join(base_dir, "cache")}
+    api.get_config = lambda: dict(config)
+    results = []
+    try:
+        for count in args.backends:
+            result = await run_scenario(api, config, base_dir, count, args)
+            if results:
+                result["speedup"] = result["jobs_per_s"] / results[0]["jobs_per_s"] if results[0]["jobs_per_s"] else 0.0
+            results.append(result)
+            print(f"{count} backend(s){' (one killed)' if result['killed'] else ''}: "
+                  f"{result['completed']}/{result['jobs']} jobs in {result['elapsed_s']:.2f}s "
+                  f"= {result['jobs_per_s']:.2f} jobs/s, split {result['per_backend']}, "
+                  f"{result['progress_events_relayed']} progress events relayed", file=sys.stderr)
+    finally:
+        session = api._http_session
+        if session is not None and not session.closed:
+            await session.close()
+        shutil.rmtree(base_dir, ignore_errors=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="1,2,4", help="comma separated pool sizes to run (default: 1,2,4)")
+    parser.add_argument("--jobs", type=int, default=24, help="prompts queued per scenario")
+    parser.add_argument("--job-seconds", type=float, default=0.5, help="simulated execution time per prompt")
+    parser.add_argument("--kill-one", action="store_true", help="stop one backend right before dispatching")
+    parser.add_argument("--timeout", type=float, default=120.0, help="give up waiting for outputs after this long")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results to stdout")
+    args = parser.parse_args(argv)
+    args.backends = [int(count) for count in args.backends.split(",") if count.strip()]
+
+    with contextlib.redirect_stdout(sys.stderr):
+        results = asyncio.run(run_suite(args))
+    if args.json:
+        print(json.dumps({"suite": "pool", "config": {k: v for k, v in vars(args).items() if k != "json"},
+                          "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Measure how much CozyGen adds to ComfyUI startup.
+
+Each run imports the plugin in a fresh interpreter with ComfyUI stubbed out
+and its usual dependencies (aiohttp, PIL) already loaded, since ComfyUI has
+imported those before it reaches custom nodes. A discarded warm-up run writes
+the bytecode cache so the numbers match a normal restart. ``-X importtime``
+gives the per-module breakdown.
+
+    python -m benchmarks.startup [--runs 10] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from .comfy_stubs import PACKAGE_NAME, REPO_DIR
+
+CHILD_CODE = """
+import sys, time
+sys.path.insert(0, {root!r})
+from benchmarks import comfy_stubs
+comfy_stubs.install()
+import aiohttp.web, PIL.Image  # already loaded inside ComfyUI
+started = time.perf_counter()
+comfy_stubs.load_cozygen()
+print("COZYGEN_IMPORT_SECONDS", time.perf_counter() - started)
+"""
+
+
+def run_once() -> tuple[float, dict]:
+    code = CHILD_CODE.format(root=REPO_DIR)
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=REPO_DIR, env=env, check=True,
+    )
+    seconds = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("COZYGEN_IMPORT_SECONDS"):
+            seconds = float(line.split()[1])
+    modules = {}
+    for line in proc.stderr.splitlines():
+        # import time:   self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        name = parts[2].strip()
+        if name == PACKAGE_NAME or name.startswith(PACKAGE_NAME + "."):
+            modules[name] = {"self_us": int(parts[0]), "cumulative_us": int(parts[1])}
+    if seconds is None:
+        raise RuntimeError(f"benchmark child did not report a timing:\n{proc.stdout}\n{proc.stderr}")
+    return seconds, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    run_once()
+    timings = []
+    module_samples = {}
+    for _ in range(args.runs):
+        seconds, modules = run_once()
+        timings.append(seconds)
+        for name, sample in modules.items():
+            module_samples.setdefault(name, []).append(sample["cumulative_us"])
+
+    result = {
+        "benchmark": "startup.import",
+        "runs": args.runs,
+        "min_ms": min(timings) * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+        "modules_median_cumulative_ms": {
+            name: statistics.median(samples) / 1000 for name, samples in sorted(module_samples.items())
+        },
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"CozyGen import: median {result['median_ms']:.1f} ms "
+          f"(min {result['min_ms']:.1f}, max {result['max_ms']:.1f}) over {args.runs} runs")
+    for name, ms in result["modules_median_cumulative_ms"].items():
+        print(f"  {name:<24} {ms:8.1f} ms cumulative")
+
+
+if __name__ == "__main__":
+    main()
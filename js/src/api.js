@@ -16,6 +16,14 @@ export const getWorkflow = async (filename) => {
   return response.json();
 };
 
+export const getWorkflowSchema = async (filename) => {
+  const response = await fetch(`${BASE_URL}/workflows/${filename}/schema`);
+  if (!response.ok) {
+    throw new Error(`Failed to fetch workflow schema: ${filename}`);
+  }
+  return response.json();
+};
+
 export const queuePrompt = async (prompt) => {
     const response = await fetch(window.location.protocol + '//' + window.location.host + '/prompt', {
         method: 'POST',
@@ -30,6 +38,36 @@ export const queuePrompt = async (prompt) => {
     return response.json();
 };
 
+export const generateWorkflow = async (payload) => {
+  const response = await fetch(`${BASE_URL}/generate`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(payload),
+  });
+  const data = await response.json().catch(() => ({}));
+  if (!response.ok) {
+    throw new Error(data.error || 'Failed to queue prompt');
+  }
+  return data;
+};
+
+export const sweepWorkflow = async (payload) => {
+  const response = await fetch(`${BASE_URL}/sweep`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(payload),
+  });
+  const data = await response.json().catch(() => ({}));
+  if (!response.ok) {
+    throw new Error(data.error || 'Failed to queue sweep');
+  }
+  return data;
+};
+
 export const getQueue = async () => {
   const response = await fetch(window.location.protocol + '//' + window.location.host + '/queue');
   if (!response.ok) {
@@ -38,6 +76,26 @@ export const getQueue = async () => {
   return response.json();
 };
 
+// Queue with estimated start/finish times (epoch seconds) from CozyGen's execution statistics.
+export const getQueueStatus = async () => {
+  const response = await fetch(`${BASE_URL}/queue_status`);
+  if (!response.ok) {
+    throw new Error('Failed to fetch queue status');
+  }
+  return response.json();
+};
+
+// Server-sent CozyGen events: progress coalesced to `progressHz`, executing node names,
+// batch/video ready, and (opt-in) small latent previews.
+export const getEventStreamUrl = ({ clientId, progressHz, previews = false } = {}) => {
+  const params = new URLSearchParams();
+  if (clientId) params.set('client_id', clientId);
+  if (progressHz) params.set('progress_hz', String(progressHz));
+  if (previews) params.set('previews', '1');
+  const query = params.toString();
+  return `${BASE_URL}/events${query ? `?${query}` : ''}`;
+};
+
 export const deleteQueueItem = async (promptId) => {
   const response = await fetch(window.location.protocol + '//' + window.location.host + '/queue', {
     method: 'POST',
@@ -170,6 +228,101 @@ export const getThumbUrl = (filename, subfolder = '', type = 'output', options =
   return `${baseUrl}/cozygen/thumb?${params.toString()}`;
 };
 
+// Keep in step with THUMBNAIL_PYRAMID_WIDTHS in api.py: the server builds all of these
+// from one decode, so whichever width the browser picks is already cached.
+export const THUMB_SRCSET_WIDTHS = [256, 384, 512, 768];
+
+export const getThumbSrcSet = (filename, subfolder = '', type = 'output', options = {}, widths = THUMB_SRCSET_WIDTHS) =>
+  widths.map((w) => `${getThumbUrl(filename, subfolder, type, { ...options, w })} ${w}w`).join(', ');
+
+// Smallest srcset width that covers a tile `cssWidth` CSS pixels wide on this screen.
+export const pickThumbWidth = (cssWidth, widths = THUMB_SRCSET_WIDTHS) => {
+  const target = cssWidth * (window.devicePixelRatio || 1);
+  return widths.find((w) => w >= target) || widths[widths.length - 1];
+};
+
+export const thumbBatchKey = (subfolder, filename) => `${subfolder || ''}/${filename}`;
+
+// Last few batch bodies with their ETag; a revisited page revalidates instead of re-downloading.
+const THUMB_BATCH_CACHE_SIZE = 8;
+const thumbBatchCache = new Map();
+
+// One round trip for a whole gallery page. Resolves to { [thumbBatchKey]: objectURL };
+// the caller owns the URLs and should revoke them when the page goes away.
+export const getThumbBatch = async (items, options = {}) => {
+  const body = JSON.stringify({ ...options, items });
+  const cached = thumbBatchCache.get(body);
+  const response = await fetch(`${BASE_URL}/thumbs`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      ...(cached ? { 'If-None-Match': cached.etag } : {}),
+    },
+    body,
+  });
+  let buffer;
+  if (response.status === 304 && cached) {
+    buffer = cached.buffer;
+  } else if (response.ok) {
+    buffer = await response.arrayBuffer();
+  } else {
+    throw new Error('Failed to fetch thumbnails');
+  }
+  thumbBatchCache.delete(body);
+  const etag = response.headers.get('ETag');
+  if (etag) {
+    thumbBatchCache.set(body, { etag, buffer });
+    if (thumbBatchCache.size > THUMB_BATCH_CACHE_SIZE) {
+      thumbBatchCache.delete(thumbBatchCache.keys().next().value);
+    }
+  }
+  const manifestLength = new DataView(buffer).getUint32(0);
+  const manifest = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, manifestLength)));
+  const dataStart = 4 + manifestLength;
+  const urls = {};
+  manifest.items.forEach((entry) => {
+    if (entry.error) return;
+    const blob = new Blob([new Uint8Array(buffer, dataStart + entry.offset, entry.length)], { type: entry.content_type });
+    urls[thumbBatchKey(entry.subfolder, entry.filename)] = URL.createObjectURL(blob);
+  });
+  return urls;
+};
+
+// Min/max peaks of an audio output (audiowaveform JSON, 8-bit), one pair per pixel of `width`.
+// q only has to match the gallery tiles' so the server's cached decode is reused.
+export const getWaveformPeaks = async (filename, subfolder = '', type = 'output', width = 512) => {
+  const response = await fetch(getThumbUrl(filename, subfolder, type, { w: width, q: 45, fmt: 'peaks' }));
+  if (!response.ok) {
+    throw new Error('Failed to fetch waveform peaks');
+  }
+  return response.json();
+};
+
+// Streams a ZIP of a gallery folder (and everything below it); use as a plain download link.
+export const getExportUrl = (subfolder = '') => `${BASE_URL}/export?${new URLSearchParams({ subfolder }).toString()}`;
+
+export const getMediaUrl = (filename, subfolder = '', type = 'output') => {
+  const baseUrl = window.location.protocol + '//' + window.location.host;
+  const params = new URLSearchParams({
+    filename,
+    subfolder,
+    type,
+  });
+  return `${baseUrl}${BASE_URL}/media?${params.toString()}`;
+};
+
+// Low-bitrate rendition ('hover' or 'modal'); redirects to the original until it has been rendered.
+export const getPreviewUrl = (filename, subfolder = '', type = 'output', preset = 'modal') => {
+  const baseUrl = window.location.protocol + '//' + window.location.host;
+  const params = new URLSearchParams({
+    filename,
+    subfolder,
+    type,
+    preset,
+  });
+  return `${baseUrl}${BASE_URL}/preview?${params.toString()}`;
+};
+
 export const getObjectInfo = async () => {
   const response = await fetch(window.location.protocol + '//' + window.location.host + '/object_info');
   if (!response.ok) {
@@ -0,0 +1,88 @@
+import React, { useEffect, useRef, useState } from 'react';
+import { getWaveformPeaks } from '../api';
+
+const PEAKS_WIDTH = 512;
+const CLIP_ID = 'cozygen-waveform-played';
+
+// Builds one vertical bar per peak pair in a 0..length x 0..100 box.
+const waveformPath = ({ data, length }) => {
+  let loudest = 1;
+  for (const value of data) {
+    loudest = Math.max(loudest, Math.abs(value));
+  }
+  const bars = [];
+  for (let i = 0; i < length; i += 1) {
+    const top = 50 - (data[2 * i + 1] / loudest) * 50;
+    const bottom = 50 - (data[2 * i] / loudest) * 50;
+    bars.push(`M${i + 0.5} ${top.toFixed(1)}V${Math.max(bottom, top + 1).toFixed(1)}`);
+  }
+  return bars.join('');
+};
+
+// <audio> with a seekable waveform above it; just the player if peaks are unavailable.
+const AudioWaveform = ({ src, filename, subfolder = '', type = 'output' }) => {
+  const audioRef = useRef(null);
+  const [peaks, setPeaks] = useState(null);
+  const [position, setPosition] = useState(0);
+
+  useEffect(() => {
+    let cancelled = false;
+    setPeaks(null);
+    setPosition(0);
+    getWaveformPeaks(filename, subfolder, type, PEAKS_WIDTH)
+      .then((data) => {
+        if (!cancelled) setPeaks({ length: data.length, path: waveformPath(data) });
+      })
+      .catch((error) => console.warn('CozyGen: no waveform for', filename, error));
+    return () => {
+      cancelled = true;
+    };
+  }, [filename, subfolder, type]);
+
+  const seek = (event) => {
+    const audio = audioRef.current;
+    if (!audio || !audio.duration) return;
+    const rect = event.currentTarget.getBoundingClientRect();
+    const fraction = Math.min(1, Math.max(0, (event.clientX - rect.left) / rect.width));
+    audio.currentTime = fraction * audio.duration;
+    setPosition(fraction);
+  };
+
+  return (
+    <div className="w-full">
+      {peaks && (
+        <svg
+          viewBox={`0 0 ${peaks.length} 100`}
+          preserveAspectRatio="none"
+          className="w-full h-32 mb-2 cursor-pointer touch-none"
+          onPointerDown={seek}
+          onPointerMove={(event) => {
+            if (event.buttons & 1) seek(event);
+          }}
+        >
+          <defs>
+            <clipPath id={CLIP_ID}>
+              <rect x="0" y="0" width={position * peaks.length} height="100" />
+            </clipPath>
+          </defs>
+          <path d={peaks.path} className="stroke-gray-500" strokeWidth="1" fill="none" />
+          <path d={peaks.path} className="stroke-accent" strokeWidth="1" fill="none" clipPath={`url(#${CLIP_ID})`} />
+        </svg>
+      )}
+      <audio
+        ref={audioRef}
+        src={src}
+        controls
+        autoPlay
+        loop
+        className="w-full"
+        onTimeUpdate={(event) => {
+          const { currentTime, duration } = event.currentTarget;
+          if (duration) setPosition(currentTime / duration);
+        }}
+      />
+    </div>
+  );
+};
+
+export default AudioWaveform;
@@ -1,15 +1,19 @@
-import React from 'react';
+import React, { useState } from 'react';
 import LazyMedia from './LazyMedia';
-import { getThumbUrl, getViewUrl } from '../api';
+import { getPreviewUrl, getThumbSrcSet, getThumbUrl, getViewUrl } from '../api';
 
 const isVideo = (filename) => /\.(mp4|webm)$/i.test(filename);
 const isGif = (filename) => /\.(gif)$/i.test(filename);
 const isAudio = (filename) => /\.(mp3|wav|flac)$/i.test(filename);
+const TILE_SIZES = '(min-width: 1280px) 17vw, (min-width: 1024px) 20vw, (min-width: 768px) 25vw, (min-width: 640px) 33vw, 50vw';
 
-const GalleryItem = ({ item, onSelect }) => {
+const GalleryItem = ({ item, thumbSrc, thumbPending = false, onSelect }) => {
     const isDirectory = item.type === 'directory';
     const fileUrl = isDirectory ? '' : getViewUrl(item.filename, item.subfolder, 'output');
     const thumbUrl = isDirectory ? '' : getThumbUrl(item.filename, item.subfolder, 'output', { w: 384, q: 45, fmt: 'webp' });
+    const thumbSrcSet = isDirectory ? '' : getThumbSrcSet(item.filename, item.subfolder, 'output', { q: 45, fmt: 'webp' });
+    // Without ffmpeg (or for an unreadable file) audio tiles keep the generic icon.
+    const [waveformFailed, setWaveformFailed] = useState(false);
 
     const renderContent = () => {
         if (isDirectory) {
@@ -18,15 +22,30 @@ const GalleryItem = ({ item, onSelect }) => {
                     <svg className="w-16 h-16 text-gray-500 group-hover:text-accent transition-colors" fill="currentColor" viewBox="0 0 20 20" xmlns="http://www.w3.org/2000/svg"><path d="M2 6a2 2 0 012-2h5l2 2h5a2 2 0 012 2v6a2 2 0 01-2 2H4a2 2 0 01-2-2V6z"></path></svg>
                 </div>
             );
+        } else if (thumbPending) {
+            return <div className="w-full h-full bg-base-300/50 animate-pulse" />;
         } else if (isVideo(item.filename)) {
             return (
                 <LazyMedia
                     type="video"
-                    src={fileUrl}
+                    src={getPreviewUrl(item.filename, item.subfolder, 'output', 'hover')}
                     className="w-full h-full object-cover"
                     rootMargin="300px"
                 />
             );
+        } else if (isAudio(item.filename) && !waveformFailed) {
+            return (
+                <LazyMedia
+                    type="image"
+                    src={thumbSrc || thumbUrl}
+                    srcSet={thumbSrc ? undefined : thumbSrcSet}
+                    sizes={TILE_SIZES}
+                    alt={item.filename}
+                    className="w-full h-full object-cover"
+                    rootMargin="300px"
+                    onError={() => setWaveformFailed(true)}
+                />
+            );
         } else if (isAudio(item.filename)) {
             return (
                 <div className="flex flex-col items-center justify-center h-full bg-base-300/50">
@@ -38,8 +57,10 @@ const GalleryItem = ({ item, onSelect }) => {
             return (
                 <LazyMedia
                     type="image"
-                    src={isAnimatedGif ? fileUrl : (thumbUrl || fileUrl)}
+                    src={isAnimatedGif ? fileUrl : (thumbSrc || thumbUrl || fileUrl)}
                     fallbackSrc={fileUrl}
+                    srcSet={isAnimatedGif || thumbSrc ? undefined : thumbSrcSet}
+                    sizes={TILE_SIZES}
                     alt={item.filename}
                     className="w-full h-full object-cover"
                     rootMargin="300px"
@@ -1,6 +1,6 @@
 import React, { useEffect, useMemo, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getHistory, getThumbUrl, getViewUrl, getCozyHistoryList } from '../api';
+import { getHistory, getPreviewUrl, getThumbUrl, getViewUrl, getCozyHistoryList, getCozyHistoryItem } from '../api';
 import LazyMedia from './LazyMedia';
 
 const HISTORY_SELECTION_KEY = 'historySelection';
@@ -90,8 +90,17 @@ const HistoryTab = () => {
 
   const sortedHistoryItems = useMemo(() => [...historyItems].reverse(), [historyItems]);
 
-  const handleHistoryClick = (item) => {
-    localStorage.setItem(HISTORY_SELECTION_KEY, JSON.stringify(item));
+  const handleHistoryClick = async (item) => {
+    // The list omits the prompt graph; fetch the full entry before restoring it.
+    let selection = item;
+    if (!item.json) {
+      try {
+        selection = await getCozyHistoryItem(item.id);
+      } catch (error) {
+        console.warn(`CozyGen: failed to load history item ${item.id}`, error);
+      }
+    }
+    localStorage.setItem(HISTORY_SELECTION_KEY, JSON.stringify(selection));
     navigate('/');
   };
 
@@ -163,7 +172,9 @@ const HistoryTab = () => {
                 {mediaItems.map((media, index) => {
                   const isVideoFile = isVideo(media.filename);
                   const isGifFile = isGif(media.filename);
-                  const fullUrl = getViewUrl(media.filename, media.subfolder, media.type);
+                  const fullUrl = isVideoFile
+                    ? getPreviewUrl(media.filename, media.subfolder, media.type, 'hover')
+                    : getViewUrl(media.filename, media.subfolder, media.type);
                   const thumbUrl = getThumbUrl(media.filename, media.subfolder, media.type, { w: 256, q: 45, fmt: 'webp' });
                   return (
                   <div key={`${item.id}-${index}`} className="aspect-square bg-base-300 rounded-lg overflow-hidden">
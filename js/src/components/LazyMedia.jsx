@@ -31,6 +31,9 @@ const LazyMedia = ({
   rootMargin,
   threshold,
   fallbackSrc,
+  srcSet,
+  sizes,
+  onError,
 }) => {
   const { ref, inView } = useInView({ rootMargin, threshold });
   const [shouldLoad, setShouldLoad] = useState(false);
@@ -78,6 +81,8 @@ const LazyMedia = ({
       {shouldLoad && type !== 'video' && (
         <img
           src={currentSrc}
+          srcSet={currentSrc === src ? srcSet : undefined}
+          sizes={currentSrc === src ? sizes : undefined}
           alt={alt}
           loading="lazy"
           decoding="async"
@@ -86,6 +91,8 @@ const LazyMedia = ({
           onError={() => {
             if (fallbackSrc && currentSrc !== fallbackSrc) {
               setCurrentSrc(fallbackSrc);
+            } else if (onError) {
+              onError();
             }
           }}
         />
@@ -1,5 +1,5 @@
 import React, { useCallback, useEffect, useMemo, useState } from 'react';
-import { deleteQueueItem, getQueue, interruptQueue, queuePrompt, getCozyHistoryList } from '../api';
+import { deleteQueueItem, getQueue, getQueueStatus, interruptQueue, queuePrompt, getCozyHistoryItem } from '../api';
 
 const POLL_INTERVAL_MS = 5000;
 
@@ -7,6 +7,8 @@ const extractPromptId = (item) => {
   if (!item) return null;
   if (typeof item === 'string' || typeof item === 'number') return String(item);
   if (typeof item.prompt_id === 'string' || typeof item.prompt_id === 'number') return String(item.prompt_id);
+  // ComfyUI queue entries are [number, prompt_id, prompt, extra_data, outputs_to_execute].
+  if (Array.isArray(item) && typeof item[1] === 'string') return item[1];
   if (Array.isArray(item) && (typeof item[0] === 'string' || typeof item[0] === 'number')) return String(item[0]);
   if (Array.isArray(item) && item[1] && (typeof item[1].prompt_id === 'string' || typeof item[1].prompt_id === 'number')) {
     return String(item[1].prompt_id);
@@ -17,6 +19,7 @@ const extractPromptId = (item) => {
 const extractWorkflow = (item) => {
   if (!item) return null;
   if (item.prompt) return item.prompt;
+  if (Array.isArray(item) && item[2] && typeof item[2] === 'object') return item[2];
   if (Array.isArray(item) && item[1]) {
     if (item[1].prompt) return item[1].prompt;
     if (item[1].workflow) return item[1].workflow;
@@ -25,42 +28,36 @@ const extractWorkflow = (item) => {
   return null;
 };
 
+const formatDuration = (seconds) => {
+  const total = Math.max(0, Math.round(seconds));
+  if (total < 60) return `${total}s`;
+  const minutes = Math.floor(total / 60);
+  if (minutes < 60) return `${minutes}m ${total % 60}s`;
+  return `${Math.floor(minutes / 60)}h ${minutes % 60}m`;
+};
+
+// "Done in ~3m 20s" relative to the server clock at the time of the status response.
+const formatEta = (status, now) => {
+  if (!status || typeof status.estimated_finish !== 'number') return '—';
+  const finish = `done in ~${formatDuration(status.estimated_finish - now)}`;
+  if (status.status === 'pending' && typeof status.estimated_start === 'number') {
+    return `starts in ~${formatDuration(status.estimated_start - now)}, ${finish}`;
+  }
+  return finish;
+};
+
 const QueueTab = () => {
-  const [queueState, setQueueState] = useState({ running: [], pending: [] });
   const [queueRemaining, setQueueRemaining] = useState(null);
+  const [queueStatus, setQueueStatus] = useState({ now: 0, items: [] });
   const [error, setError] = useState('');
   const [isLoading, setIsLoading] = useState(true);
 
-  const [historyById, setHistoryById] = useState({});
-
-  useEffect(() => {
-    const loadHistory = async () => {
-      try {
-        const data = await getCozyHistoryList();
-        const map = (data.items || []).reduce((acc, item) => {
-          if (item?.id) {
-            acc[item.id] = item;
-          }
-          return acc;
-        }, {});
-        setHistoryById(map);
-      } catch (error) {
-        console.warn('CozyGen: failed to load history list', error);
-      }
-    };
-    loadHistory();
-  }, []);
-
+  // One request per tick: CozyGen's queue status lists every prompt with its estimates.
+  // Prompt graphs are only needed to re-queue, so they are fetched on click.
   const fetchQueue = useCallback(async () => {
     try {
-      const data = await getQueue();
-      const running = Array.isArray(data?.queue_running) ? data.queue_running : [];
-      const pending = Array.isArray(data?.queue_pending) ? data.queue_pending : [];
-      if (Array.isArray(data) && data.length > 0) {
-        setQueueState({ running: data, pending: [] });
-      } else {
-        setQueueState({ running, pending });
-      }
+      const status = await getQueueStatus();
+      setQueueStatus({ now: status.now, items: Array.isArray(status?.items) ? status.items : [] });
       setError('');
     } catch (err) {
       console.error('CozyGen: failed to fetch queue', err);
@@ -96,22 +93,13 @@ const QueueTab = () => {
     return () => socket.close();
   }, []);
 
-  const normalizeItems = useCallback((items, status) => (
-    items.map((item) => {
-      const promptId = extractPromptId(item);
-      return {
-        promptId,
-        status,
-        raw: item,
-        workflow: extractWorkflow(item),
-        historyWorkflow: promptId ? historyById?.[promptId]?.json?.prompt || historyById?.[promptId]?.json : null,
-      };
-    })
-  ), [historyById]);
-
-  const runningItems = useMemo(() => normalizeItems(queueState.running, 'running'), [queueState.running, normalizeItems]);
-  const pendingItems = useMemo(() => normalizeItems(queueState.pending, 'pending'), [queueState.pending, normalizeItems]);
-  const allItems = [...runningItems, ...pendingItems];
+  const allItems = useMemo(() => (
+    queueStatus.items.map((item) => ({
+      promptId: extractPromptId(item),
+      status: item.status,
+      raw: item,
+    }))
+  ), [queueStatus.items]);
 
   const handleCancel = async (promptId) => {
     if (!promptId) return;
@@ -134,7 +122,28 @@ const QueueTab = () => {
     }
   };
 
-  const handleRequeue = async (workflow) => {
+  // ComfyUI's /queue has the exact graph while the prompt is queued; the history entry is the fallback
+  // (the history listing omits graphs, so the full entry is fetched).
+  const loadWorkflow = async (promptId) => {
+    try {
+      const data = await getQueue();
+      const queued = [...(data?.queue_running || []), ...(data?.queue_pending || [])];
+      const workflow = extractWorkflow(queued.find((entry) => extractPromptId(entry) === promptId));
+      if (workflow) return workflow;
+    } catch (err) {
+      console.warn('CozyGen: failed to fetch queue', err);
+    }
+    try {
+      const entry = await getCozyHistoryItem(promptId);
+      return entry?.json?.prompt || entry?.json || null;
+    } catch (err) {
+      console.warn('CozyGen: no history entry for', promptId, err);
+      return null;
+    }
+  };
+
+  const handleRequeue = async (item) => {
+    const workflow = item.promptId ? await loadWorkflow(item.promptId) : null;
     if (!workflow) {
       setError('No workflow data available to re-queue.');
       return;
@@ -186,18 +195,22 @@ const QueueTab = () => {
             <tr>
               <th className="px-4 py-3 font-medium">Prompt ID</th>
               <th className="px-4 py-3 font-medium">Status</th>
+              <th className="px-4 py-3 font-medium">ETA</th>
               <th className="px-4 py-3 font-medium text-right">Actions</th>
             </tr>
           </thead>
           <tbody>
             {allItems.map((item, index) => {
-              const workflowPayload = item.workflow || item.historyWorkflow;
+              const canRequeue = Boolean(item.promptId);
               return (
                 <tr key={`${item.status}-${item.promptId || index}`} className="border-t border-base-300">
                   <td className="px-4 py-3 text-gray-200 break-all">
                     {item.promptId || 'Unknown'}
                   </td>
                   <td className="px-4 py-3 text-gray-400 capitalize">{item.status}</td>
+                  <td className="px-4 py-3 text-gray-400">
+                    {formatEta(item.raw, queueStatus.now)}
+                  </td>
                   <td className="px-4 py-3">
                     <div className="flex flex-wrap justify-end gap-2">
                       {item.status === 'running' && (
@@ -216,10 +229,10 @@ const QueueTab = () => {
                         Cancel
                       </button>
                       <button
-                        onClick={() => handleRequeue(workflowPayload)}
+                        onClick={() => handleRequeue(item)}
                         className="px-3 py-1 rounded-md bg-accent/20 text-accent hover:bg-accent/30 transition-colors"
-                        disabled={!workflowPayload}
-                        title={workflowPayload ? 'Re-queue this prompt' : 'Workflow data unavailable'}
+                        disabled={!canRequeue}
+                        title={canRequeue ? 'Re-queue this prompt' : 'Workflow data unavailable'}
                       >
                         Re-queue
                       </button>
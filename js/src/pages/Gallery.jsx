@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
-import { getGallery } from '../api';
+import { getExportUrl, getGallery, getMediaUrl, getPreviewUrl, getThumbBatch, pickThumbWidth, thumbBatchKey } from '../api';
 import GalleryItem from '../components/GalleryItem';
+import AudioWaveform from '../components/AudioWaveform';
 import Modal from 'react-modal'; // Using react-modal for accessibility
 import { TransformWrapper, TransformComponent } from "react-zoom-pan-pinch";
 
@@ -37,9 +38,21 @@ Modal.setAppElement('#root');
 
 const isVideo = (filename) => /\.(mp4|webm)$/i.test(filename);
 const isAudio = (filename) => /\.(mp3|wav|flac)$/i.test(filename);
+// GIFs keep playing from the original file, so only stills and audio waveforms go into the page's thumbnail batch.
+const isBatchThumb = (item) => item.type !== 'directory' && /\.(png|jpe?g|webp|mp3|wav|flac)$/i.test(item.filename);
+
+// CSS width of one tile for the grid breakpoints below.
+const galleryTileWidth = () => {
+    const width = window.innerWidth;
+    const columns = width >= 1280 ? 6 : width >= 1024 ? 5 : width >= 768 ? 4 : width >= 640 ? 3 : 2;
+    return width / columns;
+};
 
 const Gallery = () => {
     const [items, setItems] = useState([]);
+    const [thumbs, setThumbs] = useState({});
+    // Batch tiles hold a placeholder until the page's thumbnails arrive rather than fetching their own.
+    const [thumbsPending, setThumbsPending] = useState(false);
     const [path, setPath] = useState(localStorage.getItem('galleryPath') || '');
     const [modalIsOpen, setModalIsOpen] = useState(false);
     const [selectedItem, setSelectedItem] = useState(null);
@@ -48,26 +61,61 @@ const Gallery = () => {
     const [pageSize, setPageSize] = useState(parseInt(localStorage.getItem('galleryPageSize'), 10) || 20);
 
     useEffect(() => {
+        let cancelled = false;
         const fetchGallery = async () => {
             try {
                 const galleryData = await getGallery(path, page, pageSize);
+                if (cancelled) return;
                 if (galleryData && galleryData.items) {
+                    const stills = galleryData.items.filter(isBatchThumb);
+                    // Show the page now; thumbnails are applied when the batch lands.
+                    setThumbs({});
+                    setThumbsPending(stills.length > 0);
                     setItems(galleryData.items);
                     setTotalPages(galleryData.total_pages);
+                    if (stills.length === 0) return;
+                    let pageThumbs = {};
+                    try {
+                        pageThumbs = await getThumbBatch(
+                            stills.map(({ filename, subfolder }) => ({ filename, subfolder, type: 'output' })),
+                            { w: pickThumbWidth(galleryTileWidth()), q: 45, fmt: 'webp' }
+                        );
+                    } catch (error) {
+                        // Tiles fall back to their own /cozygen/thumb requests.
+                        console.error(error);
+                    }
+                    if (cancelled) {
+                        Object.values(pageThumbs).forEach((url) => URL.revokeObjectURL(url));
+                        return;
+                    }
+                    setThumbs(pageThumbs);
+                    setThumbsPending(false);
                 } else {
+                    setThumbs({});
+                    setThumbsPending(false);
                     setItems([]);
                     setTotalPages(1);
                 }
             } catch (error) {
                 console.error(error);
+                if (cancelled) return;
+                setThumbs({});
+                setThumbsPending(false);
                 setItems([]);
                 setTotalPages(1);
             }
         };
         fetchGallery();
         localStorage.setItem('galleryPath', path);
+        return () => {
+            cancelled = true;
+        };
     }, [path, page, pageSize]);
 
+    useEffect(() => () => {
+        Object.values(thumbs).forEach((url) => URL.revokeObjectURL(url));
+    }, [thumbs]);
+
     const handleSelect = (item) => {
         if (item.type === 'directory') {
             setPath(item.subfolder);
@@ -125,11 +173,13 @@ const Gallery = () => {
         if (!selectedItem) return null;
 
         const fileUrl = `/view?filename=${selectedItem.filename}&subfolder=${selectedItem.subfolder}&type=output`;
+        const mediaUrl = getMediaUrl(selectedItem.filename, selectedItem.subfolder, 'output');
 
         if (isVideo(selectedItem.filename)) {
-            return <video src={fileUrl} controls autoPlay loop className="max-w-full max-h-full object-contain rounded-lg" />;
+            const previewUrl = getPreviewUrl(selectedItem.filename, selectedItem.subfolder, 'output', 'modal');
+            return <video src={previewUrl} controls autoPlay loop className="max-w-full max-h-full object-contain rounded-lg" />;
         } else if (isAudio(selectedItem.filename)) {
-            return <audio src={fileUrl} controls autoPlay loop className="w-full" />;
+            return <AudioWaveform src={mediaUrl} filename={selectedItem.filename} subfolder={selectedItem.subfolder} />;
         } else {
             return (
                 <TransformWrapper
@@ -160,11 +210,22 @@ const Gallery = () => {
                         <span onClick={() => handleBreadcrumbClick(index + 1)} className="cursor-pointer hover:text-accent transition-colors">{segment}</span>
                     </React.Fragment>
                 ))}
+                <a
+                    href={getExportUrl(path)}
+                    download
+                    title="Download this folder as a ZIP"
+                    className="ml-auto px-3 py-1 bg-base-300 text-gray-300 rounded-md text-sm hover:bg-base-300/70 transition-colors flex items-center"
+                >
+                    <svg xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" strokeWidth={1.5} stroke="currentColor" className="w-4 h-4 mr-1">
+                        <path strokeLinecap="round" strokeLinejoin="round" d="M3 16.5v2.25A2.25 2.25 0 0 0 5.25 21h13.5A2.25 2.25 0 0 0 21 18.75V16.5M16.5 12 12 16.5m0 0L7.5 12m4.5 4.5V3" />
+                    </svg>
+                    ZIP
+                </a>
                 {/* Folder Up Button */}
                 <button
                     onClick={handleFolderUp}
                     disabled={path === ''} // Disable if at root
-                    className="ml-auto px-3 py-1 bg-base-300 text-gray-300 rounded-md text-sm hover:bg-base-300/70 transition-colors flex items-center"
+                    className="ml-2 px-3 py-1 bg-base-300 text-gray-300 rounded-md text-sm hover:bg-base-300/70 transition-colors flex items-center"
                 >
                     <svg xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" strokeWidth={1.5} stroke="currentColor" className="w-4 h-4 mr-1">
                         <path strokeLinecap="round" strokeLinejoin="round" d="M4.5 10.5 12 3m0 0 7.5 7.5M12 3v18" />
@@ -209,7 +270,13 @@ const Gallery = () => {
 
             <div className="grid grid-cols-2 sm:grid-cols-3 md:grid-cols-4 lg:grid-cols-5 xl:grid-cols-6 gap-4">
                 {items.map(item => (
-                    <GalleryItem key={item.filename} item={item} onSelect={handleSelect} />
+                    <GalleryItem
+                        key={item.filename}
+                        item={item}
+                        thumbSrc={thumbs[thumbBatchKey(item.subfolder, item.filename)]}
+                        thumbPending={thumbsPending && isBatchThumb(item)}
+                        onSelect={handleSelect}
+                    />
                 ))}
             </div>
 
@@ -2,13 +2,27 @@ import React, { useState, useEffect, useRef, useCallback } from 'react';
 import WorkflowSelector from '../components/WorkflowSelector';
 import DynamicForm from '../components/DynamicForm';
 import ImageInput from '../components/ImageInput'; // Import ImageInput
-import { getWorkflows, getWorkflow, queuePrompt, getChoices, getQueue, getViewUrl, getObjectInfo, saveCozyHistoryItem, updateCozyHistoryItem, getCozySession, saveCozySession } from '../api';
+import { getWorkflows, getWorkflow, getWorkflowSchema, generateWorkflow, queuePrompt, getChoices, getQueue, getViewUrl, getMediaUrl, getObjectInfo, saveCozyHistoryItem, updateCozyHistoryItem, getCozySession, saveCozySession, getEventStreamUrl } from '../api';
 import Modal from 'react-modal';
 import { TransformWrapper, TransformComponent } from "react-zoom-pan-pinch";
 
 // Modal styles (copied from Gallery.jsx for consistency)
 const isVideo = (url) => /\.(mp4|webm)/i.test(url);
 
+// One id per tab, kept across reloads: prompts are queued under it, so ComfyUI addresses their
+// execution events to this tab and /cozygen/events leaves out other clients' runs.
+const getClientId = () => {
+  let clientId = sessionStorage.getItem('cozygenClientId');
+  if (!clientId) {
+    clientId = (typeof crypto !== 'undefined' && crypto.randomUUID)
+      ? crypto.randomUUID()
+      : `${Date.now()}_${Math.random().toString(16).slice(2)}`;
+    sessionStorage.setItem('cozygenClientId', clientId);
+  }
+  return clientId;
+};
+const CLIENT_ID = getClientId();
+
 const customStyles = {
   content: {
     position: 'relative',
@@ -88,6 +102,16 @@ const choiceTypeMapping = {
   // Add more mappings as needed
 };
 
+// Rebuild a minimal graph holding only the CozyGen input nodes described by a schema,
+// so the form can render without downloading the full workflow.
+const schemaToWorkflow = (schema) => Object.fromEntries(
+  (schema?.inputs || []).map((item) => [item.id, {
+    class_type: item.class_type,
+    inputs: { ...item.inputs },
+    properties: item.choice_type ? { choice_type: item.choice_type } : {},
+  }])
+);
+
 const WANVIDEO_BASE_PRECISIONS = ["fp32", "bf16", "fp16", "fp16_fast"];
 const WANVIDEO_QUANTIZATIONS = [
   "disabled",
@@ -125,6 +149,8 @@ function App() {
   const [formData, setFormData] = useState({});
   const [randomizeState, setRandomizeState] = useState({});
   const [bypassedState, setBypassedState] = useState({});
+  // Graph restored from a history entry; generated from instead of the workflow file until another workflow is picked.
+  const [restoredGraph, setRestoredGraph] = useState(null);
   const [previewImages, setPreviewImages] = useState(JSON.parse(localStorage.getItem('lastPreviewImages')) || []);
   const [selectedPreviewImage, setSelectedPreviewImage] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
@@ -135,6 +161,7 @@ function App() {
   const [statusText, setStatusText] = useState('Generating...');
   const [queueRemaining, setQueueRemaining] = useState(null);
   const workflowDataRef = useRef(null);
+  const nodeTitlesRef = useRef({});
   const skipWorkflowFetchRef = useRef(false);
 
   useEffect(() => {
@@ -332,6 +359,7 @@ function App() {
     }
 
     await prepareWorkflowData(workflow, savedFormData, savedRandomizeState, savedBypassedState);
+    setRestoredGraph(workflow);
 
     if (workflowName) {
       localStorage.setItem(`${workflowName}_formData`, JSON.stringify(savedFormData));
@@ -351,20 +379,7 @@ function App() {
       return;
     }
 
-    const protocol = window.location.protocol.startsWith('https') ? 'wss' : 'ws';
-    const host = window.location.host;
-    const wsUrl = `${protocol}://${host}/ws`;
-
-    websocketRef.current = new WebSocket(wsUrl);
-
-    websocketRef.current.onmessage = (event) => {
-      if (typeof event.data !== 'string') {
-          console.log("CozyGen: Received binary WebSocket message, ignoring.");
-          return;
-      }
-
-      const msg = JSON.parse(event.data);
-
+    const handleMessage = (msg) => {
       if (msg.type === 'cozygen_batch_ready') {
           const imageUrls = msg.data.images.map(image => image.url);
           if (imageUrls.length > 0) {
@@ -375,7 +390,7 @@ function App() {
           setProgressValue(0);
           setProgressMax(0);
           setStatusText('Finished');
-          const lastPromptId = localStorage.getItem('lastPromptId');
+          const lastPromptId = msg.data.history_id || localStorage.getItem('lastPromptId');
           if (lastPromptId && imageUrls.length > 0) {
             updateCozyHistoryItem(lastPromptId, { preview_images: imageUrls }).catch((error) => {
               console.warn('CozyGen: failed to update history previews', error);
@@ -389,7 +404,7 @@ function App() {
           }).catch(() => {});
         } else if (msg.type === 'cozygen_video_ready') {
           const videoUrl = msg?.data?.video_url
-            || (msg?.data?.filename ? getViewUrl(msg.data.filename, msg.data.subfolder || '', msg.data.type || 'output') : null);
+            || (msg?.data?.filename ? getMediaUrl(msg.data.filename, msg.data.subfolder || '', msg.data.type || 'output') : null);
           const previewUrls = videoUrl ? [videoUrl] : [];
           if (previewUrls.length > 0) {
             setPreviewImages(previewUrls);
@@ -399,7 +414,7 @@ function App() {
           setProgressValue(0);
           setProgressMax(0);
           setStatusText('Finished');
-          const lastPromptId = localStorage.getItem('lastPromptId');
+          const lastPromptId = msg?.data?.history_id || localStorage.getItem('lastPromptId');
           if (lastPromptId && previewUrls.length > 0) {
             updateCozyHistoryItem(lastPromptId, { preview_images: previewUrls }).catch((error) => {
               console.warn('CozyGen: failed to update history previews', error);
@@ -414,31 +429,19 @@ function App() {
         } else if (msg.type === 'executing') {
           const nodeId = msg.data.node;
           // If nodeId is null, it means the prompt is finished, but we wait for our own message.
-          if (nodeId && workflowDataRef.current && workflowDataRef.current[nodeId]) {
+          if (nodeId && msg.data.node_name) {
+              setStatusText(`Executing: ${msg.data.node_name}`);
+          } else if (nodeId && nodeTitlesRef.current[nodeId]) {
+              setStatusText(`Executing: ${nodeTitlesRef.current[nodeId]}`);
+          } else if (nodeId && workflowDataRef.current && workflowDataRef.current[nodeId]) {
               const node = workflowDataRef.current[nodeId];
               const nodeName = node.title || node.class_type;
               setStatusText(`Executing: ${nodeName}`);
           }
-          const lastPromptId = localStorage.getItem('lastPromptId');
-          if (lastPromptId) {
-            saveCozySession({
-              id: lastPromptId,
-              status: 'running',
-              updated_at: new Date().toISOString(),
-            }).catch(() => {});
-          }
       } else if (msg.type === 'progress') {
+          // The server keeps the session's running status and progress current.
           setProgressValue(msg.data.value);
           setProgressMax(msg.data.max);
-          const lastPromptId = localStorage.getItem('lastPromptId');
-          if (lastPromptId) {
-            saveCozySession({
-              id: lastPromptId,
-              status: 'running',
-              progress: { value: msg.data.value, max: msg.data.max },
-              updated_at: new Date().toISOString(),
-            }).catch(() => {});
-          }
       } else if (msg.type === 'status') {
           const remaining = msg?.data?.status?.exec_info?.queue_remaining;
           if (typeof remaining === 'number') {
@@ -447,6 +450,34 @@ function App() {
       }
     };
 
+    if (typeof EventSource !== 'undefined') {
+      // CozyGen's own stream skips latent preview frames and coalesces progress ticks.
+      const source = new EventSource(getEventStreamUrl({ clientId: CLIENT_ID }));
+      websocketRef.current = source;
+      source.onmessage = (event) => handleMessage(JSON.parse(event.data));
+      source.onerror = () => {
+        // EventSource reconnects by itself; it only gives up when the stream is refused.
+        if (source.readyState === EventSource.CLOSED) {
+          setTimeout(connectWebSocket, 1000);
+        }
+      };
+      return;
+    }
+
+    const protocol = window.location.protocol.startsWith('https') ? 'wss' : 'ws';
+    const host = window.location.host;
+    const wsUrl = `${protocol}://${host}/ws?clientId=${encodeURIComponent(CLIENT_ID)}`;
+
+    websocketRef.current = new WebSocket(wsUrl);
+
+    websocketRef.current.onmessage = (event) => {
+      if (typeof event.data !== 'string') {
+          console.log("CozyGen: Received binary WebSocket message, ignoring.");
+          return;
+      }
+      handleMessage(JSON.parse(event.data));
+    };
+
     websocketRef.current.onclose = () => {
       setTimeout(connectWebSocket, 1000);
     };
@@ -544,12 +575,22 @@ function App() {
           return;
         }
 
-        const data = await getWorkflow(selectedWorkflow);
         const savedFormData = JSON.parse(localStorage.getItem(`${selectedWorkflow}_formData`)) || {};
         const savedRandomizeState = JSON.parse(localStorage.getItem(`${selectedWorkflow}_randomizeState`)) || {};
         const savedBypassedState = JSON.parse(localStorage.getItem(`${selectedWorkflow}_bypassedState`)) || {};
 
-        await prepareWorkflowData(data, savedFormData, savedRandomizeState, savedBypassedState);
+        // The server injects values into its cached copy of the graph on generate,
+        // so the form only needs the schema; the full workflow is a fallback.
+        try {
+          const schema = await getWorkflowSchema(selectedWorkflow);
+          nodeTitlesRef.current = schema.node_titles || {};
+          await prepareWorkflowData(schemaToWorkflow(schema), savedFormData, savedRandomizeState, savedBypassedState);
+        } catch (error) {
+          console.warn('CozyGen: workflow schema unavailable, loading full workflow.', error);
+          nodeTitlesRef.current = {};
+          const data = await getWorkflow(selectedWorkflow);
+          await prepareWorkflowData(data, savedFormData, savedRandomizeState, savedBypassedState);
+        }
 
       } catch (error) {
         console.error(error);
@@ -578,6 +619,7 @@ function App() {
   const handleWorkflowSelect = (workflow) => {
     setSelectedWorkflow(workflow);
     localStorage.setItem('selectedWorkflow', workflow);
+    setRestoredGraph(null);
     setWorkflowData(null);
     setDynamicInputs([]);
     setFormData({});
@@ -622,6 +664,19 @@ function App() {
     }
   };
 
+  const markPromptQueued = (promptId) => {
+    const promptIdString = String(promptId);
+    localStorage.setItem('lastPromptId', promptIdString);
+    saveCozySession({
+      id: promptIdString,
+      status: 'queued',
+      workflow: selectedWorkflow,
+      created_at: new Date().toISOString(),
+      updated_at: new Date().toISOString(),
+    }).catch(() => {});
+    return promptIdString;
+  };
+
   const handleGenerate = async (clear = true) => {
     if (!workflowData) return;
     if(clear) {
@@ -654,6 +709,34 @@ function App() {
           console.warn('CozyGen: unable to read queue for warning prompt.', error);
         }
 
+        if (selectedWorkflow) {
+          // Only the form values travel; the server injects them and records history.
+          const result = await generateWorkflow({
+            workflow: selectedWorkflow,
+            ...(restoredGraph ? { graph: restoredGraph } : {}),
+            values: formData,
+            randomize: randomizeState,
+            bypass: bypassedState,
+            run_id: runId,
+            client_id: CLIENT_ID,
+          });
+          const updatedFormData = { ...formData, ...(result.values || {}) };
+          setFormData(updatedFormData);
+          localStorage.setItem(`${selectedWorkflow}_formData`, JSON.stringify(updatedFormData));
+          if (result.cached) {
+            // An identical run already produced these files; nothing was queued.
+            const cachedUrls = (result.outputs || []).map((output) => output.url);
+            localStorage.setItem('lastPromptId', String(result.prompt_id));
+            setPreviewImages(cachedUrls);
+            localStorage.setItem('lastPreviewImages', JSON.stringify(cachedUrls));
+            setIsLoading(false);
+            setStatusText('Finished');
+            return;
+          }
+          markPromptQueued(result.prompt_id);
+          return;
+        }
+
         let finalWorkflow = JSON.parse(JSON.stringify(workflowData));
         const metaTextLines = [];
 
@@ -792,19 +875,11 @@ function App() {
             }
         }
 
-        const promptPayload = { prompt: finalWorkflow };
+        const promptPayload = { prompt: finalWorkflow, client_id: CLIENT_ID };
         const queueResponse = await queuePrompt(promptPayload);
         const promptId = queueResponse?.prompt_id;
         if (promptId) {
-          const promptIdString = String(promptId);
-          localStorage.setItem('lastPromptId', promptIdString);
-          saveCozySession({
-            id: promptIdString,
-            status: 'queued',
-            workflow: selectedWorkflow,
-            created_at: new Date().toISOString(),
-            updated_at: new Date().toISOString(),
-          }).catch(() => {});
+          const promptIdString = markPromptQueued(promptId);
           appendHistoryEntry({
             id: promptIdString,
             timestamp: new Date().toISOString(),
@@ -824,7 +899,7 @@ function App() {
     } catch (error) {
         console.error("Failed to queue prompt:", error);
         setIsLoading(false);
-        setStatusText('Error queuing prompt');
+        setStatusText(error?.message ? `Error queuing prompt: ${error.message}` : 'Error queuing prompt');
     }
   };
 
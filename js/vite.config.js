@@ -1,13 +1,52 @@
 import { defineConfig } from 'vite'
 import react from '@vitejs/plugin-react'
+import fs from 'node:fs'
+import path from 'node:path'
+import zlib from 'node:zlib'
+
+const COMPRESSIBLE = /\.(js|mjs|css|html|svg|json)$/i
+
+// Write .br and .gz siblings next to each text asset so the CozyGen server
+// can send them as-is instead of compressing on every request.
+const precompress = () => {
+  let outDir = 'dist'
+  return {
+    name: 'cozygen-precompress',
+    apply: 'build',
+    configResolved(config) {
+      outDir = path.resolve(config.root, config.build.outDir)
+    },
+    closeBundle() {
+      const walk = (dir) => {
+        for (const entry of fs.readdirSync(dir, { withFileTypes: true })) {
+          const file = path.join(dir, entry.name)
+          if (entry.isDirectory()) {
+            walk(file)
+            continue
+          }
+          if (!COMPRESSIBLE.test(entry.name)) continue
+          const source = fs.readFileSync(file)
+          if (source.length < 1024) continue
+          fs.writeFileSync(`${file}.gz`, zlib.gzipSync(source, { level: 9 }))
+          fs.writeFileSync(`${file}.br`, zlib.brotliCompressSync(source, {
+            params: { [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY },
+          }))
+        }
+      }
+      walk(outDir)
+    },
+  }
+}
 
 // https://vitejs.dev/config/
 export default defineConfig({
-  plugins: [react()],
+  plugins: [react(), precompress()],
   build: {
     outDir: 'dist',
     assetsDir: 'assets',
     emptyOutDir: true,
+    // dist/.vite/manifest.json tells the server which files are content-hashed.
+    manifest: true,
     sourcemap: true
   },
   base: '/cozygen/'
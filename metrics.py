@@ -0,0 +1,217 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+from aiohttp import web
+from .profiling import finish_trace, start_trace
+
+# Seconds; covers cached JSON responses up to slow video encodes.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOOP_LAG_INTERVAL = 0.5
+
+_metrics = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+        return False
+
+
+def timed(histogram, *labels):
+    """Decorator recording each call's duration in ``histogram``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with histogram.time(*labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count.
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels) -> _Timer:
+        return _Timer(self, labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((labels, ([*state[0]], state[1], state[2])) for labels, state in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+HTTP_REQUESTS = Counter(
+    "cozygen_http_requests_total", "CozyGen API requests by route and status.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram(
+    "cozygen_http_request_duration_seconds", "CozyGen API handler latency.", ("method", "route"))
+THUMBNAIL_CACHE_EVENTS = Counter(
+    "cozygen_thumbnail_cache_total", "Thumbnail cache lookups and evictions.", ("result",))
+THUMBNAIL_CACHE_ENTRIES = Gauge("cozygen_thumbnail_cache_entries", "Thumbnails held in memory.")
+THUMBNAIL_CACHE_BYTES = Gauge("cozygen_thumbnail_cache_bytes", "Bytes of thumbnails held in memory.")
+THUMBNAIL_BUILD_SECONDS = Histogram(
+    "cozygen_thumbnail_build_seconds",
+    "Time to decode a source and encode the requested thumbnail; other pyramid levels are encoded after it.",
+    ("format",))
+IMAGE_ENCODE_SECONDS = Histogram(
+    "cozygen_image_encode_seconds", "Time spent encoding thumbnail images.", ("format",))
+COMPRESS_SECONDS = Histogram(
+    "cozygen_response_compress_seconds", "Time spent compressing JSON responses.", ("encoding",))
+VIDEO_PREVIEW_SECONDS = Histogram(
+    "cozygen_video_preview_seconds", "Time to render a video preview rendition.", ("preset",))
+HISTORY_WRITE_SECONDS = Histogram("cozygen_history_write_seconds", "History entry write latency.")
+SESSION_WRITE_SECONDS = Histogram("cozygen_session_write_seconds", "Session write latency.")
+OUTPUT_NODE_SECONDS = Histogram(
+    "cozygen_output_node_seconds", "Time spent inside CozyGen output nodes.", ("node",))
+LOOP_LAG_SECONDS = Histogram(
+    "cozygen_event_loop_lag_seconds", "How late the server event loop wakes up a sleeping task.")
+
+_lag_monitor = None
+
+
+async def _monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG_SECONDS.observe(max(0.0, loop.time() - started - LOOP_LAG_INTERVAL))
+
+def ensure_loop_lag_monitor():
+    global _lag_monitor
+    if _lag_monitor is None or _lag_monitor.done():
+        _lag_monitor = asyncio.get_running_loop().create_task(_monitor_loop_lag())
+
+def instrument_handler(method: str, route: str, handler):
+    async def instrumented(request: web.Request):
+        if _lag_monitor is None:
+            ensure_loop_lag_monitor()
+        trace, token = start_trace(request)
+        started = time.perf_counter()
+        status = 500
+        response = None
+        try:
+            response = await handler(request)
+            status = response.status
+            return response
+        except web.HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_LATENCY.observe(elapsed, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status))
+            if trace is not None:
+                finish_trace(response, trace, token, elapsed)
+    instrumented.__name__ = getattr(handler, "__name__", "handler")
+    instrumented.__wrapped__ = handler
+    return instrumented
+
+def instrument_routes(routes: list) -> list:
+    return [
+        web.RouteDef(route.method, route.path, instrument_handler(route.method, route.path, route.handler), route.kwargs)
+        for route in routes
+    ]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+async def get_metrics(request: web.Request) -> web.Response:
+    ensure_loop_lag_monitor()
+    return web.Response(
+        body=render_metrics().encode("utf-8"),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8", "Cache-Control": "no-store"},
+    )
@@ -1,18 +1,13 @@
 import os
-import json
-import torch
-import numpy as np
-from PIL import Image, ImageOps
-from PIL.PngImagePlugin import PngInfo
-import base64 # New import
-import io # New import
+import functools
 
 import folder_paths
 from nodes import SaveImage, LoadImage
 import server # Import server
-import asyncio # Import Import asyncio
 from comfy.comfy_types import node_typing, ComfyNodeABC, InputTypeDict
 from comfy.comfy_types.node_typing import IO
+from .api import media_url_for, record_run_outputs, schedule_output_previews
+from .metrics import OUTPUT_NODE_SECONDS, timed
 
 
 
@@ -146,6 +141,7 @@ class CozyGenOutput(SaveImage):
     FUNCTION = "save_images"
     CATEGORY = "CozyGen"
 
+    @timed(OUTPUT_NODE_SECONDS, "CozyGenOutput")
     def save_images(self, images, filename_prefix="CozyGen/output", run_id=""):
         results = super().save_images(images, filename_prefix)
         server_instance = server.PromptServer.instance
@@ -162,9 +158,14 @@ class CozyGenOutput(SaveImage):
                 })
             
             if batch_images_data:
+                record_run_outputs(run_id, [
+                    {"filename": image["filename"], "subfolder": image["subfolder"], "type": image["type"], "kind": "image"}
+                    for image in batch_images_data
+                ])
                 message_data = {
                     "status": "images_generated",
-                    "images": batch_images_data
+                    "images": batch_images_data,
+                    "run_id": run_id
                 }
                 server_instance.send_sync("cozygen_batch_ready", message_data)
                 print(f"CozyGen: Sent batch WebSocket message: {message_data}")
@@ -172,8 +173,6 @@ class CozyGenOutput(SaveImage):
         return results
 
 
-import imageio
-
 class CozyGenVideoOutput:
     def __init__(self):
         self.output_dir = folder_paths.get_output_directory()
@@ -202,6 +201,7 @@ class CozyGenVideoOutput:
 
     CATEGORY = "CozyGen"
 
+    @timed(OUTPUT_NODE_SECONDS, "CozyGenVideoOutput")
     def save_video(self, images, frame_rate, loop_count, filename_prefix="CozyGen/video", format="video/webm", pingpong=False, run_id=""):
         filename_prefix += self.prefix_append
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path(filename_prefix, self.output_dir, images[0].shape[1], images[0].shape[0])
@@ -215,7 +215,11 @@ class CozyGenVideoOutput:
             ext = "webm"
 
         file = f"{filename}_{counter:05}_.{ext}"
-        
+
+        # imageio (and its ffmpeg plugin) is slow to import, so only pay for it when a video is saved.
+        import imageio
+        import numpy as np
+
         # imageio requires uint8
         video_data = (images.cpu().numpy() * 255).astype(np.uint8)
 
@@ -233,16 +237,21 @@ class CozyGenVideoOutput:
             "type": self.type
         })
 
+        record_run_outputs(run_id, [{**result, "kind": "video"} for result in results])
+        for result in results:
+            schedule_output_previews(result)
+
         server_instance = server.PromptServer.instance
         if server_instance:
             for result in results:
-                video_url = f"/view?filename={result['filename']}&subfolder={result['subfolder']}&type={result['type']}"
+                video_url = media_url_for(result)
                 message_data = {
                     "status": "video_generated",
                     "video_url": video_url,
                     "filename": result['filename'],
                     "subfolder": result['subfolder'],
-                    "type": result['type']
+                    "type": result['type'],
+                    "run_id": run_id
                 }
                 server_instance.send_sync("cozygen_video_ready", message_data)
                 print(f"CozyGen: Sent custom WebSocket message: {{'type': 'cozygen_video_ready', 'data': {message_data}}}")
@@ -251,11 +260,17 @@ class CozyGenVideoOutput:
 
 import comfy.samplers
 
-# Dynamically get model folder names
-models_path = folder_paths.models_dir
-model_folders = sorted([d.name for d in os.scandir(models_path) if d.is_dir()])
 static_choices = ["sampler", "scheduler"]
-all_choice_types = model_folders + static_choices
+
+@functools.lru_cache(maxsize=1)
+def get_all_choice_types() -> list:
+    # Dynamically get model folder names, on first use rather than at import time
+    models_path = folder_paths.models_dir
+    try:
+        model_folders = sorted([d.name for d in os.scandir(models_path) if d.is_dir()])
+    except OSError:
+        model_folders = []
+    return model_folders + static_choices
 
 class CozyGenFloatInput:
     @classmethod
@@ -322,6 +337,7 @@ class CozyGenChoiceInput:
     @classmethod
     def INPUT_TYPES(cls):
         # Create a flat list of all possible choices for the initial dropdown
+        all_choice_types = get_all_choice_types()
         all_choices = []
         for choice_type in all_choice_types:
             if choice_type == "sampler":
@@ -0,0 +1,98 @@
+import collections
+import contextlib
+import contextvars
+import os
+import sys
+import threading
+import time
+
+TRACE_HEADER = "X-CozyGen-Trace"
+MAX_PROFILE_SECONDS = 120
+MAX_PROFILE_HZ = 1000
+
+# Phase name -> seconds for the request being traced, None when tracing is off.
+_active_trace = contextvars.ContextVar("cozygen_trace", default=None)
+_NOT_TRACING = contextlib.nullcontext()
+_profile_lock = threading.Lock()
+
+
+class _Phase:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: dict, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace[self.name] = self.trace.get(self.name, 0.0) + time.perf_counter() - self.started
+        return False
+
+
+def trace_phase(name: str):
+    """Time a phase of the current request when it asked for a trace; free otherwise."""
+    trace = _active_trace.get()
+    if trace is None:
+        return _NOT_TRACING
+    return _Phase(trace, name)
+
+def start_trace(request):
+    if not request.headers.get(TRACE_HEADER):
+        return None, None
+    trace = {}
+    return trace, _active_trace.set(trace)
+
+def finish_trace(response, trace: dict, token, total: float):
+    _active_trace.reset(token)
+    if response is None:
+        return
+    timings = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in trace.items()]
+    timings.append(f"total;dur={total * 1000:.3f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(seconds: float, hz: float) -> collections.Counter:
+    """Sample every thread's Python stack for ``seconds``; returns collapsed stack counts.
+
+    Blocking, so run it in a worker thread. Only one profile runs at a time.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    try:
+        own_ident = threading.get_ident()
+        interval = 1.0 / hz
+        counts = collections.Counter()
+        deadline = time.perf_counter() + seconds
+        next_sample = time.perf_counter()
+        while next_sample < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                counts[";".join(reversed(stack))] += 1
+            next_sample += interval
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind; skip missed samples rather than bursting.
+                next_sample = time.perf_counter()
+        return counts
+    finally:
+        _profile_lock.release()
+
+def format_collapsed(counts: collections.Counter) -> str:
+    """Brendan Gregg's folded format, ready for flamegraph.pl or speedscope."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
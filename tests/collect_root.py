@@ -0,0 +1,17 @@
+"""Pytest plugin (loaded from pytest.ini): collect the repository root as a plain directory.
+
+The root is the ComfyUI custom-node package, and a Package node would import its
+``__init__.py``, which needs a running ComfyUI. Tests load it through
+``benchmarks.comfy_stubs`` instead.
+"""
+import os
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pytest_collect_directory(path, parent):
+    if str(path) == REPO_DIR:
+        return pytest.Dir.from_parent(parent, path=path)
+    return None
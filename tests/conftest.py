@@ -0,0 +1,36 @@
+"""Load CozyGen against the ComfyUI stand-ins from ``benchmarks.comfy_stubs``."""
+import asyncio
+import os
+import sys
+
+import pytest
+
+from benchmarks import comfy_stubs
+
+
+@pytest.fixture(scope="session")
+def api(tmp_path_factory):
+    base_dir = str(tmp_path_factory.mktemp("comfy"))
+    comfy_stubs.install(base_dir)
+    comfy_stubs.load_cozygen()
+    module = sys.modules[f"{comfy_stubs.PACKAGE_NAME}.api"]
+    config = {"cache_dir": os.path.join(base_dir, "cache")}
+    module.get_config = lambda: dict(config)
+    return module
+
+
+@pytest.fixture
+def post_json(api):
+    """POST ``payload`` to a fresh app serving CozyGen's routes; returns (status, body)."""
+    from aiohttp import web
+    from aiohttp.test_utils import TestClient, TestServer
+
+    def post(path, payload):
+        async def run():
+            app = web.Application()
+            app.add_routes(api.routes)
+            async with TestClient(TestServer(app)) as client:
+                response = await client.post(path, json=payload)
+                return response.status, await response.json()
+        return asyncio.run(run())
+    return post
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+
+@pytest.fixture
+def backend(api, monkeypatch):
+    collected = []
+
+    async def collect(state, prompt_id):
+        collected.append(prompt_id)
+        api._remote_prompts.pop(prompt_id, None)
+
+    monkeypatch.setattr(api, "collect_remote_outputs", collect)
+    monkeypatch.setattr(api, "_early_finished", api.collections.OrderedDict())
+    monkeypatch.setattr(api, "_finished_remote", api.collections.OrderedDict())
+    monkeypatch.setattr(api, "_remote_prompts", {})
+    state = {"url": "http://box", "client_id": "pool", "queue_remaining": 1, "dispatching": 0}
+    return state, collected
+
+
+def relay(api, state, *messages):
+    async def run():
+        for event, data in messages:
+            api.handle_backend_message(state, {"type": event, "data": data})
+            await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_duplicate_finish_is_not_an_early_finish(api, backend):
+    state, collected = backend
+    api._remote_prompts["p1"] = {"backend": "http://box", "client_id": None, "run_id": ""}
+    relay(api, state,
+          ("execution_success", {"prompt_id": "p1"}),
+          ("executing", {"node": None, "prompt_id": "p1"}))
+    assert collected == ["p1"]
+    assert not api._early_finished
+
+
+def test_finish_without_outstanding_dispatch_is_ignored(api, backend):
+    state, _ = backend
+    relay(api, state, ("execution_success", {"prompt_id": "someone-else"}))
+    assert not api._early_finished
+
+
+def test_finish_during_dispatch_is_remembered(api, backend):
+    state, _ = backend
+    state["dispatching"] = 1
+    relay(api, state,
+          ("execution_success", {"prompt_id": "p2"}),
+          ("executing", {"node": None, "prompt_id": "p2"}))
+    assert list(api._early_finished) == [("http://box", "p2")]
@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/cozygen/generate", "/cozygen/sweep"])
+@pytest.mark.parametrize("graph", [
+    {"1": 5},
+    {"1": {"inputs": {}}},
+    {"1": {"class_type": 3, "inputs": {}}},
+    {"1": {"class_type": "KSampler", "inputs": []}},
+    {"1": {"class_type": "KSampler"}},
+])
+def test_malformed_graph_is_rejected(post_json, path, graph):
+    status, body = post_json(path, {"graph": graph, "axes": [{"param": "Seed", "values": [1]}]})
+    assert status == 400
+    assert "Graph node '1'" in body["error"]
+
+
+def test_empty_graph_is_rejected(post_json):
+    status, body = post_json("/cozygen/generate", {"graph": {}})
+    assert status == 400
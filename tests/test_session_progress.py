@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def session(api, monkeypatch):
+    monkeypatch.setattr(api, "SESSION_PROGRESS_WRITE_INTERVAL", 0.2)
+    monkeypatch.setattr(api, "_session_progress_written", 0.0)
+    api.write_session({"id": "p1", "status": "running"})
+    return api.load_session
+
+
+def progress(api, value, prompt_id="p1"):
+    api.track_session_progress("progress", {"value": value, "max": 20, "prompt_id": prompt_id})
+
+
+def test_last_throttled_tick_is_flushed(api, session):
+    for value in range(1, 6):
+        progress(api, value)
+    assert session()["progress"]["value"] == 1
+    time.sleep(0.4)
+    assert session()["progress"] == {"value": 5, "max": 20}
+    assert session()["status"] == "running"
+
+
+@pytest.mark.parametrize("event, data", [
+    ("execution_success", {"prompt_id": "p1"}),
+    ("executing", {"node": None, "prompt_id": "p1"}),
+])
+def test_end_of_run_marks_session_finished(api, session, event, data):
+    progress(api, 1)
+    progress(api, 20)
+    api.track_session_progress(event, data)
+    saved = session()
+    assert saved["status"] == "finished"
+    # Written straight away, with the tick the throttle was still holding.
+    assert saved["progress"] == {"value": 20, "max": 20}
+    time.sleep(0.4)
+    assert session()["status"] == "finished"
+
+
+def test_other_prompts_leave_session_alone(api, session):
+    api.track_session_progress("execution_success", {"prompt_id": "p2"})
+    assert session()["status"] == "running"
+
+
+def test_error_is_recorded(api, session):
+    api.track_session_progress("execution_error", {"prompt_id": "p1"})
+    assert session()["status"] == "error"
@@ -0,0 +1,38 @@
+import pytest
+
+
+@pytest.mark.parametrize("spec", [
+    {"start": 0, "stop": "inf", "step": 1},
+    {"start": "-inf", "stop": 0, "step": 1},
+    {"start": 0, "stop": 10, "step": "nan"},
+    {"start": "nan", "stop": 10},
+    {"start": 0, "stop": 10, "step": "inf"},
+])
+def test_non_finite_range_is_rejected(api, spec):
+    with pytest.raises(api.WorkflowInjectionError, match="finite"):
+        api._sweep_range(spec, "Seed")
+
+
+def test_range_overflowing_float_is_rejected(api):
+    with pytest.raises(api.WorkflowInjectionError):
+        api._sweep_range({"start": 0, "stop": 10 ** 400, "step": 1}, "Seed")
+
+
+def test_range_is_inclusive(api):
+    assert api._sweep_range({"start": 1, "stop": 3}, "Seed") == [1, 2, 3]
+    assert api._sweep_range({"start": 0, "stop": 0.3, "step": 0.1}, "CFG") == [0.0, 0.1, 0.2, 0.3]
+
+
+GRAPH = {
+    "1": {"class_type": "CozyGenIntInput", "inputs": {"param_name": "Seed", "default_value": 1}},
+}
+
+
+@pytest.mark.parametrize("stop", ["inf", "nan"])
+def test_sweep_endpoint_rejects_non_finite_range(post_json, stop):
+    status, body = post_json("/cozygen/sweep", {
+        "graph": GRAPH,
+        "axes": [{"param": "Seed", "range": {"start": 0, "stop": stop, "step": 1}}],
+    })
+    assert status == 400
+    assert "finite" in body["error"]